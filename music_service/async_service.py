@@ -0,0 +1,134 @@
+"""
+Модуль асинхронного (asyncio) интерфейса музыкального сервиса
+"""
+import asyncio
+import gc
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from models import MusicService, Track, Playlist
+from file_operations import FileOperations
+from play_events import PlayRecorder
+from sessions import Session
+from streaming import cancellation_scope
+from exceptions import MusicServiceError, TrackNotFoundError, PlaylistNotFoundError
+
+
+class AsyncMusicService:
+    """
+    Асинхронная обертка над MusicService для обработки запросов в одном
+    цикле событий. Короткие операции (поиск, вход, плейлисты, прослушивания)
+    выполняются прямо в цикле - они занимают доли миллисекунды и защищены
+    блокировками сервиса. Экспорт и резервное копирование уходят в пул
+    потоков: одновременно выполняется не больше max_jobs задач, в очереди
+    ждет не больше max_pending, остальные сразу получают отказ. Отмена
+    задачи (task.cancel()) прерывает запись файла на ближайшей порции.
+
+    При freeze_gc=True загруженные к этому моменту объекты переносятся в
+    постоянное поколение сборщика мусора (gc.freeze): иначе полная сборка,
+    запущенная массовым созданием словарей при экспорте, обходит весь
+    каталог и останавливает цикл событий на десятки миллисекунд. Заморозка
+    действует на весь процесс (замороженные объекты больше не собираются),
+    поэтому включается только явно.
+    """
+
+    def __init__(self, service: MusicService, max_jobs: int = 1, max_pending: int = 4,
+                 executor: Optional[Executor] = None, recorder: Optional[PlayRecorder] = None,
+                 freeze_gc: bool = False):
+        self.service = service
+        self.recorder = recorder
+        self.max_pending = max_pending
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="music-job")
+        self._own_executor = executor is None
+        self._slots = asyncio.Semaphore(max_jobs)
+        self._pending = 0
+        if freeze_gc:
+            gc.freeze()
+
+    # --- короткие операции ---
+
+    async def search_tracks(self, query: str) -> List[Track]:
+        return self.service.search_tracks(query)
+
+    async def login(self, email: str, password: str) -> Session:
+        """Вход с созданием сессии; current_user сервиса не меняется"""
+        return self.service.start_session(email, password)
+
+    async def logout(self, session: Session):
+        self.service.end_session(session)
+
+    async def get_user_playlists(self, session: Session) -> List[Playlist]:
+        return self.service.get_user_playlists(session=session)
+
+    async def create_playlist(self, session: Session, name: str, description: str = "",
+                              is_public: bool = True) -> Playlist:
+        return self.service.create_playlist(name, description, is_public, session=session)
+
+    def _playlist(self, playlist_id: str) -> Playlist:
+        playlist = self.service.playlists.get(playlist_id)
+        if playlist is None:
+            raise PlaylistNotFoundError(f"Плейлист с ID {playlist_id} не найден")
+        return playlist
+
+    def _track(self, track_id: str) -> Track:
+        track = self.service.tracks.get(track_id)
+        if track is None:
+            raise TrackNotFoundError(f"Трек с ID {track_id} не найден")
+        return track
+
+    async def add_to_playlist(self, playlist_id: str, track_id: str):
+        self._playlist(playlist_id).add_track(self._track(track_id))
+
+    async def remove_from_playlist(self, playlist_id: str, track_id: str):
+        self._playlist(playlist_id).remove_track(track_id)
+
+    async def play(self, track_id: str, session: Optional[Session] = None):
+        """Прослушивание; при подключенном PlayRecorder учитывается без вывода в stdout"""
+        user_id = session.user.user_id if session is not None else None
+        if self.recorder is not None:
+            self.recorder.record_play(track_id, user_id)
+        else:
+            self._track(track_id).play()
+
+    # --- длительные операции ---
+
+    async def _run_job(self, func: Callable, *args):
+        if self._pending >= self.max_pending:
+            raise MusicServiceError("Слишком много фоновых задач, повторите позже")
+        self._pending += 1
+        try:
+            async with self._slots:
+                cancel = threading.Event()
+
+                def job():
+                    with cancellation_scope(cancel):
+                        return func(*args)
+
+                future = asyncio.get_running_loop().run_in_executor(self._executor, job)
+                try:
+                    return await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    # Поток нельзя остановить извне: просим запись прерваться
+                    # и держим слот, пока задача действительно не завершится
+                    cancel.set()
+                    try:
+                        await future
+                    except Exception:
+                        pass
+                    raise
+        finally:
+            self._pending -= 1
+
+    async def export_to_json(self, filename: str, compact: bool = False):
+        return await self._run_job(FileOperations.export_to_json, self.service, filename, compact)
+
+    async def export_to_xml(self, filename: str):
+        return await self._run_job(FileOperations.export_to_xml, self.service, filename)
+
+    async def create_backup(self, backup_dir: str = "backups", compression: Optional[str] = None):
+        return await self._run_job(FileOperations.create_backup, self.service, backup_dir, compression)
+
+    def close(self):
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,874 @@
+"""
+Модуль с бенчмарками производительности музыкального сервиса
+"""
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, List
+from xml.sax.saxutils import escape
+
+from models import MusicService, User, Artist, Track, Album, Playlist, PlaylistTrack
+from file_operations import FileOperations
+from oplog import OperationLog
+from play_events import PlayRecorder
+from charts import ChartsEngine
+from recommendations import RecommendationEngine
+from async_service import AsyncMusicService
+from event_log import configure_logging, shutdown_logging
+from datagen import SyntheticCatalog, WORDS
+from instrumentation import instrumentation
+
+
+def build_catalog(tracks_count: int, artists_count: int = 1000, seed: int = 42) -> MusicService:
+    """Создание сервиса с синтетическим каталогом заданного размера"""
+    rnd = random.Random(seed)
+    service = MusicService()
+
+    artists = []
+    for i in range(artists_count):
+        artist = Artist(f"artist_{i}", f"{rnd.choice(WORDS).title()} {rnd.choice(WORDS).title()} {i}")
+        service.artists[artist.artist_id] = artist
+        artists.append(artist)
+
+    for i in range(tracks_count):
+        title = " ".join(rnd.choice(WORDS) for _ in range(3)).title()
+        track = Track(f"track_{i}", f"{title} {i}", rnd.randint(60, 600), "", rnd.choice(artists))
+        service.store_track(track)
+
+    return service
+
+
+def linear_search(service: MusicService, query: str) -> List[Track]:
+    """Исходный поиск полным просмотром каталога (для сравнения)"""
+    query_lower = query.lower()
+    return [track for track in service.tracks.values()
+            if query_lower in track.title.lower() or query_lower in track.artist.name.lower()]
+
+
+def _time_per_call(func: Callable, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def bench_search(sizes=(10_000, 100_000, 1_000_000), queries=("queen", "storm river", "ove 12", "xyz")) -> List[Dict]:
+    """Сравнение индексного поиска с линейным просмотром"""
+    results = []
+    for size in sizes:
+        service = build_catalog(size)
+        for query in queries:
+            repeat = max(1, 100_000 // size)
+            indexed = _time_per_call(lambda: service.search_tracks(query), repeat * 10)
+            linear = _time_per_call(lambda: linear_search(service, query), repeat)
+            results.append({
+                'size': size,
+                'query': query,
+                'matches': len(service.search_tracks(query)),
+                'indexed_ms': indexed * 1000,
+                'linear_ms': linear * 1000,
+            })
+    return results
+
+
+def write_synthetic_xml(filename: str, target_mb: float, artists_count: int = 1000, seed: int = 42) -> int:
+    """
+    Запись синтетического XML в формате export_to_xml размером около target_mb.
+    Файл пишется потоково; возвращает количество треков.
+    """
+    rnd = random.Random(seed)
+    target_bytes = int(target_mb * 1024 * 1024)
+    artist_names = [f"{rnd.choice(WORDS).title()} {rnd.choice(WORDS).title()} {i}" for i in range(artists_count)]
+
+    with open(filename, 'w', encoding='utf-8') as f:
+        written = f.write("<?xml version='1.0' encoding='utf-8'?>\n<MusicService><Users>")
+        for i in range(100):
+            written += f.write(f"<User><user_id>user_{i}</user_id><username>user_{i}</username>"
+                               f"<email>user_{i}@example.com</email><premium>{i % 2 == 0}</premium></User>")
+        written += f.write("</Users><Artists>")
+        for i, name in enumerate(artist_names):
+            written += f.write(f"<Artist><artist_id>artist_{i}</artist_id><name>{escape(name)}</name>"
+                               f"<bio>Synthetic artist {i}</bio></Artist>")
+        written += f.write("</Artists><Tracks>")
+        tracks_count = 0
+        while written < target_bytes:
+            title = " ".join(rnd.choice(WORDS) for _ in range(3)).title()
+            written += f.write(f"<Track><track_id>track_{tracks_count}</track_id><title>{title} {tracks_count}</title>"
+                               f"<duration>{rnd.randint(60, 600)}</duration>"
+                               f"<artist>{escape(rnd.choice(artist_names))}</artist>"
+                               f"<file_path>/music/{tracks_count}.mp3</file_path><stream_count>0</stream_count>"
+                               f"<album>None</album></Track>")
+            tracks_count += 1
+        f.write("</Tracks><Albums>")
+        for i in range(artists_count):
+            f.write(f"<Album><album_id>album_{i}</album_id><title>Album {i}</title>"
+                    f"<artist>{escape(artist_names[i])}</artist><release_date>2000-01-01</release_date>"
+                    f"<genre>Rock</genre></Album>")
+        f.write("</Albums></MusicService>")
+
+    return tracks_count
+
+
+def tree_load_xml(service: MusicService, filename: str) -> int:
+    """Исходная загрузка XML через ET.parse и find() (для сравнения)"""
+    root = ET.parse(filename).getroot()
+    loaded = 0
+    for user_elem in root.find('Users').findall('User'):
+        user = User(user_elem.find('user_id').text, user_elem.find('username').text,
+                    user_elem.find('email').text, "default_password",
+                    user_elem.find('premium').text.lower() == 'true')
+        service.store_user(user)
+        loaded += 1
+    for artist_elem in root.find('Artists').findall('Artist'):
+        service.store_artist(Artist(artist_elem.find('artist_id').text, artist_elem.find('name').text,
+                                    artist_elem.find('bio').text))
+        loaded += 1
+    for track_elem in root.find('Tracks').findall('Track'):
+        artist = service.find_artist_by_name(track_elem.find('artist').text)
+        service.store_track(Track(track_elem.find('track_id').text, track_elem.find('title').text,
+                                  int(track_elem.find('duration').text), track_elem.find('file_path').text, artist))
+        loaded += 1
+    for album_elem in root.find('Albums').findall('Album'):
+        artist = service.find_artist_by_name(album_elem.find('artist').text)
+        service.store_album(Album(album_elem.find('album_id').text, album_elem.find('title').text, artist,
+                                  album_elem.find('release_date').text, album_elem.find('genre').text))
+        loaded += 1
+    return loaded
+
+
+def _xml_load_worker(mode: str, filename: str) -> Dict:
+    """Загрузка в отдельном процессе, чтобы пиковый RSS не зависел от других замеров"""
+    service = MusicService()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == 'iterparse':
+            loaded, _ = FileOperations.load_initial_data(service, None, filename)
+        else:
+            loaded = tree_load_xml(service, filename)
+    elapsed = time.perf_counter() - started
+    return {
+        'elapsed_s': elapsed,
+        'loaded': loaded,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def bench_xml_load(size_mb: float = 500) -> List[Dict]:
+    """Сравнение памяти и скорости iterparse-загрузки с ET.parse на сгенерированном XML"""
+    results = []
+    fd, filename = tempfile.mkstemp(suffix='.xml')
+    os.close(fd)
+    try:
+        write_synthetic_xml(filename, size_mb)
+        file_mb = os.path.getsize(filename) / (1024 * 1024)
+        ctx = multiprocessing.get_context('spawn')
+        for mode in ('tree', 'iterparse'):
+            with ctx.Pool(1) as pool:
+                row = pool.apply(_xml_load_worker, (mode, filename))
+            row.update({'mode': mode, 'file_mb': file_mb,
+                        'throughput_mb_s': file_mb / row['elapsed_s']})
+            results.append(row)
+    finally:
+        os.remove(filename)
+    return results
+
+
+def bench_oplog(tracks_count: int = 100_000, operations: int = 100_000,
+                group_sizes=(1, 16, 64, 256)) -> List[Dict]:
+    """Стоимость журналирования операции при разных размерах группового fsync"""
+    results = []
+    service = build_catalog(tracks_count)
+    tracks = list(service.tracks.values())
+    for group_size in group_sizes:
+        with tempfile.TemporaryDirectory() as log_dir:
+            log = OperationLog(log_dir, group_commit_size=group_size, group_commit_interval=3600,
+                               background_sync=False)
+            log.attach(service)
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for i in range(operations):
+                    tracks[i % len(tracks)].play()
+            log.close()
+            elapsed = time.perf_counter() - started
+        results.append({'group_commit_size': group_size, 'operations': operations,
+                        'us_per_op': elapsed / operations * 1e6})
+
+    with tempfile.TemporaryDirectory() as export_dir:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            FileOperations.export_to_json(service, os.path.join(export_dir, "dump.json"))
+        results.append({'full_export_ms': (time.perf_counter() - started) * 1000})
+    return results
+
+
+def bench_plays(tracks_count: int = 100_000, plays_per_thread: int = 200_000,
+                thread_counts=(1, 2, 4, 8)) -> List[Dict]:
+    """
+    Пропускная способность приема прослушиваний из нескольких потоков.
+    Сервис журналируется OperationLog, как в рабочем режиме.
+    """
+    service = build_catalog(tracks_count)
+    rnd = random.Random(1)
+    track_ids = list(service.tracks)
+    plays = [rnd.choice(track_ids) for _ in range(plays_per_thread)]
+    results = []
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        log = OperationLog(log_dir)
+        log.attach(service)
+        started = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for track_id in plays:
+                service.tracks[track_id].play()
+        log.close()
+        elapsed = time.perf_counter() - started
+    results.append({'method': 'Track.play', 'threads': 1, 'plays_per_sec': len(plays) / elapsed})
+
+    for threads in thread_counts:
+        with tempfile.TemporaryDirectory() as log_dir:
+            log = OperationLog(log_dir)
+            log.attach(service)
+            recorder = PlayRecorder(service, flush_interval=0.1)
+
+            def worker():
+                record = recorder.record_play
+                for track_id in plays:
+                    record(track_id)
+
+            workers = [threading.Thread(target=worker) for _ in range(threads)]
+            started = time.perf_counter()
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            recorder.close()
+            log.close()
+            elapsed = time.perf_counter() - started
+        results.append({'method': 'record_play', 'threads': threads,
+                        'plays_per_sec': threads * len(plays) / elapsed})
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        service.get_statistics()
+    results.append({'get_statistics_us': (time.perf_counter() - started) * 1000})
+    return results
+
+
+def bench_charts(tracks_count: int = 1_000_000, events: int = 1_000_000, queries: int = 1000) -> List[Dict]:
+    """Стоимость учета прослушивания и запроса топа при большом каталоге"""
+    rnd = random.Random(3)
+    service = MusicService()
+    artists = [Artist(f"artist_{i}", f"Artist {i}") for i in range(10_000)]
+    for artist in artists:
+        service.artists[artist.artist_id] = artist
+    tracks = [Track(f"track_{i}", f"Title {i}", 200, "", artists[i % len(artists)]) for i in range(tracks_count)]
+    for track in tracks:
+        service.tracks[track.track_id] = track
+
+    now = [0.0]
+    charts = ChartsEngine(clock=lambda: now[0])
+    charts.attach(service)
+    # Популярность треков распределена по степенному закону, время идет неделю
+    played = [tracks[min(int(rnd.paretovariate(1.2)) - 1, tracks_count - 1) * 7919 % tracks_count]
+              for _ in range(events)]
+    step = 7 * 86400 / events
+    started = time.perf_counter()
+    for track in played:
+        now[0] += step
+        charts.record(track)
+    record_seconds = time.perf_counter() - started
+
+    results = [{'tracks': tracks_count, 'events': events, 'record_us': record_seconds / events * 1e6}]
+    for window in charts.windows:
+        started = time.perf_counter()
+        for _ in range(queries):
+            charts.top_tracks(10, window)
+            charts.top_artists(10, window)
+        elapsed = time.perf_counter() - started
+        results.append({'window': window, 'top10_query_us': elapsed / (2 * queries) * 1e6})
+
+    started = time.perf_counter()
+    sorted(tracks, key=lambda t: charts.score('tracks', t.track_id, 'day'), reverse=True)[:10]
+    results.append({'full_sort_ms': (time.perf_counter() - started) * 1000})
+    return results
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench_async_latency(tracks_count: int = 100_000, rate: int = 1000, seconds: float = 2.0) -> List[Dict]:
+    """
+    Нагрузочный тест асинхронного интерфейса: запросы (поиск, прослушивание,
+    список плейлистов) поступают с постоянной частотой rate в секунду,
+    задержка считается от планового момента поступления до ответа, то есть
+    включает простои цикла событий. Сравниваются фаза без фоновых задач
+    и фаза, пока выполняется резервное копирование.
+    """
+    service = build_catalog(tracks_count)
+    with contextlib.redirect_stdout(io.StringIO()):
+        service.register_user("load", "load@example.com", "pwd")
+    recorder = PlayRecorder(service)
+    facade = AsyncMusicService(service, recorder=recorder, freeze_gc=True)
+    track_ids = list(service.tracks)
+    rnd = random.Random(5)
+
+    async def request(session, kind: int):
+        if kind == 0:
+            title = service.tracks[rnd.choice(track_ids)].title
+            await facade.search_tracks(" ".join(title.split()[-2:]))
+        elif kind == 1:
+            await facade.play(rnd.choice(track_ids), session)
+        else:
+            await facade.get_user_playlists(session)
+
+    async def phase(session, duration: float, background=None) -> List[float]:
+        loop = asyncio.get_running_loop()
+        latencies: List[float] = []
+        tasks = []
+
+        async def timed(arrival: float, kind: int):
+            await request(session, kind)
+            latencies.append(loop.time() - arrival)
+
+        start = loop.time()
+        count = 0
+        while True:
+            now = loop.time()
+            if background is not None:
+                if background.done():
+                    break
+            elif now - start >= duration:
+                break
+            # Открытая модель нагрузки: запросы поступают по расписанию
+            while start + count / rate <= now:
+                tasks.append(asyncio.ensure_future(timed(start + count / rate, count % 3)))
+                count += 1
+            await asyncio.sleep(0.0005)
+        await asyncio.gather(*tasks)
+        return latencies
+
+    async def run() -> List[Dict]:
+        session = await facade.login("load@example.com", "pwd")
+        idle = await phase(session, seconds)
+        with tempfile.TemporaryDirectory() as backup_dir:
+            backup = asyncio.ensure_future(facade.create_backup(backup_dir))
+            busy = await phase(session, seconds, background=backup)
+            await backup
+        rows = []
+        for name, latencies in (('idle', idle), ('during_backup', busy)):
+            rows.append({'phase': name, 'requests': len(latencies),
+                         'p50_ms': _percentile(latencies, 0.5) * 1000,
+                         'p99_ms': _percentile(latencies, 0.99) * 1000,
+                         'max_ms': max(latencies) * 1000})
+        return rows
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(run())
+    facade.close()
+    recorder.close()
+    return results
+
+
+def bench_logging(operations: int = 100_000) -> List[Dict]:
+    """Стоимость сообщения на горячем пути: прямой print, очередь журнала, журнал выключен"""
+    artist = Artist("artist", "Artist")
+    owner = User("owner", "owner", "owner@example.com", "pwd")
+    tracks = [Track(f"track_{i}", f"Title {i}", 200, "", artist) for i in range(operations)]
+    results = []
+
+    with open(os.devnull, 'w') as devnull:
+        started = time.perf_counter()
+        for track in tracks:
+            print(f"Трек {track.title} добавлен в плейлист Big", file=devnull)
+        results.append({'mode': 'print', 'us_per_message': (time.perf_counter() - started) / operations * 1e6})
+
+        for mode in ('queued', 'disabled'):
+            if mode == 'queued':
+                configure_logging(stream=devnull)
+            playlist = Playlist("playlist", "Big", "", owner)
+            started = time.perf_counter()
+            for track in tracks:
+                playlist.add_track(track)
+            elapsed = time.perf_counter() - started
+            shutdown_logging()
+            results.append({'mode': mode, 'us_per_add_track': elapsed / operations * 1e6})
+    return results
+
+
+def bench_instrumentation(tracks_count: int = 20_000, calls: int = 100_000) -> List[Dict]:
+    """Накладные расходы инструментирования: короткий метод, загрузчик JSON (выключено/включено)"""
+    catalog = SyntheticCatalog(tracks_count)
+    service = build_catalog(1000)
+    results = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        json_file = os.path.join(data_dir, "catalog.json")
+        catalog.write_json(json_file)
+        for mode in ('disabled', 'enabled'):
+            if mode == 'enabled':
+                instrumentation.enable()
+            started = time.perf_counter()
+            for _ in range(calls):
+                service.get_statistics()
+            method_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            FileOperations.load_initial_data(MusicService(), json_file, None)
+            load_seconds = time.perf_counter() - started
+            instrumentation.disable()
+            results.append({'mode': mode, 'get_statistics_us': method_seconds / calls * 1e6,
+                            'load_json_s': load_seconds})
+    instrumentation.reset()
+    return results
+
+
+def bench_recommendations(tracks_count: int = 200_000, playlists_count: int = 50_000,
+                          playlist_length: int = 20, queries: int = 1000) -> List[Dict]:
+    """
+    Рекомендации по совместной встречаемости: построение по всем
+    плейлистам, обновление по событию и запросы для трека и плейлиста
+    """
+    rnd = random.Random(11)
+    service = MusicService()
+    owner = User("owner", "owner", "owner@example.com", "pwd")
+    service.store_user(owner)
+    artists = [Artist(f"artist_{i}", f"Artist {i}") for i in range(1000)]
+    tracks = [Track(f"track_{i}", f"Title {i}", 200, "", artists[i % len(artists)]) for i in range(tracks_count)]
+    service.store_tracks(tracks)
+
+    def pick() -> Track:
+        # Популярность треков распределена по степенному закону
+        return tracks[min(int(rnd.paretovariate(1.2)) - 1, tracks_count - 1) * 7919 % tracks_count]
+
+    playlists = []
+    for i in range(playlists_count):
+        playlist = Playlist(f"playlist_{i}", f"Mix {i}", "", owner)
+        playlist.add_tracks(pick() for _ in range(playlist_length))
+        service.store_playlist(playlist)
+        playlists.append(playlist)
+    gc.collect()
+
+    engine = RecommendationEngine()
+    attach = _measure(lambda: engine.attach(service))
+    update = _measure(lambda: [rnd.choice(playlists).add_track(pick()) for _ in range(queries)], queries)
+    seeds = [pick().track_id for _ in range(queries)]
+    cold = _measure(lambda: [engine.similar_tracks(track_id) for track_id in seeds], queries)
+    warm = _measure(lambda: [engine.similar_tracks(track_id) for track_id in seeds], queries)
+    continued = _measure(lambda: [engine.continue_playlist(rnd.choice(playlists).playlist_id)
+                                  for _ in range(queries)], queries)
+    return [{'playlist_entries': playlists_count * playlist_length, 'attach_s': attach['total_s'],
+             'update_us': update['us_per_call'], 'similar_cold_ms': cold['us_per_call'] / 1000,
+             'similar_warm_ms': warm['us_per_call'] / 1000, 'continue_playlist_ms': continued['us_per_call'] / 1000}]
+
+
+def bench_user_export(tracks_count: int = 100_000, users_count: int = 2000, playlists_count: int = 20_000,
+                      workers=(1, 4)) -> List[Dict]:
+    """Экспорт данных одного пользователя и пакетный экспорт всех пользователей"""
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog_file = os.path.join(tmp, "catalog.json")
+        SyntheticCatalog(tracks_count, users=users_count, playlists=playlists_count).write_json(catalog_file)
+        service = MusicService()
+        FileOperations.load_initial_data(service, catalog_file)
+        user_ids = list(service.users)
+        user = service.users[user_ids[0]]
+
+        single = _measure(lambda: [FileOperations.export_user_data(service, user.user_id,
+                                                                   os.path.join(tmp, "user.json"))
+                                   for _ in range(100)], 100)
+        # Прежний способ найти плейлисты пользователя - просмотр всех плейлистов
+        scan = _measure(lambda: [[p for p in service.playlists.values() if p.owner is user]
+                                 for _ in range(100)], 100)
+        results = [{'operation': 'export_user_data', 'users': 1, 'ms': single['us_per_call'] / 1000,
+                    'owner_scan_ms': scan['us_per_call'] / 1000}]
+        for max_workers in workers:
+            output_dir = os.path.join(tmp, f"users_{max_workers}")
+            batch = _measure(lambda: FileOperations.export_users_data(service, user_ids, output_dir,
+                                                                      max_workers=max_workers))
+            results.append({'operation': 'export_users_data', 'users': len(user_ids), 'workers': max_workers,
+                            'total_s': batch['total_s']})
+        return results
+
+
+def bench_query_cache(tracks_count: int = 100_000, distinct_queries: int = 2000, requests: int = 20_000,
+                      write_share: float = 0.01) -> List[Dict]:
+    """
+    Поиск при неравномерном потоке запросов (степенной закон) с долей
+    добавлений треков: без кэша (max_entries=0) и с кэшем
+    """
+    catalog = SyntheticCatalog(tracks_count)
+    records = [{'title': record['title'], 'duration': record['duration'], 'file_path': record['file_path'],
+                'artist': record['artist']} for record in catalog.tracks()]
+    rnd = random.Random(17)
+    queries = [" ".join(rnd.sample(WORDS, 2)) if i % 2 else rnd.choice(WORDS) + str(i) for i in range(distinct_queries)]
+    workload = []
+    for _ in range(requests):
+        if rnd.random() < write_share:
+            workload.append(None)
+        else:
+            workload.append(queries[min(int(rnd.paretovariate(1.1)) - 1, distinct_queries - 1)])
+
+    results = []
+    for max_entries in (0, 1024):
+        service = MusicService()
+        service.register_user("owner", "owner@example.com", "pwd")
+        service.login("owner@example.com", "pwd")
+        service.add_tracks(records)
+        service.search_tracks("warm-up")
+        service.query_cache.max_entries = max_entries
+        added = iter(range(requests))
+
+        def run():
+            for query in workload:
+                if query is None:
+                    service.add_track(f"{' '.join(rnd.sample(WORDS, 2))} {next(added)}", 200, "", "Cache Band")
+                else:
+                    service.search_tracks(query)
+
+        timing = _measure(run, len(workload))
+        stats = service.query_cache.stats()
+        results.append({'max_entries': max_entries, 'requests': len(workload), 'us_per_request': timing['us_per_call'],
+                        'hit_rate': stats['hit_rate'], 'evictions': stats['evictions'],
+                        'invalidations': stats['invalidations']})
+    return results
+
+
+def bench_bulk(tracks_count: int = 200_000, users_count: int = 50_000, entries_count: int = 200_000) -> List[Dict]:
+    """
+    Пакетные методы против цикла по одиночным: треки (с первым поиском,
+    достраивающим индекс), пользователи и записи плейлистов
+    """
+    catalog = SyntheticCatalog(tracks_count)
+    tracks = [{'title': record['title'], 'duration': record['duration'], 'file_path': record['file_path'],
+               'artist': record['artist']} for record in catalog.tracks()]
+    users = [{'username': f"bulk_{i}", 'email': f"bulk_{i}@example.com", 'password': "pwd"}
+             for i in range(users_count)]
+
+    def fresh_service() -> MusicService:
+        service = MusicService()
+        service.register_user("owner", "owner@example.com", "pwd")
+        service.login("owner@example.com", "pwd")
+        gc.collect()
+        return service
+
+    results = []
+    service = fresh_service()
+    single = _measure(lambda: [service.add_track(t['title'], t['duration'], t['file_path'], t['artist'])
+                               for t in tracks], len(tracks))
+    service = fresh_service()
+    bulk = _measure(lambda: service.add_tracks(tracks), len(tracks))
+    indexed = _measure(lambda: service.search_tracks("queen"), len(tracks))
+    results.append({'operation': 'tracks', 'items': len(tracks), 'single_us': single['us_per_call'],
+                    'bulk_us': bulk['us_per_call'], 'speedup': single['total_s'] / bulk['total_s'],
+                    'speedup_with_index': single['total_s'] / (bulk['total_s'] + indexed['total_s'])})
+
+    service = fresh_service()
+    single = _measure(lambda: [service.register_user(u['username'], u['email'], u['password']) for u in users],
+                      len(users))
+    service = fresh_service()
+    bulk = _measure(lambda: service.register_users(users), len(users))
+    results.append({'operation': 'users', 'items': len(users), 'single_us': single['us_per_call'],
+                    'bulk_us': bulk['us_per_call'], 'speedup': single['total_s'] / bulk['total_s']})
+
+    service.add_tracks(tracks)
+    track_list = list(service.tracks.values())
+    playlists = [service.create_playlist(f"Bulk {i}") for i in range(1000)]
+    entries = [(playlists[i % len(playlists)].playlist_id, track_list[i % len(track_list)].track_id)
+               for i in range(entries_count)]
+    gc.collect()
+    single = _measure(lambda: [service.playlists[playlist_id].add_track(service.tracks[track_id])
+                               for playlist_id, track_id in entries], len(entries))
+    gc.collect()
+    bulk = _measure(lambda: service.add_playlist_tracks(entries), len(entries))
+    results.append({'operation': 'playlist_entries', 'items': len(entries), 'single_us': single['us_per_call'],
+                    'bulk_us': bulk['us_per_call'], 'speedup': single['total_s'] / bulk['total_s']})
+    return results
+
+
+def bench_cold_start(tracks_count: int = 200_000) -> List[Dict]:
+    """Время холодного старта: JSON+XML против бинарного снимка"""
+    source = build_catalog(tracks_count)
+    results = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        json_file = os.path.join(data_dir, "data.json")
+        xml_file = os.path.join(data_dir, "data.xml")
+        binary_file = os.path.join(data_dir, "data.bin")
+        with contextlib.redirect_stdout(io.StringIO()):
+            FileOperations.export_to_json(source, json_file)
+            FileOperations.export_to_xml(source, xml_file)
+            FileOperations.export_to_binary(source, binary_file)
+
+        for label, load in (
+                ('json+xml', lambda service: FileOperations.load_initial_data(service, json_file, xml_file)),
+                ('binary', lambda service: FileOperations.load_from_binary(service, binary_file))):
+            service = MusicService()
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                load(service)
+            results.append({'format': label, 'tracks': len(service.tracks),
+                            'startup_s': time.perf_counter() - started})
+        results.append({'json_mb': os.path.getsize(json_file) / 1e6, 'xml_mb': os.path.getsize(xml_file) / 1e6,
+                        'binary_mb': os.path.getsize(binary_file) / 1e6})
+    return results
+
+
+def bench_memory(tracks_count: int = 100_000, playlist_entries: int = 100_000) -> List[Dict]:
+    """Объем памяти на трек и на запись плейлиста (tracemalloc)"""
+    rnd = random.Random(42)
+    artists = [Artist(f"artist_{i}", f"Artist {i % 100}") for i in range(1000)]
+    genres = ["Rock", "Pop", "Jazz", "Blues"]
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracks = [Track(f"track_{i}", f"Title {i}", 200, "", artists[i % len(artists)])
+              for i in range(tracks_count)]
+    tracks_bytes = tracemalloc.get_traced_memory()[0] - baseline
+
+    owner = User("owner", "owner", "owner@example.com", "pwd")
+    playlist = Playlist("playlist", "Big", "", owner)
+    baseline = tracemalloc.get_traced_memory()[0]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(playlist_entries):
+            playlist.add_track(tracks[rnd.randrange(tracks_count)])
+    entries_bytes = tracemalloc.get_traced_memory()[0] - baseline
+
+    baseline = tracemalloc.get_traced_memory()[0]
+    albums = [Album(f"album_{i}", f"Album {i}", artists[i % len(artists)], "2000-01-01", rnd.choice(genres))
+              for i in range(10_000)]
+    albums_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    return [{'bytes_per_track': tracks_bytes / tracks_count,
+             'bytes_per_playlist_entry': entries_bytes / playlist_entries,
+             'bytes_per_album': albums_bytes / len(albums)}]
+
+
+def list_remove_track(entries: List[PlaylistTrack], track_id: str):
+    """Удаление из плейлиста-списка с перенумерацией позиций (прежняя реализация)"""
+    for i, playlist_track in enumerate(entries):
+        if playlist_track.track.track_id == track_id:
+            entries.pop(i)
+            for j, pt in enumerate(entries[i:], start=i + 1):
+                pt.position = j
+            return
+
+
+def bench_playlist(sizes=(10_000, 100_000), operations: int = 2000) -> List[Dict]:
+    """Удаление, вставка и перемещение треков в начале большого плейлиста"""
+    results = []
+    owner = User("owner", "owner", "owner@example.com", "pwd")
+    for size in sizes:
+        rnd = random.Random(size)
+        artist = Artist("artist", "Artist")
+        tracks = [Track(f"track_{i}", f"Title {i}", 200, "", artist) for i in range(size)]
+        head = [track.track_id for track in tracks[:size // 10]]
+        removed = rnd.sample(head, min(operations, len(head)))
+
+        entries = [PlaylistTrack(track, i) for i, track in enumerate(tracks, start=1)]
+        started = time.perf_counter()
+        for track_id in removed:
+            list_remove_track(entries, track_id)
+        list_seconds = time.perf_counter() - started
+
+        playlist = Playlist("playlist", "Big", "", owner)
+        with contextlib.redirect_stdout(io.StringIO()):
+            playlist.add_tracks(tracks)
+            started = time.perf_counter()
+            for track_id in removed:
+                playlist.remove_track(track_id)
+            remove_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for i in range(operations):
+                playlist.insert_track(tracks[i], 1 + rnd.randrange(len(playlist.tracks) // 10))
+            insert_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(operations):
+            playlist.move_track(1 + rnd.randrange(len(playlist.tracks)), 1 + rnd.randrange(len(playlist.tracks)))
+        move_seconds = time.perf_counter() - started
+
+        results.append({
+            'playlist_size': size,
+            'list_remove_us': list_seconds / len(removed) * 1e6,
+            'indexed_remove_us': remove_seconds / len(removed) * 1e6,
+            'indexed_insert_us': insert_seconds / operations * 1e6,
+            'indexed_move_us': move_seconds / operations * 1e6,
+        })
+    return results
+
+
+def _measure(func: Callable, calls: int = 1) -> Dict:
+    """Время одного вызова func, выполняющего calls операций"""
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    return {'calls': calls, 'total_s': elapsed, 'us_per_call': elapsed / calls * 1e6}
+
+
+def bench_suite(sizes=(1_000, 10_000, 100_000), seed: int = 42) -> List[Dict]:
+    """
+    Сквозной набор замеров на синтетическом каталоге (datagen) нескольких
+    размеров: загрузка JSON и XML, поиск, плейлисты пользователя, удаление
+    трека из плейлиста, экспорт и резервная копия. Все строки результата
+    имеют одинаковые поля и однозначно задаются парой (operation, tracks).
+    """
+    results = []
+    for size in sizes:
+        catalog = SyntheticCatalog(size, seed=seed)
+        rnd = random.Random(seed)
+        rows = []
+        with tempfile.TemporaryDirectory() as data_dir:
+            json_file = os.path.join(data_dir, "catalog.json")
+            xml_file = os.path.join(data_dir, "catalog.xml")
+            catalog.write_json(json_file)
+            catalog.write_xml(xml_file)
+
+            rows.append(('load_initial_data[xml]',
+                         _measure(lambda: FileOperations.load_initial_data(MusicService(), None, xml_file))))
+            service = MusicService()
+            rows.append(('load_initial_data[json]',
+                         _measure(lambda: FileOperations.load_initial_data(service, json_file, None))))
+
+            # Частые слова и редкие сочетания из названий треков
+            queries = WORDS + [" ".join(catalog.track_title(rnd.randrange(size)).split()[-2:])
+                               for _ in range(len(WORDS))]
+            repeat = max(1, 10_000 // size)
+            rows.append(('search_tracks',
+                         _measure(lambda: [service.search_tracks(query) for _ in range(repeat) for query in queries],
+                                  repeat * len(queries))))
+
+            user_ids = rnd.choices(list(service.users), k=1000)
+            rows.append(('get_user_playlists',
+                         _measure(lambda: [service.get_user_playlists(user_id) for user_id in user_ids],
+                                  len(user_ids))))
+
+            # Из каждого выбранного плейлиста удаляется случайный трек
+            playlists = rnd.sample(list(service.playlists.values()), min(1000, len(service.playlists)))
+            removals = [(playlist, playlist.tracks[rnd.randrange(len(playlist.tracks))].track.track_id)
+                        for playlist in playlists if len(playlist.tracks)]
+            rows.append(('Playlist.remove_track',
+                         _measure(lambda: [playlist.remove_track(track_id) for playlist, track_id in removals],
+                                  len(removals))))
+
+            rows.append(('export_to_json',
+                         _measure(lambda: FileOperations.export_to_json(service, os.path.join(data_dir, "out.json")))))
+            rows.append(('export_to_xml',
+                         _measure(lambda: FileOperations.export_to_xml(service, os.path.join(data_dir, "out.xml")))))
+            rows.append(('create_backup',
+                         _measure(lambda: FileOperations.create_backup(service, os.path.join(data_dir, "backups")))))
+
+        for operation, row in rows:
+            results.append({'operation': operation, 'tracks': size, **row})
+    return results
+
+
+def save_results(filename: str, suite: str, results: List[Dict]):
+    """Сохранение результатов в JSON вместе с описанием окружения"""
+    document = {
+        'suite': suite,
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2, ensure_ascii=False)
+
+
+def compare_results(baseline_file: str, current_file: str, tolerance: float = 0.10) -> List[Dict]:
+    """
+    Сравнение двух файлов save_results по строкам (operation, tracks):
+    ratio - отношение текущего времени на вызов к базовому; строки,
+    ставшие медленнее больше чем на tolerance, помечаются как regression.
+    """
+    with open(baseline_file, encoding='utf-8') as f:
+        baseline = {(row['operation'], row['tracks']): row for row in json.load(f)['results']}
+    with open(current_file, encoding='utf-8') as f:
+        current = json.load(f)['results']
+
+    comparison = []
+    for row in current:
+        base = baseline.get((row['operation'], row['tracks']))
+        if base is None:
+            continue
+        ratio = row['us_per_call'] / base['us_per_call'] if base['us_per_call'] else float('inf')
+        comparison.append({'operation': row['operation'], 'tracks': row['tracks'],
+                           'baseline_us': base['us_per_call'], 'current_us': row['us_per_call'],
+                           'ratio': ratio, 'regression': ratio > 1 + tolerance})
+    return comparison
+
+
+def print_results(title: str, results: List[Dict]):
+    print(f"\n{title}")
+    for row in results:
+        print("  " + ", ".join(
+            f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in row.items()
+        ))
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "search"
+    args = sys.argv[2:]
+    if command == "search":
+        sizes = tuple(int(arg) for arg in args) or (10_000, 100_000, 1_000_000)
+        print_results("Поиск треков (индекс vs линейный просмотр)", bench_search(sizes))
+    elif command == "xml":
+        size_mb = float(args[0]) if args else 500
+        print_results("Загрузка XML (ET.parse vs iterparse)", bench_xml_load(size_mb))
+    elif command == "startup":
+        tracks_count = int(args[0]) if args else 200_000
+        print_results("Холодный старт (JSON+XML vs бинарный снимок)", bench_cold_start(tracks_count))
+    elif command == "memory":
+        print_results("Память на объект", bench_memory())
+    elif command == "playlist":
+        sizes = tuple(int(arg) for arg in args) or (10_000, 100_000)
+        print_results("Операции над большим плейлистом (мкс на операцию)", bench_playlist(sizes))
+    elif command == "plays":
+        thread_counts = tuple(int(arg) for arg in args) or (1, 2, 4, 8)
+        print_results("Прием прослушиваний (событий в секунду)", bench_plays(thread_counts=thread_counts))
+    elif command == "charts":
+        tracks_count = int(args[0]) if args else 1_000_000
+        print_results("Чарты (учет прослушивания и запрос топа)", bench_charts(tracks_count))
+    elif command == "async":
+        tracks_count = int(args[0]) if args else 100_000
+        print_results("Задержка асинхронных запросов (фон: резервная копия)", bench_async_latency(tracks_count))
+    elif command == "logging":
+        print_results("Журнал событий на горячем пути (мкс)", bench_logging())
+    elif command == "suite":
+        # python benchmarks.py suite <результаты.json> [размеры...]
+        output = args[0] if args else "benchmark_results.json"
+        sizes = tuple(int(arg) for arg in args[1:]) or (1_000, 10_000, 100_000)
+        results = bench_suite(sizes)
+        save_results(output, "suite", results)
+        print_results(f"Сквозной набор замеров (сохранен в {output})", results)
+    elif command == "compare":
+        comparison = compare_results(args[0], args[1])
+        print_results("Сравнение с базовыми результатами", comparison)
+        sys.exit(1 if any(row['regression'] for row in comparison) else 0)
+    elif command == "bulk":
+        print_results("Пакетные методы против одиночных (мкс на объект)", bench_bulk())
+    elif command == "recommendations":
+        print_results("Рекомендации по плейлистам", bench_recommendations())
+    elif command == "user_export":
+        print_results("Экспорт данных пользователей", bench_user_export())
+    elif command == "cache":
+        print_results("Кэш запросов при неравномерной нагрузке", bench_query_cache())
+    elif command == "instrumentation":
+        print_results("Накладные расходы инструментирования", bench_instrumentation())
+    elif command == "oplog":
+        print_results("Журнал операций (стоимость на операцию)", bench_oplog())
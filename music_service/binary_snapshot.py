@@ -0,0 +1,192 @@
+"""
+Модуль компактного бинарного снимка данных для быстрого холодного старта
+"""
+import struct
+from array import array
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Dict, List
+
+from models import MusicService, User, Artist, Track, Album, Playlist, PlaylistTrack
+from exceptions import InvalidFileFormatError
+
+MAGIC = b'MSNP'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHI')
+_COUNT = struct.Struct('<I')
+# Строки хранятся индексами в общей таблице, ссылки на объекты - номерами записей
+_USER = struct.Struct('<IIIBq')           # id, username, email, premium, created_at (мкс)
+_ARTIST = struct.Struct('<III')           # id, name, bio
+_TRACK = struct.Struct('<IIiIIQ')         # id, title, duration, file_path, artist, stream_count
+_ALBUM = struct.Struct('<IIIIII')         # id, title, artist, release_date, genre, tracks_count
+_PLAYLIST = struct.Struct('<IIIIBqI')     # id, name, description, owner, is_public, created_date, tracks_count
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class _StringTable:
+    """Таблица уникальных строк: каждая строка записывается в файл один раз"""
+
+    def __init__(self):
+        self._index: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def __call__(self, value: str) -> int:
+        value = value or ""
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+
+def _pack_section(record: struct.Struct, rows: List[tuple]) -> bytes:
+    data = bytearray(_COUNT.size + record.size * len(rows))
+    _COUNT.pack_into(data, 0, len(rows))
+    offset = _COUNT.size
+    for row in rows:
+        record.pack_into(data, offset, *row)
+        offset += record.size
+    return bytes(data)
+
+
+def _pack_indexes(indexes: List[int]) -> bytes:
+    values = array('I', indexes)
+    if values.itemsize != 4:
+        raise InvalidFileFormatError("Платформа не поддерживает 32-битные индексы array('I')")
+    return _COUNT.pack(len(values)) + values.tobytes()
+
+
+class BinarySnapshot:
+    """Запись и чтение бинарного снимка MusicService"""
+
+    @staticmethod
+    def save(service: MusicService, filename: str):
+        strings = _StringTable()
+        user_index = {user_id: i for i, user_id in enumerate(service.users)}
+        artist_index = {artist_id: i for i, artist_id in enumerate(service.artists)}
+        track_index = {track_id: i for i, track_id in enumerate(service.tracks)}
+
+        users = [(strings(u.user_id), strings(u.username), strings(u.email), u.premium,
+                  (u.created_at - _EPOCH) // _MICROSECOND)
+                 for u in service.users.values()]
+        artists = [(strings(a.artist_id), strings(a.name), strings(a.bio)) for a in service.artists.values()]
+        tracks = [(strings(t.track_id), strings(t.title), t.duration, strings(t.file_path),
+                   artist_index[t.artist.artist_id], t.stream_count)
+                  for t in service.tracks.values()]
+        albums = [(strings(a.album_id), strings(a.title), artist_index[a.artist.artist_id],
+                   strings(a.release_date), strings(a.genre), len(a.tracks))
+                  for a in service.albums.values()]
+        album_tracks = [track_index[t.track_id] for a in service.albums.values() for t in a.tracks]
+        playlists = [(strings(p.playlist_id), strings(p.name), strings(p.description),
+                      user_index[p.owner.user_id], p.is_public,
+                      (p.created_date - _EPOCH) // _MICROSECOND, len(p.tracks))
+                     for p in service.playlists.values()]
+        playlist_tracks = [track_index[pt.track.track_id] for p in service.playlists.values() for pt in p.tracks]
+
+        text = ''.join(strings.strings).encode('utf-8')
+        lengths = array('I', (len(s) for s in strings.strings))
+
+        with open(filename, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(strings.strings)))
+            f.write(lengths.tobytes())
+            f.write(_COUNT.pack(len(text)))
+            f.write(text)
+            f.write(_pack_section(_USER, users))
+            f.write(_pack_section(_ARTIST, artists))
+            f.write(_pack_section(_TRACK, tracks))
+            f.write(_pack_section(_ALBUM, albums))
+            f.write(_pack_indexes(album_tracks))
+            f.write(_pack_section(_PLAYLIST, playlists))
+            f.write(_pack_indexes(playlist_tracks))
+
+    @staticmethod
+    def load(service: MusicService, filename: str) -> int:
+        """Загрузка снимка в сервис; возвращает количество загруженных объектов"""
+        with open(filename, 'rb') as f:
+            data = memoryview(f.read())
+
+        magic, version, strings_count = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise InvalidFileFormatError(f"Неподдерживаемый бинарный снимок: {bytes(magic)!r} v{version}")
+        offset = _HEADER.size
+
+        lengths = array('I')
+        lengths.frombytes(data[offset:offset + strings_count * 4])
+        offset += strings_count * 4
+        (text_size,) = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        # Весь текст декодируется одним вызовом, строки нарезаются по длинам в символах
+        text = str(data[offset:offset + text_size], 'utf-8')
+        offset += text_size
+        ends = list(accumulate(lengths))
+        strings = [text[end - length:end] for end, length in zip(ends, lengths)]
+
+        def section(record: struct.Struct):
+            nonlocal offset
+            (count,) = _COUNT.unpack_from(data, offset)
+            offset += _COUNT.size
+            rows = record.iter_unpack(data[offset:offset + count * record.size])
+            offset += count * record.size
+            return rows
+
+        def indexes() -> array:
+            nonlocal offset
+            (count,) = _COUNT.unpack_from(data, offset)
+            offset += _COUNT.size
+            values = array('I')
+            values.frombytes(data[offset:offset + count * 4])
+            offset += count * 4
+            return values
+
+        users = []
+        for user_id, username, email, premium, created_at in section(_USER):
+            user = User(strings[user_id], strings[username], strings[email], "default_password", bool(premium))
+            user.created_at = _EPOCH + timedelta(microseconds=created_at)
+            users.append(user)
+            service.store_user(user)
+
+        artists = []
+        for artist_id, name, bio in section(_ARTIST):
+            artist = Artist(strings[artist_id], strings[name], strings[bio])
+            artists.append(artist)
+            service.store_artist(artist)
+
+        tracks = []
+        for track_id, title, duration, file_path, artist, stream_count in section(_TRACK):
+            track = Track(strings[track_id], strings[title], duration, strings[file_path], artists[artist])
+            track.stream_count = stream_count
+            tracks.append(track)
+            service.store_track(track)
+
+        albums = []
+        album_sizes = []
+        for album_id, title, artist, release_date, genre, tracks_count in section(_ALBUM):
+            album = Album(strings[album_id], strings[title], artists[artist], strings[release_date], strings[genre])
+            albums.append(album)
+            album_sizes.append(tracks_count)
+        album_tracks = indexes()
+        position = 0
+        for album, size in zip(albums, album_sizes):
+            for track_index in album_tracks[position:position + size]:
+                track = tracks[track_index]
+                album.tracks.append(track)
+                track.album = album
+            position += size
+            service.store_album(album)
+
+        playlist_rows = list(section(_PLAYLIST))
+        playlist_tracks = indexes()
+        position = 0
+        for playlist_id, name, description, owner, is_public, created_date, size in playlist_rows:
+            playlist = Playlist(strings[playlist_id], strings[name], strings[description],
+                                users[owner], bool(is_public))
+            playlist.created_date = _EPOCH + timedelta(microseconds=created_date)
+            playlist.tracks.extend(PlaylistTrack(tracks[track_index])
+                                   for track_index in playlist_tracks[position:position + size])
+            position += size
+            service.store_playlist(playlist)
+
+        return len(users) + len(artists) + len(tracks) + len(albums) + len(playlist_rows)
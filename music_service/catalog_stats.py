@@ -0,0 +1,126 @@
+"""
+Модуль сводных показателей каталога по альбомам и артистам
+"""
+import threading
+from typing import Dict, Iterable
+
+
+class CatalogTotals:
+    """Сводка по трекам одного альбома или артиста"""
+    __slots__ = ('tracks_count', 'total_duration', 'total_streams')
+
+    def __init__(self):
+        self.tracks_count = 0
+        self.total_duration = 0
+        self.total_streams = 0
+
+    def add(self, tracks_delta: int, duration_delta: int, streams_delta: int):
+        self.tracks_count += tracks_delta
+        self.total_duration += duration_delta
+        self.total_streams += streams_delta
+
+    def copy(self) -> 'CatalogTotals':
+        snapshot = CatalogTotals()
+        snapshot.add(self.tracks_count, self.total_duration, self.total_streams)
+        return snapshot
+
+    def to_dict(self) -> Dict:
+        return {
+            'tracks_count': self.tracks_count,
+            'total_duration': self.total_duration,
+            'total_streams': self.total_streams
+        }
+
+
+def totals_of(tracks: Iterable) -> CatalogTotals:
+    """Сводка, посчитанная проходом по трекам (для каталога без событий)"""
+    totals = CatalogTotals()
+    for track in tracks:
+        totals.add(1, track.duration, track.stream_count)
+    return totals
+
+
+class CatalogAggregates:
+    """
+    Подписчик на события MusicService, поддерживающий для каждого альбома
+    и артиста число треков, их общую длительность и сумму прослушиваний.
+    Показатели меняются на величину изменения: сохранение трека добавляет
+    его к артисту (и вычитает замененный трек), добавление в альбом - к
+    альбому, а изменение stream_count передается сервисом через
+    add_streams. Страница альбома или артиста не просматривает треки.
+    """
+
+    def __init__(self):
+        self._albums: Dict[str, CatalogTotals] = {}
+        self._artists: Dict[str, CatalogTotals] = {}
+        # track_id -> учтенный у артиста трек; album_id -> учтенный альбом
+        self._tracks: Dict[str, object] = {}
+        self._album_objects: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: str, payload: Dict):
+        with self._lock:
+            self._apply(event, payload)
+
+    def _apply(self, event: str, payload: Dict):
+        if event == 'track_stored':
+            self._store_track(payload['track'])
+        elif event == 'tracks_stored':
+            for track in payload['tracks']:
+                self._store_track(track)
+        elif event == 'album_stored':
+            self._store_album(payload['album'])
+        elif event == 'album_track_added':
+            self._add_to_album(payload['album'], (payload['track'],))
+        elif event == 'album_tracks_added':
+            self._add_to_album(payload['album'], payload['tracks'])
+
+    @staticmethod
+    def _totals(index: Dict[str, CatalogTotals], key: str) -> CatalogTotals:
+        totals = index.get(key)
+        if totals is None:
+            totals = index[key] = CatalogTotals()
+        return totals
+
+    def _store_track(self, track):
+        previous = self._tracks.get(track.track_id)
+        if previous is track:
+            return
+        if previous is not None:
+            self._totals(self._artists, previous.artist.artist_id).add(
+                -1, -previous.duration, -previous.stream_count)
+        self._tracks[track.track_id] = track
+        self._totals(self._artists, track.artist.artist_id).add(1, track.duration, track.stream_count)
+
+    def _store_album(self, album):
+        # Альбом может прийти уже с треками (бинарный снимок): один проход по ним
+        self._album_objects[album.album_id] = album
+        self._albums[album.album_id] = totals_of(album.tracks)
+
+    def _add_to_album(self, album, tracks):
+        if self._album_objects.get(album.album_id) is not album:
+            return
+        totals = self._albums[album.album_id]
+        for track in tracks:
+            totals.add(1, track.duration, track.stream_count)
+
+    def add_streams(self, track, delta: int):
+        """Учет изменения stream_count трека у его артиста и альбома"""
+        with self._lock:
+            if self._tracks.get(track.track_id) is track:
+                self._artists[track.artist.artist_id].total_streams += delta
+            album = track.album
+            if album is not None and self._album_objects.get(album.album_id) is album:
+                self._albums[album.album_id].total_streams += delta
+
+    def album(self, album_id: str) -> CatalogTotals:
+        """Сводка альбома (нулевая, если альбом не сохранен)"""
+        with self._lock:
+            totals = self._albums.get(album_id)
+            return totals.copy() if totals is not None else CatalogTotals()
+
+    def artist(self, artist_id: str) -> CatalogTotals:
+        """Сводка артиста (нулевая, если треков нет)"""
+        with self._lock:
+            totals = self._artists.get(artist_id)
+            return totals.copy() if totals is not None else CatalogTotals()
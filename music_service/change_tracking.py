@@ -0,0 +1,104 @@
+"""
+Модуль отслеживания изменений данных для инкрементального резервного копирования
+"""
+import threading
+from typing import Dict, List
+
+SECTIONS = ('users', 'artists', 'tracks', 'albums', 'playlists')
+
+
+class ChangeTracker:
+    """
+    Подписчик на события MusicService, запоминающий измененные объекты
+    с момента последней контрольной точки (полной или инкрементальной копии).
+
+    События приходят из разных потоков, поэтому отметки и их выборка идут
+    под блокировкой. Резервная копия забирает изменения методом take():
+    набор отметок подменяется пустым за один шаг, и изменения, сделанные
+    во время записи копии, остаются до следующей копии.
+    """
+
+    def __init__(self):
+        self._dirty: Dict[str, Dict[str, object]] = {section: {} for section in SECTIONS}
+        self.sequence = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, event: str, payload: Dict):
+        if event in ('user_stored', 'user_updated'):
+            self.mark('users', payload['user'].user_id, payload['user'])
+        elif event == 'artist_stored':
+            self.mark('artists', payload['artist'].artist_id, payload['artist'])
+        elif event == 'users_stored':
+            for user in payload['users']:
+                self.mark('users', user.user_id, user)
+        elif event in ('track_stored', 'track_played'):
+            self.mark('tracks', payload['track'].track_id, payload['track'])
+        elif event == 'tracks_stored':
+            for track in payload['tracks']:
+                self.mark('tracks', track.track_id, track)
+        elif event == 'album_stored':
+            album = payload['album']
+            self.mark('albums', album.album_id, album)
+            # У артиста меняется количество альбомов
+            self.mark('artists', album.artist.artist_id, album.artist)
+        elif event == 'album_track_added':
+            album, track = payload['album'], payload['track']
+            self.mark('albums', album.album_id, album)
+            self.mark('tracks', track.track_id, track)
+        elif event == 'album_tracks_added':
+            album = payload['album']
+            self.mark('albums', album.album_id, album)
+            for track in payload['tracks']:
+                self.mark('tracks', track.track_id, track)
+        elif event in ('playlist_stored', 'playlist_track_added', 'playlist_tracks_added',
+                       'playlist_track_removed', 'playlist_track_moved', 'playlist_cleared'):
+            self.mark('playlists', payload['playlist'].playlist_id, payload['playlist'])
+
+    def mark(self, section: str, entity_id: str, entity):
+        with self._lock:
+            self._dirty[section][entity_id] = entity
+
+    def has_changes(self) -> bool:
+        with self._lock:
+            return any(self._dirty.values())
+
+    def changes(self) -> Dict[str, List]:
+        """Измененные объекты по секциям"""
+        with self._lock:
+            return {section: list(entities.values()) for section, entities in self._dirty.items()}
+
+    def changes_count(self) -> int:
+        with self._lock:
+            return sum(len(entities) for entities in self._dirty.values())
+
+    def take(self) -> Dict[str, Dict[str, object]]:
+        """
+        Забрать измененные объекты по секциям (ID -> объект): отметки
+        атомарно заменяются пустыми, последующие изменения копятся в новом наборе
+        """
+        with self._lock:
+            taken, self._dirty = self._dirty, {section: {} for section in SECTIONS}
+        return taken
+
+    def restore(self, taken: Dict[str, Dict[str, object]]):
+        """
+        Возврат забранных изменений, если копия не записана. Более новые
+        отметки тех же объектов не перезаписываются.
+        """
+        with self._lock:
+            for section, entities in taken.items():
+                dirty = self._dirty[section]
+                for entity_id, entity in entities.items():
+                    dirty.setdefault(entity_id, entity)
+
+    def commit(self):
+        """Контрольная точка после успешной записи копии из забранных изменений"""
+        with self._lock:
+            self.sequence += 1
+
+    def checkpoint(self):
+        """Контрольная точка: текущее состояние сохранено, изменения сбрасываются"""
+        with self._lock:
+            for entities in self._dirty.values():
+                entities.clear()
+            self.sequence += 1
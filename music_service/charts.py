@@ -0,0 +1,149 @@
+"""
+Модуль чартов: популярность треков, артистов и альбомов с экспоненциальным затуханием
+"""
+import heapq
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from models import MusicService, Track
+
+WINDOWS = {'hour': 3600.0, 'day': 86400.0, 'week': 7 * 86400.0}
+KINDS = ('tracks', 'artists', 'albums')
+
+# Показатель экспоненты, после которого счет переносится к новой точке отсчета
+_REBASE_EXPONENT = 60.0
+
+
+class _DecayedTop:
+    """
+    Счета одного вида объектов в одном окне. Используется прямое затухание
+    (forward decay): прослушивание в момент t весит exp((t - landmark) / tau),
+    поэтому накопленные счета только растут, а их порядок со временем не
+    меняется - текущий счет отличается от хранимого общим множителем
+    exp(-(now - landmark) / tau). Благодаря этому топ поддерживается
+    ленивой кучей: при каждом росте счета в кучу добавляется новая запись,
+    устаревшие записи отбрасываются при запросе.
+    """
+
+    def __init__(self, tau: float, landmark: float):
+        self.tau = tau
+        self.landmark = landmark
+        self.scores: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+
+    def weight(self, timestamp: float) -> float:
+        return math.exp((timestamp - self.landmark) / self.tau)
+
+    def add(self, key: str, amount: float):
+        score = self.scores.get(key, 0.0) + amount
+        self.scores[key] = score
+        heapq.heappush(self._heap, (-score, key))
+        if len(self._heap) > 2 * len(self.scores) + 64:
+            self._rebuild()
+
+    def _rebuild(self):
+        self._heap = [(-score, key) for key, score in self.scores.items()]
+        heapq.heapify(self._heap)
+
+    def rebase(self, landmark: float):
+        """Перенос точки отсчета, чтобы веса не переполняли float"""
+        factor = math.exp((self.landmark - landmark) / self.tau)
+        self.scores = {key: score * factor for key, score in self.scores.items() if score * factor > 0.0}
+        self.landmark = landmark
+        self._rebuild()
+
+    def top(self, k: int) -> List[Tuple[str, float]]:
+        """k лучших ключей с хранимыми счетами, без сортировки всех счетов"""
+        heap = self._heap
+        scores = self.scores
+        result: List[Tuple[str, float]] = []
+        valid: List[Tuple[float, str]] = []
+        while heap and len(result) < k:
+            entry = heapq.heappop(heap)
+            neg_score, key = entry
+            # Запись устарела: для ключа есть запись с большим счетом
+            if scores.get(key) != -neg_score:
+                continue
+            valid.append(entry)
+            result.append((key, -neg_score))
+        for entry in valid:
+            heapq.heappush(heap, entry)
+        return result
+
+
+class ChartsEngine:
+    """
+    Чарты по событиям прослушивания сервиса: для каждого окна (час, день,
+    неделя) хранится счет с затуханием exp(-возраст / окно) по трекам,
+    артистам и альбомам. Подключается к сервису как подписчик событий
+    track_played (их порождают Track.play и PlayRecorder).
+    """
+
+    def __init__(self, windows: Optional[Dict[str, float]] = None, clock: Callable[[], float] = time.time):
+        self.windows = dict(windows or WINDOWS)
+        self.clock = clock
+        self._service: Optional[MusicService] = None
+        self._lock = threading.Lock()
+        now = clock()
+        self._tops: Dict[Tuple[str, str], _DecayedTop] = {
+            (kind, window): _DecayedTop(tau, now)
+            for kind in KINDS for window, tau in self.windows.items()
+        }
+
+    def attach(self, service: MusicService):
+        self._service = service
+        service.add_listener(self)
+
+    def detach(self):
+        if self._service is not None:
+            self._service.remove_listener(self)
+            self._service = None
+
+    def __call__(self, event: str, payload: Dict):
+        if event == 'track_played':
+            self.record(payload['track'], payload.get('count', 1))
+
+    def record(self, track: Track, count: int = 1, timestamp: Optional[float] = None):
+        """Учет count прослушиваний трека в момент timestamp (по умолчанию - сейчас)"""
+        timestamp = self.clock() if timestamp is None else timestamp
+        keys = [('tracks', track.track_id), ('artists', track.artist.artist_id)]
+        if track.album is not None:
+            keys.append(('albums', track.album.album_id))
+
+        with self._lock:
+            for window in self.windows:
+                for kind, key in keys:
+                    top = self._tops[(kind, window)]
+                    if (timestamp - top.landmark) / top.tau > _REBASE_EXPONENT:
+                        top.rebase(timestamp)
+                    top.add(key, count * top.weight(timestamp))
+
+    def _top(self, kind: str, k: int, window: str) -> List[Tuple[str, float]]:
+        if window not in self.windows:
+            raise ValueError(f"Неизвестное окно чарта: {window}")
+        with self._lock:
+            top = self._tops[(kind, window)]
+            # Хранимые счета приводятся к текущему моменту одним множителем
+            scale = math.exp((top.landmark - self.clock()) / top.tau)
+            return [(key, score * scale) for key, score in top.top(k)]
+
+    def _resolve(self, table, ranking: List[Tuple[str, float]]) -> List[Tuple[object, float]]:
+        return [(table[key], score) for key, score in ranking if key in table]
+
+    def top_tracks(self, k: int = 10, window: str = 'day') -> List[Tuple[Track, float]]:
+        """Топ треков за окно: список пар (трек, счет), по убыванию счета"""
+        return self._resolve(self._service.tracks, self._top('tracks', k, window))
+
+    def top_artists(self, k: int = 10, window: str = 'day') -> List[Tuple[object, float]]:
+        return self._resolve(self._service.artists, self._top('artists', k, window))
+
+    def top_albums(self, k: int = 10, window: str = 'day') -> List[Tuple[object, float]]:
+        return self._resolve(self._service.albums, self._top('albums', k, window))
+
+    def score(self, kind: str, entity_id: str, window: str = 'day') -> float:
+        """Текущий счет трека, артиста или альбома (kind - 'tracks', 'artists', 'albums')"""
+        with self._lock:
+            top = self._tops[(kind, window)]
+            return top.scores.get(entity_id, 0.0) * math.exp((top.landmark - self.clock()) / top.tau)
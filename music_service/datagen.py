@@ -0,0 +1,230 @@
+"""
+Модуль генерации синтетического каталога в форматах, которые читает FileOperations
+"""
+import os
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional
+
+from file_operations import FileOperations, XML_NESTED_LISTS
+from streaming import write_json_document, write_xml_document
+
+WORDS = ["love", "night", "queen", "dream", "fire", "heart", "rock", "blue",
+         "summer", "road", "light", "shadow", "river", "storm", "gold", "city"]
+GENRES = ["Rock", "Pop", "Jazz", "Blues", "Electronic", "Hip-Hop", "Classical", "Folk"]
+
+_BASE_DATE = datetime(2020, 1, 1)
+_MASK64 = (1 << 64) - 1
+
+
+def _mix(seed: int, salt: int, index: int) -> int:
+    """
+    64-битный хеш (splitmix64) от номера записи. Каждое поле записи зависит
+    только от seed и номера, поэтому секции можно генерировать в любом
+    порядке и по частям с одинаковым результатом.
+    """
+    z = (seed * 0x9E3779B97F4A7C15 + salt * 0xD1B54A32D192ED03 + index + 1) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+def _words(h: int, count: int) -> str:
+    return " ".join(WORDS[(h >> (4 * i)) % len(WORDS)] for i in range(count)).title()
+
+
+class SyntheticCatalog:
+    """
+    Детерминированный синтетический каталог: пользователи, артисты, треки,
+    альбомы и плейлисты заданных размеров. Записи содержат поля
+    to_dict() моделей (включая albums_count артистов и tracks_count
+    альбомов) и, кроме того, file_path треков, который читают загрузчики.
+    Записи создаются лениво, поэтому каталог на миллионы треков пишется
+    в файл без накопления в памяти; для счетчиков хранится только массив
+    чисел на артиста и на альбом. Незаданные размеры выводятся из числа треков.
+    """
+
+    def __init__(self, tracks: int, users: Optional[int] = None, artists: Optional[int] = None,
+                 albums: Optional[int] = None, playlists: Optional[int] = None,
+                 playlist_length: int = 20, seed: int = 42):
+        self.seed = seed
+        self.tracks_count = tracks
+        self.users_count = users if users is not None else max(1, tracks // 100)
+        self.artists_count = artists if artists is not None else max(1, tracks // 50)
+        self.albums_count = albums if albums is not None else max(1, tracks // 10)
+        self.playlists_count = playlists if playlists is not None else max(1, tracks // 20)
+        self.playlist_length = playlist_length
+        self._albums_per_artist: Optional[array] = None
+        self._tracks_per_album: Optional[array] = None
+
+    # --- поля записей по номеру ---
+
+    def username(self, index: int) -> str:
+        return f"user_{index}"
+
+    def artist_name(self, index: int) -> str:
+        return f"{_words(_mix(self.seed, 1, index), 2)} {index}"
+
+    def album_title(self, index: int) -> str:
+        return f"{_words(_mix(self.seed, 2, index), 2)} Vol. {index}"
+
+    def album_artist(self, index: int) -> int:
+        return _mix(self.seed, 3, index) % self.artists_count
+
+    def track_title(self, index: int) -> str:
+        return f"{_words(_mix(self.seed, 4, index), 3)} {index}"
+
+    def track_album(self, index: int) -> Optional[int]:
+        if not self.albums_count:
+            return None
+        return _mix(self.seed, 5, index) % self.albums_count
+
+    def stream_count(self, index: int) -> int:
+        # Популярность распределена неравномерно: немногие треки собирают большую часть прослушиваний
+        return 100_000 // (1 + _mix(self.seed, 8, index) % 1000)
+
+    def track_artist(self, index: int) -> int:
+        # Трек принадлежит артисту своего альбома
+        album = self.track_album(index)
+        if album is None:
+            return _mix(self.seed, 6, index) % self.artists_count
+        return self.album_artist(album)
+
+    def albums_per_artist(self) -> array:
+        """Число альбомов каждого артиста (считается один раз проходом по альбомам)"""
+        if self._albums_per_artist is None:
+            counts = array('L', bytes(array('L').itemsize * self.artists_count))
+            for i in range(self.albums_count):
+                counts[self.album_artist(i)] += 1
+            self._albums_per_artist = counts
+        return self._albums_per_artist
+
+    def tracks_per_album(self) -> array:
+        """Число треков каждого альбома (считается один раз проходом по трекам)"""
+        if self._tracks_per_album is None:
+            counts = array('L', bytes(array('L').itemsize * self.albums_count))
+            for i in range(self.tracks_count):
+                album = self.track_album(i)
+                if album is not None:
+                    counts[album] += 1
+            self._tracks_per_album = counts
+        return self._tracks_per_album
+
+    # --- секции ---
+
+    def users(self) -> Iterator[Dict]:
+        for i in range(self.users_count):
+            yield {
+                'user_id': f"user_{i:07d}",
+                'username': self.username(i),
+                'email': f"user_{i}@example.com",
+                'premium': _mix(self.seed, 7, i) % 3 == 0,
+                'created_at': (_BASE_DATE + timedelta(minutes=i)).isoformat()
+            }
+
+    def artists(self) -> Iterator[Dict]:
+        albums = self.albums_per_artist()
+        for i in range(self.artists_count):
+            yield {
+                'artist_id': f"artist_{i:07d}",
+                'name': self.artist_name(i),
+                'bio': f"Synthetic artist {i}",
+                'albums_count': albums[i]
+            }
+
+    def tracks(self) -> Iterator[Dict]:
+        for i in range(self.tracks_count):
+            album = self.track_album(i)
+            yield {
+                'track_id': f"track_{i:07d}",
+                'title': self.track_title(i),
+                'duration': 60 + _mix(self.seed, 14, i) % 540,
+                'artist': self.artist_name(self.track_artist(i)),
+                'file_path': f"/music/{i}.mp3",
+                'stream_count': self.stream_count(i),
+                'album': self.album_title(album) if album is not None else None
+            }
+
+    def albums(self) -> Iterator[Dict]:
+        tracks = self.tracks_per_album()
+        for i in range(self.albums_count):
+            h = _mix(self.seed, 9, i)
+            yield {
+                'album_id': f"album_{i:07d}",
+                'title': self.album_title(i),
+                'artist': self.artist_name(self.album_artist(i)),
+                'release_date': (_BASE_DATE - timedelta(days=h % 20_000)).date().isoformat(),
+                'genre': GENRES[(h >> 16) % len(GENRES)],
+                'tracks_count': tracks[i]
+            }
+
+    def playlist_tracks(self, index: int) -> Iterator[Dict]:
+        for position in range(1, self.playlist_length + 1):
+            track = _mix(self.seed, 10, index * self.playlist_length + position) % self.tracks_count
+            yield {
+                'track_id': f"track_{track:07d}",
+                'title': self.track_title(track),
+                'artist': self.artist_name(self.track_artist(track)),
+                'position': position
+            }
+
+    def playlists(self) -> Iterator[Dict]:
+        for i in range(self.playlists_count):
+            tracks = list(self.playlist_tracks(i)) if self.tracks_count else []
+            yield {
+                'playlist_id': f"playlist_{i:07d}",
+                'name': f"{_words(_mix(self.seed, 11, i), 2)} Mix {i}",
+                'description': f"Synthetic playlist {i}",
+                'owner': self.username(_mix(self.seed, 12, i) % self.users_count),
+                'is_public': _mix(self.seed, 13, i) % 4 != 0,
+                'created_date': (_BASE_DATE + timedelta(hours=i)).isoformat(),
+                'tracks_count': len(tracks),
+                'tracks': tracks
+            }
+
+    def records(self) -> Dict[str, Iterator[Dict]]:
+        return {
+            'users': self.users(),
+            'artists': self.artists(),
+            'tracks': self.tracks(),
+            'albums': self.albums(),
+            'playlists': self.playlists()
+        }
+
+    def statistics(self) -> Dict:
+        return {
+            'users_count': self.users_count,
+            'artists_count': self.artists_count,
+            'tracks_count': self.tracks_count,
+            'albums_count': self.albums_count,
+            'playlists_count': self.playlists_count,
+            'total_streams': sum(self.stream_count(i) for i in range(self.tracks_count))
+        }
+
+    # --- запись файлов ---
+
+    def write_json(self, filename: str, compact: bool = False, compression: Optional[str] = None):
+        """Запись каталога в JSON в формате export_to_json"""
+        sections = FileOperations._json_sections(_BASE_DATE.isoformat(), self.records(), self.statistics())
+        with FileOperations._open_for_write(filename, compression) as f:
+            write_json_document(f, sections, compact=compact)
+
+    def write_xml(self, filename: str, compression: Optional[str] = None):
+        """Запись каталога в XML в формате export_to_xml"""
+        sections = FileOperations._xml_sections(_BASE_DATE.isoformat(), self.records(), self.statistics())
+        with FileOperations._open_for_write(filename, compression) as f:
+            write_xml_document(f, 'MusicService', sections, nested=XML_NESTED_LISTS)
+
+
+if __name__ == "__main__":
+    # python datagen.py <каталог> [треков] [seed]
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else "data/synthetic"
+    tracks_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 42
+
+    os.makedirs(output_dir, exist_ok=True)
+    catalog = SyntheticCatalog(tracks_count, seed=seed)
+    catalog.write_json(os.path.join(output_dir, f"catalog_{tracks_count}.json"))
+    catalog.write_xml(os.path.join(output_dir, f"catalog_{tracks_count}.xml"))
+    print(f"Каталог из {tracks_count} треков записан в {output_dir}")
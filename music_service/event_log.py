@@ -0,0 +1,87 @@
+"""
+Модуль журнала событий сервиса: сообщения уходят в очередь и выводятся фоновым потоком
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import IO, Optional
+
+ROOT_LOGGER = 'music_service'
+
+# Без настройки сообщения никуда не выводятся
+logging.getLogger(ROOT_LOGGER).addHandler(logging.NullHandler())
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Логгер модуля сервиса (music_service.<name>)"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Обработчик, кладущий запись в очередь как есть. Стандартный QueueHandler
+    форматирует сообщение в вызывающем потоке; здесь подстановка аргументов
+    и форматирование выполняются только в фоновом потоке вывода.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class StructuredFormatter(logging.Formatter):
+    """Запись одной строкой JSON: время, уровень, логгер, шаблон, аргументы и текст"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'template': record.msg,
+            'args': [arg if isinstance(arg, (str, int, float, bool, type(None))) else str(arg)
+                     for arg in (record.args or ())],
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            event['exception'] = self.formatException(record.exc_info)
+        return json.dumps(event, ensure_ascii=False)
+
+
+def configure_logging(level: int = logging.INFO, stream: Optional[IO[str]] = None,
+                      structured: bool = False) -> logging.handlers.QueueListener:
+    """
+    Включение вывода журнала: записи уровня level и выше попадают в очередь,
+    фоновый поток пишет их в stream (по умолчанию stdout) обычным текстом
+    или, при structured, строками JSON. Повторный вызов перенастраивает вывод.
+    """
+    global _listener
+    shutdown_logging()
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(StructuredFormatter() if structured else logging.Formatter('%(message)s'))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.handlers = [_DeferredQueueHandler(records)]
+    logger.setLevel(level)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Вывод оставшихся записей и остановка фонового потока"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.flush()
+        _listener = None
+        logger = logging.getLogger(ROOT_LOGGER)
+        logger.handlers = [logging.NullHandler()]
+        logger.setLevel(logging.NOTSET)
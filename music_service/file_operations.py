@@ -1,387 +1,991 @@
-"""
-Модуль для работы с файлами и сериализацией данных
-"""
-import json
-import xml.etree.ElementTree as ET
-from datetime import datetime
-from typing import Dict, List, Tuple
-import os
-
-from models import MusicService, User, Artist, Track, Album, Playlist, PlaylistTrack
-from exceptions import InvalidFileFormatError
-
-
-class FileOperations:
-    """Класс для операций с файлами"""
-
-    @staticmethod
-    def load_initial_data(service: MusicService, json_file: str = None, xml_file: str = None) -> Tuple[int, int]:
-        """
-        Загрузка начальных данных из JSON и XML файлов
-        Возвращает кортеж (количество_загруженных_объектов, общее_количество_ошибок)
-        """
-        total_loaded = 0
-        total_errors = 0
-
-        if json_file and os.path.exists(json_file):
-            loaded, errors = FileOperations._load_from_json(service, json_file)
-            total_loaded += loaded
-            total_errors += errors
-
-        if xml_file and os.path.exists(xml_file):
-            loaded, errors = FileOperations._load_from_xml(service, xml_file)
-            total_loaded += loaded
-            total_errors += errors
-
-        return total_loaded, total_errors
-
-    @staticmethod
-    def _load_from_json(service: MusicService, filename: str) -> Tuple[int, int]:
-        """Загрузка данных из JSON файла"""
-        loaded_count = 0
-        error_count = 0
-
-        try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            print(f"\nЗагрузка данных из JSON: {filename}")
-
-            # Загрузка пользователей
-            for user_data in data.get('users', []):
-                try:
-                    user = User(
-                        user_data['user_id'],
-                        user_data['username'],
-                        user_data['email'],
-                        "default_password",  # Пароль не хранится в открытом виде
-                        user_data.get('premium', False)
-                    )
-                    service.users[user.user_id] = user
-                    loaded_count += 1
-                except Exception as e:
-                    print(f"Ошибка загрузки пользователя {user_data.get('username', 'Unknown')}: {e}")
-                    error_count += 1
-
-            # Загрузка артистов
-            for artist_data in data.get('artists', []):
-                try:
-                    artist = Artist(
-                        artist_data['artist_id'],
-                        artist_data['name'],
-                        artist_data.get('bio', '')
-                    )
-                    service.artists[artist.artist_id] = artist
-                    loaded_count += 1
-                except Exception as e:
-                    print(f"Ошибка загрузки артиста {artist_data.get('name', 'Unknown')}: {e}")
-                    error_count += 1
-
-            # Загрузка треков (после артистов)
-            for track_data in data.get('tracks', []):
-                try:
-                    artist_name = track_data['artist']
-                    artist = next((a for a in service.artists.values() if a.name == artist_name), None)
-
-                    if artist:
-                        track = Track(
-                            track_data['track_id'],
-                            track_data['title'],
-                            track_data['duration'],
-                            track_data.get('file_path', ''),
-                            artist
-                        )
-                        service.tracks[track.track_id] = track
-                        loaded_count += 1
-                    else:
-                        print(f"Артист '{artist_name}' не найден для трека '{track_data['title']}'")
-                        error_count += 1
-                except Exception as e:
-                    print(f"Ошибка загрузки трека {track_data.get('title', 'Unknown')}: {e}")
-                    error_count += 1
-
-            # Загрузка альбомов
-            for album_data in data.get('albums', []):
-                try:
-                    artist_name = album_data['artist']
-                    artist = next((a for a in service.artists.values() if a.name == artist_name), None)
-
-                    if artist:
-                        album = Album(
-                            album_data['album_id'],
-                            album_data['title'],
-                            artist,
-                            album_data['release_date'],
-                            album_data.get('genre', '')
-                        )
-                        service.albums[album.album_id] = album
-                        loaded_count += 1
-                    else:
-                        print(f"Артист '{artist_name}' не найден для альбома '{album_data['title']}'")
-                        error_count += 1
-                except Exception as e:
-                    print(f"Ошибка загрузки альбома {album_data.get('title', 'Unknown')}: {e}")
-                    error_count += 1
-
-            # Загрузка плейлистов (после пользователей и треков)
-            for playlist_data in data.get('playlists', []):
-                try:
-                    owner_name = playlist_data['owner']
-                    owner = next((u for u in service.users.values() if u.username == owner_name), None)
-
-                    if owner:
-                        playlist = Playlist(
-                            playlist_data['playlist_id'],
-                            playlist_data['name'],
-                            playlist_data.get('description', ''),
-                            owner,
-                            playlist_data.get('is_public', True)
-                        )
-
-                        # Добавление треков в плейлист
-                        for track_info in playlist_data.get('tracks', []):
-                            track = service.tracks.get(track_info['track_id'])
-                            if track:
-                                playlist.add_track(track)
-
-                        service.playlists[playlist.playlist_id] = playlist
-                        loaded_count += 1
-                    else:
-                        print(f"Владелец '{owner_name}' не найден для плейлиста '{playlist_data['name']}'")
-                        error_count += 1
-                except Exception as e:
-                    print(f"Ошибка загрузки плейлиста {playlist_data.get('name', 'Unknown')}: {e}")
-                    error_count += 1
-
-            print(f"Успешно загружено: {loaded_count} объектов")
-            if error_count > 0:
-                print(f"Ошибок при загрузке: {error_count}")
-
-        except json.JSONDecodeError as e:
-            raise InvalidFileFormatError(f"Ошибка декодирования JSON: {str(e)}")
-        except Exception as e:
-            raise InvalidFileFormatError(f"Ошибка при загрузке из JSON: {str(e)}")
-
-        return loaded_count, error_count
-
-    @staticmethod
-    def _load_from_xml(service: MusicService, filename: str) -> Tuple[int, int]:
-        """Загрузка данных из XML файла"""
-        loaded_count = 0
-        error_count = 0
-
-        try:
-            tree = ET.parse(filename)
-            root = tree.getroot()
-
-            print(f"\nЗагрузка данных из XML: {filename}")
-
-            # Загрузка пользователей из XML
-            users_elem = root.find('Users')
-            if users_elem is not None:
-                for user_elem in users_elem.findall('User'):
-                    try:
-                        user_id = user_elem.find('user_id').text
-                        username = user_elem.find('username').text
-                        email = user_elem.find('email').text
-                        premium = user_elem.find('premium').text.lower() == 'true'
-
-                        # Проверяем, не существует ли уже пользователь
-                        if user_id not in service.users:
-                            user = User(user_id, username, email, "default_password", premium)
-                            service.users[user_id] = user
-                            loaded_count += 1
-                    except Exception as e:
-                        print(f"Ошибка загрузки пользователя из XML: {e}")
-                        error_count += 1
-
-            # Загрузка артистов из XML
-            artists_elem = root.find('Artists')
-            if artists_elem is not None:
-                for artist_elem in artists_elem.findall('Artist'):
-                    try:
-                        artist_id = artist_elem.find('artist_id').text
-                        name = artist_elem.find('name').text
-                        bio_elem = artist_elem.find('bio')
-                        bio = bio_elem.text if bio_elem is not None else ""
-
-                        if artist_id not in service.artists:
-                            artist = Artist(artist_id, name, bio)
-                            service.artists[artist_id] = artist
-                            loaded_count += 1
-                    except Exception as e:
-                        print(f"Ошибка загрузки артиста из XML: {e}")
-                        error_count += 1
-
-            # Загрузка треков из XML
-            tracks_elem = root.find('Tracks')
-            if tracks_elem is not None:
-                for track_elem in tracks_elem.findall('Track'):
-                    try:
-                        track_id = track_elem.find('track_id').text
-                        title = track_elem.find('title').text
-                        duration = int(track_elem.find('duration').text)
-                        artist_name = track_elem.find('artist').text
-                        file_path_elem = track_elem.find('file_path')
-                        file_path = file_path_elem.text if file_path_elem is not None else ""
-
-                        artist = next((a for a in service.artists.values() if a.name == artist_name), None)
-
-                        if artist and track_id not in service.tracks:
-                            track = Track(track_id, title, duration, file_path, artist)
-                            service.tracks[track_id] = track
-                            loaded_count += 1
-                        elif not artist:
-                            print(f"Артист '{artist_name}' не найден для трека '{title}'")
-                            error_count += 1
-                    except Exception as e:
-                        print(f"Ошибка загрузки трека из XML: {e}")
-                        error_count += 1
-
-            # Загрузка альбомов из XML
-            albums_elem = root.find('Albums')
-            if albums_elem is not None:
-                for album_elem in albums_elem.findall('Album'):
-                    try:
-                        album_id = album_elem.find('album_id').text
-                        title = album_elem.find('title').text
-                        artist_name = album_elem.find('artist').text
-                        release_date = album_elem.find('release_date').text
-                        genre_elem = album_elem.find('genre')
-                        genre = genre_elem.text if genre_elem is not None else ""
-
-                        artist = next((a for a in service.artists.values() if a.name == artist_name), None)
-
-                        if artist and album_id not in service.albums:
-                            album = Album(album_id, title, artist, release_date, genre)
-                            service.albums[album_id] = album
-                            loaded_count += 1
-                        elif not artist:
-                            print(f"Артист '{artist_name}' не найден для альбома '{title}'")
-                            error_count += 1
-                    except Exception as e:
-                        print(f"Ошибка загрузки альбома из XML: {e}")
-                        error_count += 1
-
-            print(f"Успешно загружено из XML: {loaded_count} объектов")
-            if error_count > 0:
-                print(f"Ошибок при загрузке из XML: {error_count}")
-
-        except ET.ParseError as e:
-            raise InvalidFileFormatError(f"Ошибка парсинга XML: {str(e)}")
-        except Exception as e:
-            raise InvalidFileFormatError(f"Ошибка при загрузке из XML: {str(e)}")
-
-        return loaded_count, error_count
-
-    @staticmethod
-    def export_to_json(service: MusicService, filename: str):
-        """Экспорт данных в JSON"""
-        try:
-            # Создаем директорию если не существует
-            os.makedirs(os.path.dirname(filename) if os.path.dirname(filename) else '.', exist_ok=True)
-
-            data = {
-                'metadata': {
-                    'export_date': datetime.now().isoformat(),
-                    'version': '1.0'
-                },
-                'users': [user.to_dict() for user in service.users.values()],
-                'artists': [artist.to_dict() for artist in service.artists.values()],
-                'tracks': [track.to_dict() for track in service.tracks.values()],
-                'albums': [album.to_dict() for album in service.albums.values()],
-                'playlists': [playlist.to_dict() for playlist in service.playlists.values()],
-                'statistics': service.get_statistics()
-            }
-
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            print(f"Данные экспортированы в {filename}")
-        except Exception as e:
-            raise InvalidFileFormatError(f"Ошибка при экспорте в JSON: {str(e)}")
-
-    @staticmethod
-    def export_to_xml(service: MusicService, filename: str):
-        """Экспорт данных в XML"""
-        try:
-            # Создаем директорию если не существует
-            os.makedirs(os.path.dirname(filename) if os.path.dirname(filename) else '.', exist_ok=True)
-
-            root = ET.Element('MusicService')
-
-            # Метаданные
-            metadata = ET.SubElement(root, 'Metadata')
-            ET.SubElement(metadata, 'ExportDate').text = datetime.now().isoformat()
-            ET.SubElement(metadata, 'Version').text = '1.0'
-
-            # Статистика
-            stats = service.get_statistics()
-            statistics_elem = ET.SubElement(root, 'Statistics')
-            for key, value in stats.items():
-                ET.SubElement(statistics_elem, key).text = str(value)
-
-            # Пользователи
-            users_elem = ET.SubElement(root, 'Users')
-            for user in service.users.values():
-                user_elem = ET.SubElement(users_elem, 'User')
-                for key, value in user.to_dict().items():
-                    ET.SubElement(user_elem, key).text = str(value)
-
-            # Артисты
-            artists_elem = ET.SubElement(root, 'Artists')
-            for artist in service.artists.values():
-                artist_elem = ET.SubElement(artists_elem, 'Artist')
-                for key, value in artist.to_dict().items():
-                    ET.SubElement(artist_elem, key).text = str(value)
-
-            # Треки
-            tracks_elem = ET.SubElement(root, 'Tracks')
-            for track in service.tracks.values():
-                track_elem = ET.SubElement(tracks_elem, 'Track')
-                for key, value in track.to_dict().items():
-                    ET.SubElement(track_elem, key).text = str(value)
-
-            # Альбомы
-            albums_elem = ET.SubElement(root, 'Albums')
-            for album in service.albums.values():
-                album_elem = ET.SubElement(albums_elem, 'Album')
-                for key, value in album.to_dict().items():
-                    ET.SubElement(album_elem, key).text = str(value)
-
-            # Плейлисты
-            playlists_elem = ET.SubElement(root, 'Playlists')
-            for playlist in service.playlists.values():
-                playlist_elem = ET.SubElement(playlists_elem, 'Playlist')
-                for key, value in playlist.to_dict().items():
-                    if key == 'tracks':
-                        tracks_elem = ET.SubElement(playlist_elem, 'Tracks')
-                        for track_info in value:
-                            track_elem = ET.SubElement(tracks_elem, 'TrackInfo')
-                            for track_key, track_value in track_info.items():
-                                ET.SubElement(track_elem, track_key).text = str(track_value)
-                    else:
-                        ET.SubElement(playlist_elem, key).text = str(value)
-
-            tree = ET.ElementTree(root)
-            tree.write(filename, encoding='utf-8', xml_declaration=True)
-            print(f"Данные экспортированы в {filename}")
-        except Exception as e:
-            raise InvalidFileFormatError(f"Ошибка при экспорте в XML: {str(e)}")
-
-    @staticmethod
-    def create_backup(service: MusicService, backup_dir: str = "backups"):
-        """Создание резервной копии данных"""
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            os.makedirs(backup_dir, exist_ok=True)
-
-            json_file = f"{backup_dir}/music_backup_{timestamp}.json"
-            xml_file = f"{backup_dir}/music_backup_{timestamp}.xml"
-
-            FileOperations.export_to_json(service, json_file)
-            FileOperations.export_to_xml(service, xml_file)
-
-            print(f"Резервная копия создана: {json_file}, {xml_file}")
-            return json_file, xml_file
-        except Exception as e:
-            raise InvalidFileFormatError(f"Ошибка при создании резервной копии: {str(e)}")
\ No newline at end of file
+"""
+Модуль для работы с файлами и сериализацией данных
+"""
+import contextvars
+import functools
+import importlib
+import json
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, IO, Iterable, List, Optional, Tuple
+import os
+
+from models import MusicService, User, Artist, Track, Album, Playlist
+from exceptions import InvalidFileFormatError, UserNotFoundError
+from binary_snapshot import BinarySnapshot
+from streaming import iter_json_sections, write_json_document, write_xml_document
+from event_log import get_logger
+from instrumentation import instrumentation
+
+_log = get_logger('file_operations')
+
+# Вложенные списки в записях XML: поле -> (тег списка, тег элемента)
+XML_NESTED_LISTS = {'tracks': ('Tracks', 'TrackInfo')}
+
+# Поддерживаемые модули сжатия стандартной библиотеки и расширения файлов
+COMPRESSION_EXTENSIONS = {'gzip': '.gz', 'bz2': '.bz2', 'lzma': '.xz'}
+
+# Секция экспорта -> атрибут ID объектов секции
+_ENTITY_KEYS = {'users': 'user_id', 'artists': 'artist_id', 'tracks': 'track_id',
+                'albums': 'album_id', 'playlists': 'playlist_id'}
+
+
+class _AlbumLinks:
+    """
+    Связывание треков с альбомами за одну загрузку. В файлах альбомы идут
+    после треков, поэтому трек, альбом которого еще не загружен, ждет его
+    по ключу - album_id записи или паре (название альбома, artist_id) -
+    и при сохранении альбома все его треки добавляются одной пачкой.
+    Уже загруженный альбом находится по индексу сервиса сразу. Трек
+    сборника (артист трека не совпадает с артистом альбома) в конце
+    загрузки привязывается к альбому только по названию, если альбом с
+    таким названием один.
+    """
+
+    def __init__(self, service: MusicService):
+        self.service = service
+        self._pending: Dict[object, List[Track]] = {}
+
+    def track(self, track: Track, album_title: Optional[str], album_id: Optional[str] = None):
+        if album_id:
+            key = album_id
+            album = self.service.albums.get(album_id)
+        elif album_title:
+            key = (album_title, track.artist.artist_id)
+            album = self.service.find_album(album_title, track.artist)
+        else:
+            return
+        if album is not None:
+            album.add_track(track)
+        else:
+            self._pending.setdefault(key, []).append(track)
+
+    def album(self, album: Album):
+        tracks = self._pending.pop(album.album_id, [])
+        tracks.extend(self._pending.pop((album.title, album.artist.artist_id), ()))
+        if tracks:
+            album.add_tracks(tracks)
+
+    def finish(self) -> int:
+        """Сброс треков, альбомы которых так и не встретились; возвращает их число"""
+        by_title = [key for key in self._pending if isinstance(key, tuple)]
+        if by_title:
+            albums_by_title: Dict[str, List[Album]] = {}
+            for album in self.service.albums.values():
+                albums_by_title.setdefault(album.title, []).append(album)
+            for key in by_title:
+                albums = albums_by_title.get(key[0], ())
+                if len(albums) == 1:
+                    albums[0].add_tracks(self._pending.pop(key))
+
+        unresolved = sum(len(tracks) for tracks in self._pending.values())
+        if unresolved:
+            _log.warning("Не найдены альбомы для %s треков", unresolved)
+        self._pending.clear()
+        return unresolved
+
+
+class FileOperations:
+    """Класс для операций с файлами"""
+
+    @staticmethod
+    def load_initial_data(service: MusicService, json_file: str = None, xml_file: str = None) -> Tuple[int, int]:
+        """
+        Загрузка начальных данных из JSON и XML файлов
+        Возвращает кортеж (количество_загруженных_объектов, общее_количество_ошибок)
+        """
+        total_loaded = 0
+        total_errors = 0
+
+        if json_file and os.path.exists(json_file):
+            loaded, errors = FileOperations._load_from_json(service, json_file)
+            total_loaded += loaded
+            total_errors += errors
+
+        if xml_file and os.path.exists(xml_file):
+            loaded, errors = FileOperations._load_from_xml(service, xml_file)
+            total_loaded += loaded
+            total_errors += errors
+
+        return total_loaded, total_errors
+
+    @staticmethod
+    def _load_from_json(service: MusicService, filename: str,
+                        handlers: Optional[Dict[str, Callable[[Dict], None]]] = None) -> Tuple[int, int]:
+        """
+        Потоковая загрузка данных из JSON файла.
+        Массивы верхнего уровня читаются поэлементно, поэтому в памяти
+        одновременно находится только одна запись, а не весь документ.
+        handlers: обработчики записей секций без загрузчика (например, metadata).
+        """
+        loaded_count = 0
+        error_count = 0
+
+        links = _AlbumLinks(service)
+        loaders = {
+            'users': FileOperations._load_json_user,
+            'artists': FileOperations._load_json_artist,
+            'tracks': functools.partial(FileOperations._load_json_track, links=links),
+            'albums': functools.partial(FileOperations._load_json_album, links=links),
+            'playlists': FileOperations._load_json_playlist,
+        }
+
+        phase = instrumentation.phase
+        try:
+            with phase('load_json'), FileOperations._open_for_read(filename) as f:
+                _log.info("\nЗагрузка данных из JSON: %s", filename)
+
+                # Секции обрабатываются в порядке следования в файле:
+                # артисты до треков и альбомов, пользователи и треки до плейлистов.
+                # Собственное время фазы load_json - разбор файла, build - создание объектов
+                for section, record in iter_json_sections(f):
+                    loader = loaders.get(section)
+                    if loader is None:
+                        if handlers is not None and section in handlers:
+                            handlers[section](record)
+                        continue
+                    with phase('build'):
+                        loaded = loader(service, record)
+                    if loaded:
+                        loaded_count += 1
+                    else:
+                        error_count += 1
+                links.finish()
+
+            _log.info("Успешно загружено: %s объектов", loaded_count)
+            if error_count > 0:
+                _log.warning("Ошибок при загрузке: %s", error_count)
+
+        except json.JSONDecodeError as e:
+            raise InvalidFileFormatError(f"Ошибка декодирования JSON: {str(e)}")
+        except Exception as e:
+            raise InvalidFileFormatError(f"Ошибка при загрузке из JSON: {str(e)}")
+
+        return loaded_count, error_count
+
+    @staticmethod
+    def _load_json_user(service: MusicService, user_data: Dict) -> bool:
+        """Загрузка пользователя из JSON записи"""
+        try:
+            user = User(
+                user_data['user_id'],
+                user_data['username'],
+                user_data['email'],
+                "default_password",  # Пароль не хранится в открытом виде
+                user_data.get('premium', False)
+            )
+            service.store_user(user)
+            return True
+        except Exception as e:
+            _log.warning("Ошибка загрузки пользователя %s: %s", user_data.get('username', 'Unknown'), e)
+            return False
+
+    @staticmethod
+    def _load_json_artist(service: MusicService, artist_data: Dict) -> bool:
+        """Загрузка артиста из JSON записи"""
+        try:
+            artist = Artist(
+                artist_data['artist_id'],
+                artist_data['name'],
+                artist_data.get('bio', '')
+            )
+            service.store_artist(artist)
+            return True
+        except Exception as e:
+            _log.warning("Ошибка загрузки артиста %s: %s", artist_data.get('name', 'Unknown'), e)
+            return False
+
+    @staticmethod
+    def _load_json_track(service: MusicService, track_data: Dict, links: Optional[_AlbumLinks] = None) -> bool:
+        """Загрузка трека из JSON записи (артисты должны быть загружены раньше)"""
+        try:
+            artist_name = track_data['artist']
+            with instrumentation.phase('link'):
+                artist = service.find_artist_by_name(artist_name)
+
+            if artist:
+                track = Track(
+                    track_data['track_id'],
+                    track_data['title'],
+                    track_data['duration'],
+                    track_data.get('file_path', ''),
+                    artist
+                )
+                track.stream_count = int(track_data.get('stream_count', 0))
+                service.store_track(track)
+                if links is not None:
+                    with instrumentation.phase('link'):
+                        links.track(track, track_data.get('album'), track_data.get('album_id'))
+                return True
+
+            _log.warning("Артист '%s' не найден для трека '%s'", artist_name, track_data['title'])
+            return False
+        except Exception as e:
+            _log.warning("Ошибка загрузки трека %s: %s", track_data.get('title', 'Unknown'), e)
+            return False
+
+    @staticmethod
+    def _load_json_album(service: MusicService, album_data: Dict, links: Optional[_AlbumLinks] = None) -> bool:
+        """Загрузка альбома из JSON записи"""
+        try:
+            artist_name = album_data['artist']
+            with instrumentation.phase('link'):
+                artist = service.find_artist_by_name(artist_name)
+
+            if artist:
+                album = Album(
+                    album_data['album_id'],
+                    album_data['title'],
+                    artist,
+                    album_data['release_date'],
+                    album_data.get('genre', '')
+                )
+                service.store_album(album)
+                if links is not None:
+                    with instrumentation.phase('link'):
+                        links.album(album)
+                return True
+
+            _log.warning("Артист '%s' не найден для альбома '%s'", artist_name, album_data['title'])
+            return False
+        except Exception as e:
+            _log.warning("Ошибка загрузки альбома %s: %s", album_data.get('title', 'Unknown'), e)
+            return False
+
+    @staticmethod
+    def _load_json_playlist(service: MusicService, playlist_data: Dict) -> bool:
+        """Загрузка плейлиста из JSON записи (после пользователей и треков)"""
+        try:
+            owner_name = playlist_data['owner']
+            with instrumentation.phase('link'):
+                owner = service.find_user_by_username(owner_name)
+
+            if owner:
+                playlist = Playlist(
+                    playlist_data['playlist_id'],
+                    playlist_data['name'],
+                    playlist_data.get('description', ''),
+                    owner,
+                    playlist_data.get('is_public', True)
+                )
+
+                # Добавление треков в плейлист
+                with instrumentation.phase('link'):
+                    FileOperations._fill_playlist(service, playlist, playlist_data.get('tracks', []))
+
+                service.store_playlist(playlist)
+                return True
+
+            _log.warning("Владелец '%s' не найден для плейлиста '%s'", owner_name, playlist_data['name'])
+            return False
+        except Exception as e:
+            _log.warning("Ошибка загрузки плейлиста %s: %s", playlist_data.get('name', 'Unknown'), e)
+            return False
+
+    @staticmethod
+    def _load_from_xml(service: MusicService, filename: str) -> Tuple[int, int]:
+        """
+        Потоковая загрузка данных из XML файла через ET.iterparse.
+        Каждый элемент User/Artist/Track/Album/Playlist обрабатывается
+        сразу после закрывающего тега и затем очищается, поэтому дерево
+        документа целиком в памяти не строится.
+        """
+        loaded_count = 0
+        error_count = 0
+
+        links = _AlbumLinks(service)
+        loaders = {
+            ('Users', 'User'): FileOperations._load_xml_user,
+            ('Artists', 'Artist'): FileOperations._load_xml_artist,
+            ('Tracks', 'Track'): functools.partial(FileOperations._load_xml_track, links=links),
+            ('Albums', 'Album'): functools.partial(FileOperations._load_xml_album, links=links),
+            ('Playlists', 'Playlist'): FileOperations._load_xml_playlist,
+        }
+
+        try:
+            _log.info("\nЗагрузка данных из XML: %s", filename)
+
+            depth = 0
+            section = None
+            phase = instrumentation.phase
+            # Собственное время фазы load_xml - разбор файла, build - создание объектов
+            with phase('load_xml'), FileOperations._open_for_read(filename, 'rb') as f:
+                for event, elem in ET.iterparse(f, events=('start', 'end')):
+                    if event == 'start':
+                        depth += 1
+                        if depth == 2:
+                            section = elem
+                        continue
+
+                    depth -= 1
+                    if depth == 2:
+                        loader = loaders.get((section.tag, elem.tag))
+                        if loader is not None:
+                            # None - объект уже существует и пропущен
+                            with phase('build'):
+                                result = loader(service, elem)
+                            if result is True:
+                                loaded_count += 1
+                            elif result is False:
+                                error_count += 1
+                        # Освобождаем обработанный элемент и ссылку на него из секции
+                        elem.clear()
+                        section.clear()
+                    elif depth == 1:
+                        elem.clear()
+                        section = None
+                links.finish()
+
+            _log.info("Успешно загружено из XML: %s объектов", loaded_count)
+            if error_count > 0:
+                _log.warning("Ошибок при загрузке из XML: %s", error_count)
+
+        except ET.ParseError as e:
+            raise InvalidFileFormatError(f"Ошибка парсинга XML: {str(e)}")
+        except Exception as e:
+            raise InvalidFileFormatError(f"Ошибка при загрузке из XML: {str(e)}")
+
+        return loaded_count, error_count
+
+    @staticmethod
+    def _fill_playlist(service: MusicService, playlist: Playlist, tracks_info: Iterable[Dict]):
+        """Добавление в плейлист известных сервису треков из записей вида {'track_id': ...}"""
+        tracks = (service.tracks.get(track_info['track_id']) for track_info in tracks_info)
+        playlist.add_tracks(track for track in tracks if track)
+
+    @staticmethod
+    def _xml_text(elem: ET.Element, tag: str, default: str = "") -> str:
+        """Текст необязательного дочернего элемента"""
+        child = elem.find(tag)
+        if child is None or child.text is None:
+            return default
+        return child.text
+
+    @staticmethod
+    def _load_xml_user(service: MusicService, user_elem: ET.Element) -> Optional[bool]:
+        """Загрузка пользователя из XML элемента"""
+        try:
+            user_id = user_elem.find('user_id').text
+            username = user_elem.find('username').text
+            email = user_elem.find('email').text
+            premium = user_elem.find('premium').text.lower() == 'true'
+
+            # Проверяем, не существует ли уже пользователь
+            if user_id in service.users:
+                return None
+            user = User(user_id, username, email, "default_password", premium)
+            service.store_user(user)
+            return True
+        except Exception as e:
+            _log.warning("Ошибка загрузки пользователя из XML: %s", e)
+            return False
+
+    @staticmethod
+    def _load_xml_artist(service: MusicService, artist_elem: ET.Element) -> Optional[bool]:
+        """Загрузка артиста из XML элемента"""
+        try:
+            artist_id = artist_elem.find('artist_id').text
+            name = artist_elem.find('name').text
+            bio = FileOperations._xml_text(artist_elem, 'bio')
+
+            if artist_id in service.artists:
+                return None
+            artist = Artist(artist_id, name, bio)
+            service.store_artist(artist)
+            return True
+        except Exception as e:
+            _log.warning("Ошибка загрузки артиста из XML: %s", e)
+            return False
+
+    @staticmethod
+    def _load_xml_track(service: MusicService, track_elem: ET.Element,
+                        links: Optional[_AlbumLinks] = None) -> Optional[bool]:
+        """Загрузка трека из XML элемента"""
+        try:
+            track_id = track_elem.find('track_id').text
+            title = track_elem.find('title').text
+            duration = int(track_elem.find('duration').text)
+            artist_name = track_elem.find('artist').text
+            file_path = FileOperations._xml_text(track_elem, 'file_path')
+
+            with instrumentation.phase('link'):
+                artist = service.find_artist_by_name(artist_name)
+
+            if not artist:
+                _log.warning("Артист '%s' не найден для трека '%s'", artist_name, title)
+                return False
+            existing = service.tracks.get(track_id)
+            if existing is None:
+                track = Track(track_id, title, duration, file_path, artist)
+                track.stream_count = int(FileOperations._xml_text(track_elem, 'stream_count', '0'))
+                service.store_track(track)
+            else:
+                track = existing
+            # Уже загруженный (например, из JSON) трек тоже связывается с альбомом записи
+            if links is not None and track.album is None:
+                # Трек без альбома экспортируется как <album>None</album>
+                album_title = FileOperations._xml_text(track_elem, 'album')
+                with instrumentation.phase('link'):
+                    links.track(track, album_title if album_title != 'None' else None,
+                                FileOperations._xml_text(track_elem, 'album_id'))
+            return True if existing is None else None
+        except Exception as e:
+            _log.warning("Ошибка загрузки трека из XML: %s", e)
+            return False
+
+    @staticmethod
+    def _load_xml_album(service: MusicService, album_elem: ET.Element,
+                        links: Optional[_AlbumLinks] = None) -> Optional[bool]:
+        """Загрузка альбома из XML элемента"""
+        try:
+            album_id = album_elem.find('album_id').text
+            title = album_elem.find('title').text
+            artist_name = album_elem.find('artist').text
+            release_date = album_elem.find('release_date').text
+            genre = FileOperations._xml_text(album_elem, 'genre')
+
+            with instrumentation.phase('link'):
+                artist = service.find_artist_by_name(artist_name)
+
+            if not artist:
+                _log.warning("Артист '%s' не найден для альбома '%s'", artist_name, title)
+                return False
+            if album_id in service.albums:
+                if links is not None:
+                    links.album(service.albums[album_id])
+                return None
+            album = Album(album_id, title, artist, release_date, genre)
+            service.store_album(album)
+            if links is not None:
+                with instrumentation.phase('link'):
+                    links.album(album)
+            return True
+        except Exception as e:
+            _log.warning("Ошибка загрузки альбома из XML: %s", e)
+            return False
+
+    @staticmethod
+    def _load_xml_playlist(service: MusicService, playlist_elem: ET.Element) -> Optional[bool]:
+        """Загрузка плейлиста из XML элемента (после пользователей и треков)"""
+        try:
+            playlist_id = playlist_elem.find('playlist_id').text
+            name = playlist_elem.find('name').text
+            owner_name = playlist_elem.find('owner').text
+            description = FileOperations._xml_text(playlist_elem, 'description')
+            is_public = FileOperations._xml_text(playlist_elem, 'is_public', 'true').lower() == 'true'
+
+            with instrumentation.phase('link'):
+                owner = service.find_user_by_username(owner_name)
+
+            if not owner:
+                _log.warning("Владелец '%s' не найден для плейлиста '%s'", owner_name, name)
+                return False
+            if playlist_id in service.playlists:
+                return None
+            playlist = Playlist(playlist_id, name, description, owner, is_public)
+
+            # Добавление треков в плейлист одной пачкой, как при загрузке JSON
+            with instrumentation.phase('link'):
+                FileOperations._fill_playlist(
+                    service, playlist,
+                    ({'track_id': track_id_elem.text}
+                     for track_id_elem in playlist_elem.iterfind('Tracks/TrackInfo/track_id')))
+
+            service.store_playlist(playlist)
+            return True
+        except Exception as e:
+            _log.warning("Ошибка загрузки плейлиста из XML: %s", e)
+            return False
+
+    @staticmethod
+    def _entities(service: MusicService) -> Dict[str, List]:
+        """Копия списков объектов всех секций, снятая под общей блокировкой сервиса"""
+        with service._lock:
+            return {
+                'users': list(service.users.values()),
+                'artists': list(service.artists.values()),
+                'tracks': list(service.tracks.values()),
+                'albums': list(service.albums.values()),
+                'playlists': list(service.playlists.values())
+            }
+
+    @staticmethod
+    def _iter_records(service: MusicService, entities: Optional[Dict[str, List]] = None,
+                      observe: Optional[Callable[[str, object], None]] = None) -> Dict[str, Iterable[Dict]]:
+        """
+        Ленивые генераторы to_dict() по всем секциям сервиса. Обход идет по
+        копии списков объектов, а запись каждого объекта строится под его
+        блокировкой, поэтому экспорт можно выполнять, пока другие потоки
+        меняют сервис. observe(section, entity) вызывается под той же
+        блокировкой объекта.
+        """
+        if entities is None:
+            entities = FileOperations._entities(service)
+
+        def records(section: str, key: str) -> Iterable[Dict]:
+            for entity in entities[section]:
+                with service.entity_lock(getattr(entity, key)):
+                    if observe is not None:
+                        observe(section, entity)
+                    record = entity.to_dict()
+                yield record
+
+        return {section: records(section, key) for section, key in _ENTITY_KEYS.items()}
+
+    @staticmethod
+    def _json_sections(export_date: str, records: Dict[str, Iterable[Dict]], statistics: Dict) -> List:
+        return [
+            ('metadata', {
+                'export_date': export_date,
+                'version': '1.0'
+            }),
+            ('users', records['users']),
+            ('artists', records['artists']),
+            ('tracks', records['tracks']),
+            ('albums', records['albums']),
+            ('playlists', records['playlists']),
+            ('statistics', statistics)
+        ]
+
+    @staticmethod
+    def _xml_sections(export_date: str, records: Dict[str, Iterable[Dict]], statistics: Dict) -> List:
+        return [
+            ('Metadata', None, {
+                'ExportDate': export_date,
+                'Version': '1.0'
+            }),
+            ('Statistics', None, statistics),
+            ('Users', 'User', records['users']),
+            ('Artists', 'Artist', records['artists']),
+            ('Tracks', 'Track', records['tracks']),
+            ('Albums', 'Album', records['albums']),
+            ('Playlists', 'Playlist', records['playlists'])
+        ]
+
+    @staticmethod
+    def _open_for_write(filename: str, compression: Optional[str] = None) -> IO[str]:
+        """Открытие файла на запись с необязательным сжатием (gzip, bz2, lzma)"""
+        if compression is None:
+            return open(filename, 'w', encoding='utf-8')
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise InvalidFileFormatError(f"Неизвестный формат сжатия: {compression}")
+        module = importlib.import_module(compression)
+        return module.open(filename, 'wt', encoding='utf-8')
+
+    @staticmethod
+    def _open_for_read(filename: str, mode: str = 'r') -> IO:
+        """Открытие файла на чтение; сжатие определяется по расширению"""
+        for compression, extension in COMPRESSION_EXTENSIONS.items():
+            if filename.endswith(extension):
+                module = importlib.import_module(compression)
+                if mode == 'rb':
+                    return module.open(filename, 'rb')
+                return module.open(filename, 'rt', encoding='utf-8')
+        if mode == 'rb':
+            return open(filename, 'rb')
+        return open(filename, 'r', encoding='utf-8')
+
+    @staticmethod
+    def export_to_json(service: MusicService, filename: str, compact: bool = False):
+        """
+        Экспорт данных в JSON.
+        Секции пишутся в файл поэлементно; compact=True отключает отступы.
+        """
+        try:
+            # Создаем директорию если не существует
+            os.makedirs(os.path.dirname(filename) if os.path.dirname(filename) else '.', exist_ok=True)
+
+            sections = FileOperations._json_sections(
+                datetime.now().isoformat(),
+                FileOperations._iter_records(service),
+                service.get_statistics()
+            )
+
+            with open(filename, 'w', encoding='utf-8') as f:
+                write_json_document(f, sections, compact=compact)
+            _log.info("Данные экспортированы в %s", filename)
+        except Exception as e:
+            raise InvalidFileFormatError(f"Ошибка при экспорте в JSON: {str(e)}")
+
+    @staticmethod
+    def export_to_xml(service: MusicService, filename: str):
+        """Экспорт данных в XML с потоковой записью секций"""
+        try:
+            # Создаем директорию если не существует
+            os.makedirs(os.path.dirname(filename) if os.path.dirname(filename) else '.', exist_ok=True)
+
+            sections = FileOperations._xml_sections(
+                datetime.now().isoformat(),
+                FileOperations._iter_records(service),
+                service.get_statistics()
+            )
+
+            with open(filename, 'w', encoding='utf-8') as f:
+                write_xml_document(f, 'MusicService', sections, nested=XML_NESTED_LISTS)
+            _log.info("Данные экспортированы в %s", filename)
+        except Exception as e:
+            raise InvalidFileFormatError(f"Ошибка при экспорте в XML: {str(e)}")
+
+    @staticmethod
+    def _user_sections(service: MusicService, user: User, export_date: str) -> List:
+        """
+        Секции экспорта данных пользователя. Плейлисты берутся из индекса
+        по владельцу, треки - из самих плейлистов (каждый один раз), поэтому
+        стоимость зависит от объема данных пользователя, а не всего сервиса.
+        """
+        with service._lock:
+            playlists = list(service._playlists_by_owner.get(user.user_id, {}).values())
+
+        def playlist_records():
+            for playlist in playlists:
+                with service.entity_lock(playlist.playlist_id):
+                    record = playlist.to_dict()
+                yield record
+
+        def tracks():
+            seen = set()
+            for playlist in playlists:
+                with service.entity_lock(playlist.playlist_id):
+                    playlist_tracks = [playlist_track.track for playlist_track in playlist.tracks]
+                for track in playlist_tracks:
+                    if track.track_id not in seen:
+                        seen.add(track.track_id)
+                        yield track.to_dict()
+
+        return [
+            ('metadata', {
+                'export_date': export_date,
+                'version': '1.0'
+            }),
+            ('user', user.to_dict()),
+            ('playlists', playlist_records()),
+            ('tracks', tracks()),
+            ('statistics', service.user_stats.get(user.user_id).to_dict())
+        ]
+
+    @staticmethod
+    def _write_user_data(service: MusicService, user: User, filename: str,
+                         compression: Optional[str] = None) -> str:
+        sections = FileOperations._user_sections(service, user, datetime.now().isoformat())
+        with FileOperations._open_for_write(filename, compression) as f:
+            write_json_document(f, sections)
+        return filename
+
+    @staticmethod
+    def export_user_data(service: MusicService, user_id: str, filename: str, compression: Optional[str] = None):
+        """
+        Экспорт данных одного пользователя в JSON: профиль, его плейлисты
+        с треками и сводка. Запись потоковая, документ в памяти не собирается.
+        """
+        user = service.users.get(user_id)
+        if user is None:
+            raise UserNotFoundError(f"Пользователь {user_id} не найден")
+        try:
+            os.makedirs(os.path.dirname(filename) if os.path.dirname(filename) else '.', exist_ok=True)
+            FileOperations._write_user_data(service, user, filename, compression)
+            _log.info("Данные пользователя %s экспортированы в %s", user.username, filename)
+        except Exception as e:
+            raise InvalidFileFormatError(f"Ошибка при экспорте данных пользователя: {str(e)}")
+
+    @staticmethod
+    def export_users_data(service: MusicService, user_ids: Iterable[str], output_dir: str,
+                          compression: Optional[str] = None, max_workers: Optional[int] = None) -> Dict[str, str]:
+        """
+        Пакетный экспорт данных пользователей: файл user_<id>.json на
+        пользователя, файлы пишутся параллельно в пуле потоков.
+        Все ID проверяются до начала записи.
+        Возвращает словарь user_id -> имя файла.
+        """
+        users = []
+        for user_id in dict.fromkeys(user_ids):
+            user = service.users.get(user_id)
+            if user is None:
+                raise UserNotFoundError(f"Пользователь {user_id} не найден")
+            users.append(user)
+
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            extension = COMPRESSION_EXTENSIONS[compression] if compression else ''
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # Потоки получают контекст вызывающего (в т.ч. область отмены записи)
+                futures = {
+                    user.user_id: executor.submit(contextvars.copy_context().run, FileOperations._write_user_data,
+                                                  service, user, f"{output_dir}/user_{user.user_id}.json{extension}",
+                                                  compression)
+                    for user in users
+                }
+                exported = {user_id: future.result() for user_id, future in futures.items()}
+            _log.info("Экспортированы данные %s пользователей в %s", len(exported), output_dir)
+            return exported
+        except Exception as e:
+            raise InvalidFileFormatError(f"Ошибка при пакетном экспорте данных пользователей: {str(e)}")
+
+    @staticmethod
+    def export_to_binary(service: MusicService, filename: str):
+        """Экспорт данных в компактный бинарный снимок для быстрого старта"""
+        try:
+            os.makedirs(os.path.dirname(filename) if os.path.dirname(filename) else '.', exist_ok=True)
+            BinarySnapshot.save(service, filename)
+            _log.info("Данные экспортированы в %s", filename)
+        except Exception as e:
+            raise InvalidFileFormatError(f"Ошибка при экспорте в бинарный снимок: {str(e)}")
+
+    @staticmethod
+    def load_from_binary(service: MusicService, filename: str) -> Tuple[int, int]:
+        """
+        Загрузка бинарного снимка без разбора текста и поиска по именам.
+        Возвращает кортеж (количество_загруженных_объектов, количество_ошибок)
+        """
+        try:
+            loaded_count = BinarySnapshot.load(service, filename)
+            _log.info("Загружено из бинарного снимка %s: %s объектов", filename, loaded_count)
+            return loaded_count, 0
+        except InvalidFileFormatError:
+            raise
+        except Exception as e:
+            raise InvalidFileFormatError(f"Ошибка при загрузке бинарного снимка: {str(e)}")
+
+    @staticmethod
+    def snapshot(service: MusicService) -> Dict:
+        """
+        Согласованный снимок сервиса для резервного копирования: копии
+        списков объектов и статистика, снятые под общей блокировкой.
+        Записи to_dict() в память не собираются - каждый формат строит их
+        своим проходом по снимку при записи.
+        """
+        with service._lock:
+            return {
+                'export_date': datetime.now().isoformat(),
+                'entities': FileOperations._entities(service),
+                'statistics': service.get_statistics()
+            }
+
+    @staticmethod
+    def _write_json_snapshot(export_date: str, statistics: Dict, records: Dict[str, Iterable[Dict]],
+                             filename: str, compression: Optional[str] = None, compact: bool = False) -> str:
+        sections = FileOperations._json_sections(export_date, records, statistics)
+        with FileOperations._open_for_write(filename, compression) as f:
+            write_json_document(f, sections, compact=compact)
+        return filename
+
+    @staticmethod
+    def _write_xml_snapshot(export_date: str, statistics: Dict, records: Dict[str, Iterable[Dict]],
+                            filename: str, compression: Optional[str] = None) -> str:
+        sections = FileOperations._xml_sections(export_date, records, statistics)
+        with FileOperations._open_for_write(filename, compression) as f:
+            write_xml_document(f, 'MusicService', sections, nested=XML_NESTED_LISTS)
+        return filename
+
+    @staticmethod
+    def create_backup(service: MusicService, backup_dir: str = "backups", compression: Optional[str] = None,
+                      parallel: bool = False, use_processes: bool = False):
+        """
+        Создание резервной копии данных.
+        Снимок сервиса снимается один раз, JSON и XML пишутся из него
+        потоково, каждый своим проходом. parallel=True пишет оба формата
+        одновременно в пуле потоков, use_processes=True - в пуле процессов;
+        процессам записи передаются готовые to_dict(), поэтому в этом режиме
+        записи снимка собираются в памяти.
+        Копия становится контрольной точкой для инкрементальных только
+        после успешной записи обоих файлов.
+        compression: None, 'gzip', 'bz2' или 'lzma'.
+        """
+        try:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            os.makedirs(backup_dir, exist_ok=True)
+
+            extension = COMPRESSION_EXTENSIONS[compression] if compression else ''
+            json_file = f"{backup_dir}/music_backup_{timestamp}.json{extension}"
+            xml_file = f"{backup_dir}/music_backup_{timestamp}.xml{extension}"
+
+            tracker = service.change_tracker
+            # Изменения забираются вместе со снимком: сделанные позже останутся для следующей копии
+            with service._lock:
+                snapshot = FileOperations.snapshot(service)
+                taken = tracker.take()
+            header = (snapshot['export_date'], snapshot['statistics'])
+
+            try:
+                if use_processes:
+                    records = {section: list(section_records) for section, section_records
+                               in FileOperations._iter_records(service, snapshot['entities']).items()}
+                    with ProcessPoolExecutor(max_workers=2) as executor:
+                        json_future = executor.submit(FileOperations._write_json_snapshot, *header, records,
+                                                      json_file, compression)
+                        xml_future = executor.submit(FileOperations._write_xml_snapshot, *header, records,
+                                                     xml_file, compression)
+                        json_future.result()
+                        xml_future.result()
+                elif parallel:
+                    with ThreadPoolExecutor(max_workers=2) as executor:
+                        # Потоки получают контекст вызывающего (в т.ч. область отмены записи)
+                        json_future = executor.submit(
+                            contextvars.copy_context().run, FileOperations._write_json_snapshot, *header,
+                            FileOperations._iter_records(service, snapshot['entities']), json_file, compression)
+                        xml_future = executor.submit(
+                            contextvars.copy_context().run, FileOperations._write_xml_snapshot, *header,
+                            FileOperations._iter_records(service, snapshot['entities']), xml_file, compression)
+                        json_future.result()
+                        xml_future.result()
+                else:
+                    FileOperations._write_json_snapshot(
+                        *header, FileOperations._iter_records(service, snapshot['entities']), json_file, compression)
+                    FileOperations._write_xml_snapshot(
+                        *header, FileOperations._iter_records(service, snapshot['entities']), xml_file, compression)
+            except BaseException:
+                tracker.restore(taken)
+                raise
+            tracker.commit()
+
+            _log.info("Резервная копия создана: %s, %s", json_file, xml_file)
+            return json_file, xml_file
+        except Exception as e:
+            raise InvalidFileFormatError(f"Ошибка при создании резервной копии: {str(e)}")
+
+    @staticmethod
+    def create_delta_backup(service: MusicService, backup_dir: str = "backups",
+                            compression: Optional[str] = None) -> Optional[str]:
+        """
+        Создание инкрементальной резервной копии: в файл попадают только
+        объекты, измененные с последней контрольной точки (полной или
+        инкрементальной копии). Изменения забираются из трекера атомарно,
+        поэтому сделанные во время записи попадут в следующую копию; если
+        запись не удалась, забранные изменения возвращаются в трекер.
+        Возвращает имя файла или None, если изменений нет.
+        """
+        try:
+            tracker = service.change_tracker
+            if not tracker.has_changes():
+                _log.info("Изменений с последней резервной копии нет")
+                return None
+
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            os.makedirs(backup_dir, exist_ok=True)
+            extension = COMPRESSION_EXTENSIONS[compression] if compression else ''
+            sequence = tracker.sequence
+            delta_file = f"{backup_dir}/music_delta_{timestamp}_{sequence:06d}.json{extension}"
+
+            taken = tracker.take()
+            try:
+                changes = {section: list(entities.values()) for section, entities in taken.items()}
+                sections = [('metadata', {
+                    'export_date': datetime.now().isoformat(),
+                    'version': '1.0',
+                    'type': 'delta',
+                    'sequence': sequence
+                })]
+                sections.extend(FileOperations._iter_records(service, changes).items())
+
+                with FileOperations._open_for_write(delta_file, compression) as f:
+                    write_json_document(f, sections, compact=True)
+            except BaseException:
+                tracker.restore(taken)
+                raise
+            tracker.commit()
+
+            _log.info("Инкрементальная копия создана: %s (%s изменений)",
+                      delta_file, sum(len(entities) for entities in changes.values()))
+            return delta_file
+        except Exception as e:
+            raise InvalidFileFormatError(f"Ошибка при создании инкрементальной копии: {str(e)}")
+
+    @staticmethod
+    def restore_backup_chain(service: MusicService, base_file: str,
+                             delta_files: Iterable[str] = ()) -> Tuple[int, int]:
+        """
+        Восстановление из полной JSON-копии и цепочки инкрементальных копий,
+        применяемых по порядку. Возвращает (загружено_объектов, ошибок).
+        """
+        total_loaded, total_errors = FileOperations._load_from_json(service, base_file)
+
+        for delta_file in delta_files:
+            loaded, errors = FileOperations._apply_delta(service, delta_file)
+            total_loaded += loaded
+            total_errors += errors
+
+        # Восстановленное состояние совпадает с последней контрольной точкой
+        service.change_tracker.checkpoint()
+        return total_loaded, total_errors
+
+    @staticmethod
+    def _apply_delta(service: MusicService, filename: str) -> Tuple[int, int]:
+        """Применение одной инкрементальной копии: новые объекты создаются, существующие обновляются"""
+        loaded_count = 0
+        error_count = 0
+
+        links = _AlbumLinks(service)
+        loaders = {
+            'users': FileOperations._apply_delta_user,
+            'artists': FileOperations._apply_delta_artist,
+            'tracks': functools.partial(FileOperations._apply_delta_track, links=links),
+            'albums': functools.partial(FileOperations._apply_delta_album, links=links),
+            'playlists': FileOperations._apply_delta_playlist,
+        }
+
+        try:
+            with FileOperations._open_for_read(filename) as f:
+                for section, record in iter_json_sections(f):
+                    loader = loaders.get(section)
+                    if loader is None:
+                        continue
+                    if loader(service, record):
+                        loaded_count += 1
+                    else:
+                        error_count += 1
+                links.finish()
+        except json.JSONDecodeError as e:
+            raise InvalidFileFormatError(f"Ошибка декодирования JSON: {str(e)}")
+        except Exception as e:
+            raise InvalidFileFormatError(f"Ошибка при применении инкрементальной копии: {str(e)}")
+
+        _log.info("Применена инкрементальная копия %s: %s объектов", filename, loaded_count)
+        return loaded_count, error_count
+
+    @staticmethod
+    def _apply_delta_user(service: MusicService, user_data: Dict) -> bool:
+        user = service.users.get(user_data.get('user_id'))
+        if user is None:
+            return FileOperations._load_json_user(service, user_data)
+        user.premium = user_data.get('premium', user.premium)
+        return True
+
+    @staticmethod
+    def _apply_delta_artist(service: MusicService, artist_data: Dict) -> bool:
+        artist = service.artists.get(artist_data.get('artist_id'))
+        if artist is None:
+            return FileOperations._load_json_artist(service, artist_data)
+        artist.bio = artist_data.get('bio', artist.bio)
+        return True
+
+    @staticmethod
+    def _apply_delta_track(service: MusicService, track_data: Dict, links: Optional[_AlbumLinks] = None) -> bool:
+        track = service.tracks.get(track_data.get('track_id'))
+        if track is None:
+            return FileOperations._load_json_track(service, track_data, links)
+        track.stream_count = int(track_data.get('stream_count', track.stream_count))
+        if track.album is None and links is not None:
+            links.track(track, track_data.get('album'), track_data.get('album_id'))
+        return True
+
+    @staticmethod
+    def _apply_delta_album(service: MusicService, album_data: Dict, links: Optional[_AlbumLinks] = None) -> bool:
+        if album_data.get('album_id') not in service.albums:
+            return FileOperations._load_json_album(service, album_data, links)
+        return True
+
+    @staticmethod
+    def _apply_delta_playlist(service: MusicService, playlist_data: Dict) -> bool:
+        playlist = service.playlists.get(playlist_data.get('playlist_id'))
+        if playlist is None:
+            return FileOperations._load_json_playlist(service, playlist_data)
+        try:
+            playlist.name = playlist_data.get('name', playlist.name)
+            playlist.description = playlist_data.get('description', playlist.description)
+            playlist.is_public = playlist_data.get('is_public', playlist.is_public)
+            playlist.clear_tracks()
+            FileOperations._fill_playlist(service, playlist, playlist_data.get('tracks', []))
+            return True
+        except Exception as e:
+            _log.warning("Ошибка обновления плейлиста %s: %s", playlist_data.get('name', 'Unknown'), e)
+            return False
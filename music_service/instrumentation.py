@@ -0,0 +1,261 @@
+"""
+Модуль инструментирования: счетчики вызовов, гистограммы задержек и профилирование
+"""
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import pstats
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+# Корзина i гистограммы - задержки меньше 2**i мкс
+_BUCKETS = 40
+
+_NO_PHASE = contextlib.nullcontext()
+
+
+class LatencyHistogram:
+    """Число вызовов и логарифмическая гистограмма задержек одного метода"""
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.buckets = [0] * _BUCKETS
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[min(int(seconds * 1e6).bit_length(), _BUCKETS - 1)] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """Оценка квантиля в микросекундах: линейная интерполяция внутри корзины"""
+        if not self.count:
+            return 0.0
+        threshold = fraction * self.count
+        seen = 0
+        for i, bucket in enumerate(self.buckets):
+            if bucket and seen + bucket >= threshold:
+                lower = 2 ** (i - 1) if i else 0
+                estimate = lower + (2 ** i - lower) * (threshold - seen) / bucket
+                return min(max(estimate, self.min * 1e6), self.max * 1e6)
+            seen += bucket
+        return self.max * 1e6
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'total_s': self.total,
+            'mean_us': self.total / self.count * 1e6 if self.count else 0.0,
+            'min_us': self.min * 1e6 if self.count else 0.0,
+            'max_us': self.max * 1e6,
+            'p50_us': self.percentile(0.5),
+            'p90_us': self.percentile(0.9),
+            'p99_us': self.percentile(0.99),
+            # [верхняя граница корзины в мкс, число вызовов] для непустых корзин
+            'histogram': [[2 ** i, bucket] for i, bucket in enumerate(self.buckets) if bucket]
+        }
+
+
+class _Phase:
+    """Замер фазы; время вложенных фаз вычитается из собственного времени внешней"""
+    __slots__ = ('_owner', '_name')
+
+    def __init__(self, owner: 'Instrumentation', name: str):
+        self._owner = owner
+        self._name = name
+
+    def __enter__(self):
+        stack = self._owner._stack()
+        path = f"{stack[-1][0]}/{self._name}" if stack else self._name
+        # [путь, начало, время вложенных фаз]
+        stack.append([path, time.perf_counter(), 0.0])
+
+    def __exit__(self, *exc):
+        stack = self._owner._stack()
+        path, started, children = stack.pop()
+        elapsed = time.perf_counter() - started
+        if stack:
+            stack[-1][2] += elapsed
+        self._owner._record_phase(path, elapsed, elapsed - children)
+        return False
+
+
+class Instrumentation:
+    """
+    Необязательное инструментирование сервиса. enable() оборачивает
+    публичные методы классов models.py и FileOperations, после чего каждый
+    вызов попадает в счетчик и гистограмму задержек метода; disable()
+    возвращает исходные методы. Пока инструментирование выключено, обертки
+    не установлены и методы работают без накладных расходов, а фазы
+    загрузчиков (phase) обходятся в одну проверку флага.
+
+    Фазы вкладываются: путь фазы образуется именами внешних фаз
+    ('load_json/build/link'), собственное время фазы - без вложенных.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._methods: Dict[str, LatencyHistogram] = {}
+        # путь фазы -> [вызовов, всего секунд, собственных секунд]
+        self._phases: Dict[str, List] = {}
+        self._profiles: Dict[str, str] = {}
+        self._originals: List = []
+
+    # --- включение ---
+
+    def enable(self, classes: Optional[Iterable[type]] = None):
+        """Установка оберток на публичные методы (по умолчанию - моделей и FileOperations)"""
+        if self.enabled:
+            return
+        if classes is None:
+            from models import User, Artist, Track, Album, PlaylistTrack, Playlist, MusicService
+            from file_operations import FileOperations
+            classes = (User, Artist, Track, Album, PlaylistTrack, Playlist, MusicService, FileOperations)
+
+        for cls in classes:
+            for name, attr in list(vars(cls).items()):
+                if name.startswith('_'):
+                    continue
+                if isinstance(attr, staticmethod):
+                    wrapped = staticmethod(self._wrap(f"{cls.__name__}.{name}", attr.__func__))
+                elif isinstance(attr, classmethod):
+                    wrapped = classmethod(self._wrap(f"{cls.__name__}.{name}", attr.__func__))
+                elif callable(attr):
+                    wrapped = self._wrap(f"{cls.__name__}.{name}", attr)
+                else:
+                    continue
+                self._originals.append((cls, name, attr))
+                setattr(cls, name, wrapped)
+        self.enabled = True
+
+    def disable(self):
+        """Снятие оберток; накопленные данные сохраняются до reset()"""
+        for cls, name, attr in reversed(self._originals):
+            setattr(cls, name, attr)
+        self._originals = []
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            # Гистограммы очищаются на месте: на них ссылаются установленные обертки
+            for histogram in self._methods.values():
+                histogram.clear()
+            self._phases = {}
+            self._profiles = {}
+
+    def _wrap(self, name: str, func):
+        histogram = self._histogram(name)
+        lock = self._lock
+        perf_counter = time.perf_counter
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - started
+                with lock:
+                    histogram.add(elapsed)
+
+        return wrapper
+
+    def _histogram(self, name: str) -> LatencyHistogram:
+        with self._lock:
+            histogram = self._methods.get(name)
+            if histogram is None:
+                histogram = self._methods[name] = LatencyHistogram()
+            return histogram
+
+    # --- фазы ---
+
+    def phase(self, name: str):
+        """Контекст замера фазы; при выключенном инструментировании ничего не делает"""
+        if not self.enabled:
+            return _NO_PHASE
+        return _Phase(self, name)
+
+    def _stack(self) -> List:
+        try:
+            return self._local.stack
+        except AttributeError:
+            stack = self._local.stack = []
+            return stack
+
+    def _record_phase(self, path: str, elapsed: float, own: float):
+        with self._lock:
+            stats = self._phases.get(path)
+            if stats is None:
+                stats = self._phases[path] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] += own
+
+    # --- профилирование ---
+
+    @contextlib.contextmanager
+    def profile(self, section: str, output: Optional[str] = None, limit: int = 30):
+        """
+        Выполнение блока под cProfile. Сводка (limit функций по суммарному
+        времени) доступна в report(); output - файл для pstats/snakeviz.
+        """
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            if output:
+                profiler.dump_stats(output)
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(limit)
+            with self._lock:
+                self._profiles[section] = text.getvalue()
+
+    # --- отчеты ---
+
+    def method_stats(self, name: str) -> Optional[Dict]:
+        """Статистика метода по имени 'Класс.метод' или None"""
+        with self._lock:
+            histogram = self._methods.get(name)
+            return histogram.to_dict() if histogram is not None and histogram.count else None
+
+    def phase_stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {path: {'calls': calls, 'total_s': total, 'self_s': own}
+                    for path, (calls, total, own) in self._phases.items()}
+
+    def report(self) -> Dict:
+        with self._lock:
+            methods = {name: histogram.to_dict()
+                       for name, histogram in sorted(self._methods.items()) if histogram.count}
+            profiles = dict(self._profiles)
+        return {
+            'enabled': self.enabled,
+            'methods': methods,
+            'phases': self.phase_stats(),
+            'profiles': profiles
+        }
+
+    def dump(self, filename: str):
+        """Запись отчета в JSON"""
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,463 @@
+"""
+Модуль каталога только для чтения поверх отображаемого в память (mmap) колоночного файла
+"""
+import contextlib
+import mmap
+import struct
+import threading
+from array import array
+from bisect import bisect_right
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional
+
+from models import MusicService, User
+from exceptions import InvalidFileFormatError, InsufficientPermissionsError, MusicServiceError
+from event_log import get_logger
+
+_log = get_logger('mmap_catalog')
+
+MAGIC = b'MCAT'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHHIIII')      # magic, version, reserved, artists, albums, tracks, columns
+_COLUMN = struct.Struct('<32sQQ')         # name, offset, size
+_ALIGN = 8
+
+def _aligned(size: int) -> int:
+    return (size + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class _ColumnWriter:
+    """Накопление столбцов и запись файла каталога"""
+
+    def __init__(self):
+        self.columns: Dict[str, bytes] = {}
+
+    def ints(self, name: str, typecode: str, values):
+        self.columns[name] = array(typecode, values).tobytes()
+
+    def strings(self, name: str, values: List[str]):
+        offsets = array('Q', [0])
+        blob = bytearray()
+        for value in values:
+            blob += (value or "").encode('utf-8')
+            offsets.append(len(blob))
+        self.columns[name + '.off'] = offsets.tobytes()
+        self.columns[name] = bytes(blob)
+
+    def search_blob(self, name: str, values: List[str]):
+        """Строки в нижнем регистре через разделитель - для поиска подстроки в mmap"""
+        self.strings(name, [value.lower() + '\x00' for value in values])
+
+    def csr(self, name: str, groups: List[List[int]]):
+        """Списки индексов в сжатом виде: смещения групп и общий массив"""
+        offsets = array('Q', [0])
+        flat = array('I')
+        for group in groups:
+            flat.extend(group)
+            offsets.append(len(flat))
+        self.columns[name + '.off'] = offsets.tobytes()
+        self.columns[name] = flat.tobytes()
+
+    def write(self, filename: str, counts):
+        directory_size = _HEADER.size + _COLUMN.size * len(self.columns)
+        offset = _aligned(directory_size)
+        layout = []
+        for name, data in self.columns.items():
+            layout.append((name, offset, len(data)))
+            offset = _aligned(offset + len(data))
+
+        with open(filename, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, 0, *counts, len(self.columns)))
+            for name, column_offset, size in layout:
+                f.write(_COLUMN.pack(name.encode('ascii'), column_offset, size))
+            for (name, column_offset, size) in layout:
+                f.write(b'\x00' * (column_offset - f.tell()))
+                f.write(self.columns[name])
+
+
+class ArtistView:
+    """Легковесное представление артиста из каталога"""
+    __slots__ = ('_catalog', '_row')
+
+    def __init__(self, catalog: 'MappedCatalog', row: int):
+        self._catalog = catalog
+        self._row = row
+
+    artist_id = property(lambda self: self._catalog._string('artist.id', self._row))
+    name = property(lambda self: self._catalog._string('artist.name', self._row))
+    bio = property(lambda self: self._catalog._string('artist.bio', self._row))
+
+    @property
+    def albums(self) -> List['AlbumView']:
+        return [AlbumView(self._catalog, row) for row in self._catalog._group('artist.albums', self._row)]
+
+    def get_albums(self) -> List['AlbumView']:
+        return self.albums
+
+    @property
+    def tracks(self) -> List['TrackView']:
+        return [TrackView(self._catalog, row) for row in self._catalog._group('artist.tracks', self._row)]
+
+    def to_dict(self) -> Dict:
+        return {
+            'artist_id': self.artist_id,
+            'name': self.name,
+            'bio': self.bio,
+            'albums_count': len(self._catalog._group('artist.albums', self._row))
+        }
+
+    def __eq__(self, other):
+        return isinstance(other, ArtistView) and other._catalog is self._catalog and other._row == self._row
+
+    def __hash__(self):
+        return hash((id(self._catalog), 'artist', self._row))
+
+    def __str__(self):
+        return f"Artist({self.name}, albums: {len(self.albums)})"
+
+
+class AlbumView:
+    """Легковесное представление альбома из каталога"""
+    __slots__ = ('_catalog', '_row')
+
+    def __init__(self, catalog: 'MappedCatalog', row: int):
+        self._catalog = catalog
+        self._row = row
+
+    album_id = property(lambda self: self._catalog._string('album.id', self._row))
+    title = property(lambda self: self._catalog._string('album.title', self._row))
+    release_date = property(lambda self: self._catalog._string('album.release_date', self._row))
+    genre = property(lambda self: self._catalog._string('album.genre', self._row))
+
+    @property
+    def artist(self) -> ArtistView:
+        return ArtistView(self._catalog, self._catalog._int('album.artist', self._row))
+
+    @property
+    def tracks(self) -> List['TrackView']:
+        return [TrackView(self._catalog, row) for row in self._catalog._group('album.tracks', self._row)]
+
+    def get_tracks(self) -> List['TrackView']:
+        return self.tracks
+
+    def to_dict(self) -> Dict:
+        return {
+            'album_id': self.album_id,
+            'title': self.title,
+            'artist': self.artist.name,
+            'release_date': self.release_date,
+            'genre': self.genre,
+            'tracks_count': len(self._catalog._group('album.tracks', self._row))
+        }
+
+    def __eq__(self, other):
+        return isinstance(other, AlbumView) and other._catalog is self._catalog and other._row == self._row
+
+    def __hash__(self):
+        return hash((id(self._catalog), 'album', self._row))
+
+    def __str__(self):
+        return f"Album({self.title}, {self.artist.name}, tracks: {len(self.tracks)})"
+
+
+class TrackView:
+    """
+    Легковесное представление трека, совместимое с Track по атрибутам и
+    методам. Данные читаются из отображенного файла при обращении;
+    счетчик прослушиваний хранится в памяти процесса поверх значения из файла.
+    """
+    __slots__ = ('_catalog', '_row')
+
+    def __init__(self, catalog: 'MappedCatalog', row: int):
+        self._catalog = catalog
+        self._row = row
+
+    track_id = property(lambda self: self._catalog._string('track.id', self._row))
+    title = property(lambda self: self._catalog._string('track.title', self._row))
+    file_path = property(lambda self: self._catalog._string('track.file_path', self._row))
+    duration = property(lambda self: self._catalog._int('track.duration', self._row))
+
+    @property
+    def artist(self) -> ArtistView:
+        return ArtistView(self._catalog, self._catalog._int('track.artist', self._row))
+
+    @property
+    def album(self) -> Optional[AlbumView]:
+        row = self._catalog._int('track.album', self._row)
+        return AlbumView(self._catalog, row) if row >= 0 else None
+
+    @property
+    def stream_count(self) -> int:
+        return self._catalog._stream_count(self._row)
+
+    @stream_count.setter
+    def stream_count(self, value: int):
+        self._catalog._set_stream_count(self._row, value)
+
+    def play(self):
+        """Воспроизведение трека"""
+        service = self._catalog.service
+        lock = service.entity_lock(self.track_id) if service is not None else contextlib.nullcontext()
+        with lock:
+            try:
+                self.stream_count += 1
+                if service is not None:
+                    service.notify('track_played', track=self, count=1)
+                _log.info("Воспроизведение: %s - %s", self.title, self.artist.name)
+            except Exception as e:
+                raise MusicServiceError(f"Ошибка при воспроизведении: {str(e)}")
+
+    def download(self, user: User) -> str:
+        """Скачивание трека"""
+        if not user.premium:
+            raise InsufficientPermissionsError("Требуется премиум-аккаунт для скачивания")
+        _log.info("Скачивание: %s", self.title)
+        return self.file_path
+
+    def to_dict(self) -> Dict:
+        album = self.album
+        return {
+            'track_id': self.track_id,
+            'title': self.title,
+            'duration': self.duration,
+            'artist': self.artist.name,
+            'stream_count': self.stream_count,
+            'album': album.title if album else None
+        }
+
+    def __eq__(self, other):
+        return isinstance(other, TrackView) and other._catalog is self._catalog and other._row == self._row
+
+    def __hash__(self):
+        return hash((id(self._catalog), 'track', self._row))
+
+    def __str__(self):
+        return f"Track({self.title}, {self.duration}s, by {self.artist.name})"
+
+
+class CatalogTable(Mapping):
+    """Отображение id -> представление объекта без загрузки всех записей"""
+
+    def __init__(self, catalog: 'MappedCatalog', prefix: str, view_class, count: int):
+        self._catalog = catalog
+        self._prefix = prefix
+        self._view_class = view_class
+        self._count = count
+        self._order = catalog._column(prefix + '.order', 'I')
+
+    def _find(self, key: str) -> int:
+        """Бинарный поиск строки по id в отсортированном порядке"""
+        if not isinstance(key, str):
+            return -1
+        target = key.encode('utf-8')
+        column = self._prefix + '.id'
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._catalog._bytes(column, self._order[middle]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._catalog._bytes(column, self._order[low]) == target:
+            return self._order[low]
+        return -1
+
+    def __getitem__(self, key: str):
+        row = self._find(key)
+        if row < 0:
+            raise KeyError(key)
+        return self._view_class(self._catalog, row)
+
+    def __contains__(self, key) -> bool:
+        return self._find(key) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        column = self._prefix + '.id'
+        for row in range(self._count):
+            yield self._catalog._string(column, row)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def values(self):
+        return (self._view_class(self._catalog, row) for row in range(self._count))
+
+    def items(self):
+        column = self._prefix + '.id'
+        return ((self._catalog._string(column, row), self._view_class(self._catalog, row))
+                for row in range(self._count))
+
+
+class MappedCatalog:
+    """
+    Каталог треков, альбомов и артистов только для чтения поверх mmap.
+    Несколько процессов, открывших один файл, разделяют одну копию в
+    страничном кэше ОС; объекты создаются только при обращении.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.service: Optional[MusicService] = None
+        self._file = open(filename, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as e:
+            self._file.close()
+            raise InvalidFileFormatError(f"Пустой файл каталога {filename}: {e}")
+        self._view = memoryview(self._mmap)
+
+        magic, version, _, artists, albums, tracks, columns = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise InvalidFileFormatError(f"Неподдерживаемый файл каталога: {magic!r} v{version}")
+
+        self._layout: Dict[str, tuple] = {}
+        for i in range(columns):
+            name, offset, size = _COLUMN.unpack_from(self._mmap, _HEADER.size + i * _COLUMN.size)
+            self._layout[name.rstrip(b'\x00').decode('ascii')] = (offset, size)
+        self._columns: Dict[str, memoryview] = {}
+        self._stream_overlay: Dict[int, int] = {}
+        # Разница между суммой прослушиваний в overlay и в файле
+        self._stream_delta = 0
+        self._stream_lock = threading.Lock()
+
+        self.artists = CatalogTable(self, 'artist', ArtistView, artists)
+        self.albums = CatalogTable(self, 'album', AlbumView, albums)
+        self.tracks = CatalogTable(self, 'track', TrackView, tracks)
+        self._base_streams = sum(self._column('track.streams', 'Q'))
+
+    def close(self):
+        # Все представления буфера должны быть освобождены до закрытия mmap
+        for column in self._columns.values():
+            column.release()
+        self._columns.clear()
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def _raw(self, name: str) -> memoryview:
+        offset, size = self._layout[name]
+        return self._view[offset:offset + size]
+
+    def _column(self, name: str, typecode: str) -> memoryview:
+        column = self._columns.get(name)
+        if column is None:
+            with self._raw(name) as raw:
+                column = self._columns[name] = raw.cast(typecode)
+        return column
+
+    def _bytes(self, name: str, row: int) -> bytes:
+        offsets = self._column(name + '.off', 'Q')
+        data = self._column(name, 'B')
+        return bytes(data[offsets[row]:offsets[row + 1]])
+
+    def _string(self, name: str, row: int) -> str:
+        return self._bytes(name, row).decode('utf-8')
+
+    def _int(self, name: str, row: int) -> int:
+        typecode = _INT_COLUMNS[name]
+        return self._column(name, typecode)[row]
+
+    def _group(self, name: str, row: int) -> memoryview:
+        offsets = self._column(name + '.off', 'Q')
+        return self._column(name, 'I')[offsets[row]:offsets[row + 1]]
+
+    def _stream_count(self, row: int) -> int:
+        count = self._stream_overlay.get(row)
+        return self._column('track.streams', 'Q')[row] if count is None else count
+
+    def _set_stream_count(self, row: int, value: int):
+        # Счетчик трека меняется под его блокировкой, общая разница - под своей
+        with self._stream_lock:
+            self._stream_delta += value - self._stream_count(row)
+            self._stream_overlay[row] = value
+
+    def total_streams(self) -> int:
+        return self._base_streams + self._stream_delta
+
+    def _match_rows(self, blob_name: str, needle: bytes) -> List[int]:
+        """Номера записей, в строке которых встречается needle (поиск по байтам в mmap)"""
+        data = self._mmap
+        start, size = self._layout[blob_name]
+        end = start + size
+        offsets = self._column(blob_name + '.off', 'Q')
+        rows = []
+        position = data.find(needle, start, end)
+        while position >= 0:
+            row = bisect_right(offsets, position - start) - 1
+            rows.append(row)
+            # Переход к следующей записи: одна запись попадает в результат один раз
+            position = data.find(needle, start + offsets[row + 1], end)
+        return rows
+
+    def search(self, query: str) -> List[TrackView]:
+        """Поиск треков по подстроке в названии или имени артиста без учета регистра"""
+        query_lower = query.lower()
+        if '\x00' in query_lower:
+            return []
+        needle = query_lower.encode('utf-8')
+        if not needle:
+            return list(self.tracks.values())
+
+        rows = set(self._match_rows('track.title.lower', needle))
+        for artist_row in self._match_rows('artist.name.lower', needle):
+            rows.update(self._group('artist.tracks', artist_row))
+        return [TrackView(self, row) for row in sorted(rows)]
+
+    @staticmethod
+    def build(service: MusicService, filename: str):
+        """Запись треков, альбомов и артистов сервиса в колоночный файл каталога"""
+        artists = list(service.artists.values())
+        albums = list(service.albums.values())
+        tracks = list(service.tracks.values())
+        artist_rows = {artist.artist_id: row for row, artist in enumerate(artists)}
+        album_rows = {album.album_id: row for row, album in enumerate(albums)}
+        track_rows = {track.track_id: row for row, track in enumerate(tracks)}
+
+        writer = _ColumnWriter()
+        for prefix, items, id_attr in (('artist', artists, 'artist_id'), ('album', albums, 'album_id'),
+                                       ('track', tracks, 'track_id')):
+            ids = [getattr(item, id_attr) for item in items]
+            writer.strings(prefix + '.id', ids)
+            encoded = [value.encode('utf-8') for value in ids]
+            writer.ints(prefix + '.order', 'I', sorted(range(len(ids)), key=encoded.__getitem__))
+
+        writer.strings('artist.name', [a.name for a in artists])
+        writer.strings('artist.bio', [a.bio for a in artists])
+        writer.search_blob('artist.name.lower', [a.name for a in artists])
+
+        writer.strings('album.title', [a.title for a in albums])
+        writer.strings('album.release_date', [a.release_date for a in albums])
+        writer.strings('album.genre', [a.genre for a in albums])
+        writer.ints('album.artist', 'I', [artist_rows[a.artist.artist_id] for a in albums])
+
+        writer.strings('track.title', [t.title for t in tracks])
+        writer.strings('track.file_path', [t.file_path for t in tracks])
+        writer.search_blob('track.title.lower', [t.title for t in tracks])
+        writer.ints('track.duration', 'i', [t.duration for t in tracks])
+        writer.ints('track.artist', 'I', [artist_rows[t.artist.artist_id] for t in tracks])
+        writer.ints('track.album', 'i', [album_rows.get(t.album.album_id, -1) if t.album else -1 for t in tracks])
+        writer.ints('track.streams', 'Q', [t.stream_count for t in tracks])
+
+        artist_albums: List[List[int]] = [[] for _ in artists]
+        for row, album in enumerate(albums):
+            artist_albums[artist_rows[album.artist.artist_id]].append(row)
+        artist_tracks: List[List[int]] = [[] for _ in artists]
+        for row, track in enumerate(tracks):
+            artist_tracks[artist_rows[track.artist.artist_id]].append(row)
+        writer.csr('artist.albums', artist_albums)
+        writer.csr('artist.tracks', artist_tracks)
+        writer.csr('album.tracks', [[track_rows[t.track_id] for t in a.tracks if t.track_id in track_rows]
+                                    for a in albums])
+
+        writer.write(filename, (len(artists), len(albums), len(tracks)))
+
+
+_INT_COLUMNS = {
+    'album.artist': 'I',
+    'track.duration': 'i',
+    'track.artist': 'I',
+    'track.album': 'i',
+    'track.streams': 'Q',
+}
@@ -1,363 +1,917 @@
-"""
-Модуль с основными классами музыкального сервиса
-"""
-import uuid
-from datetime import datetime
-from typing import List, Dict, Optional
-from exceptions import *
-
-
-class User:
-    def __init__(self, user_id: str, username: str, email: str, password: str, premium: bool = False):
-        self.user_id = user_id
-        self.username = username
-        self.email = email
-        self._password = password
-        self.premium = premium
-        self.created_at = datetime.now()
-
-    def login(self, email: str, password: str) -> bool:
-        """Аутентификация пользователя"""
-        try:
-            if email == self.email and password == self._password:
-                print(f"Пользователь {self.username} успешно вошел в систему")
-                return True
-            return False
-        except Exception as e:
-            raise MusicServiceError(f"Ошибка при входе: {str(e)}")
-
-    def upgrade_to_premium(self):
-        """Обновление до премиум-аккаунта"""
-        try:
-            if not self.premium:
-                self.premium = True
-                print(f"Пользователь {self.username} upgraded to premium")
-            else:
-                print("Аккаунт уже премиум")
-        except Exception as e:
-            raise MusicServiceError(f"Ошибка при обновлении: {str(e)}")
-
-    def to_dict(self) -> Dict:
-        return {
-            'user_id': self.user_id,
-            'username': self.username,
-            'email': self.email,
-            'premium': self.premium,
-            'created_at': self.created_at.isoformat()
-        }
-
-    def __str__(self):
-        return f"User({self.username}, {self.email}, premium: {self.premium})"
-
-
-class Artist:
-    def __init__(self, artist_id: str, name: str, bio: str = ""):
-        self.artist_id = artist_id
-        self.name = name
-        self.bio = bio
-        self.albums: List['Album'] = []
-
-    def add_album(self, album: 'Album'):
-        """Добавление альбома артисту"""
-        try:
-            if album not in self.albums:
-                self.albums.append(album)
-        except Exception as e:
-            raise MusicServiceError(f"Ошибка при добавлении альбома: {str(e)}")
-
-    def get_albums(self) -> List['Album']:
-        return self.albums
-
-    def to_dict(self) -> Dict:
-        return {
-            'artist_id': self.artist_id,
-            'name': self.name,
-            'bio': self.bio,
-            'albums_count': len(self.albums)
-        }
-
-    def __str__(self):
-        return f"Artist({self.name}, albums: {len(self.albums)})"
-
-
-class Track:
-    def __init__(self, track_id: str, title: str, duration: int, file_path: str, artist: Artist):
-        self.track_id = track_id
-        self.title = title
-        self.duration = duration  # в секундах
-        self.file_path = file_path
-        self.artist = artist
-        self.stream_count = 0
-        self.album: Optional[Album] = None
-
-    def play(self):
-        """Воспроизведение трека"""
-        try:
-            self.stream_count += 1
-            print(f"Воспроизведение: {self.title} - {self.artist.name}")
-        except Exception as e:
-            raise MusicServiceError(f"Ошибка при воспроизведении: {str(e)}")
-
-    def download(self, user: User) -> str:
-        """Скачивание трека"""
-        try:
-            if not user.premium:
-                raise InsufficientPermissionsError("Требуется премиум-аккаунт для скачивания")
-            print(f"Скачивание: {self.title}")
-            return self.file_path
-        except InsufficientPermissionsError:
-            raise
-        except Exception as e:
-            raise MusicServiceError(f"Ошибка при скачивании: {str(e)}")
-
-    def to_dict(self) -> Dict:
-        return {
-            'track_id': self.track_id,
-            'title': self.title,
-            'duration': self.duration,
-            'artist': self.artist.name,
-            'stream_count': self.stream_count,
-            'album': self.album.title if self.album else None
-        }
-
-    def __str__(self):
-        return f"Track({self.title}, {self.duration}s, by {self.artist.name})"
-
-
-class Album:
-    def __init__(self, album_id: str, title: str, artist: Artist, release_date: str, genre: str = ""):
-        self.album_id = album_id
-        self.title = title
-        self.artist = artist
-        self.release_date = release_date
-        self.genre = genre
-        self.tracks: List[Track] = []
-        artist.add_album(self)
-
-    def add_track(self, track: Track):
-        """Добавление трека в альбом"""
-        try:
-            if track not in self.tracks:
-                self.tracks.append(track)
-                track.album = self
-        except Exception as e:
-            raise MusicServiceError(f"Ошибка при добавлении трека: {str(e)}")
-
-    def get_tracks(self) -> List[Track]:
-        return self.tracks
-
-    def to_dict(self) -> Dict:
-        return {
-            'album_id': self.album_id,
-            'title': self.title,
-            'artist': self.artist.name,
-            'release_date': self.release_date,
-            'genre': self.genre,
-            'tracks_count': len(self.tracks)
-        }
-
-    def __str__(self):
-        return f"Album({self.title}, {self.artist.name}, tracks: {len(self.tracks)})"
-
-
-class PlaylistTrack:
-    """Промежуточный класс для связи плейлиста и трека с позицией"""
-
-    def __init__(self, track: Track, position: int):
-        self.track = track
-        self.position = position
-
-    def to_dict(self) -> Dict:
-        return {
-            'track_id': self.track.track_id,
-            'title': self.track.title,
-            'artist': self.track.artist.name,
-            'position': self.position
-        }
-
-
-class Playlist:
-    def __init__(self, playlist_id: str, name: str, description: str, owner: User, is_public: bool = True):
-        self.playlist_id = playlist_id
-        self.name = name
-        self.description = description
-        self.owner = owner
-        self.is_public = is_public
-        self.created_date = datetime.now()
-        self.tracks: List[PlaylistTrack] = []
-
-    def add_track(self, track: Track):
-        """Добавление трека в плейлист"""
-        try:
-            position = len(self.tracks) + 1
-            playlist_track = PlaylistTrack(track, position)
-            self.tracks.append(playlist_track)
-            print(f"Трек {track.title} добавлен в плейлист {self.name}")
-        except Exception as e:
-            raise MusicServiceError(f"Ошибка при добавлении трека: {str(e)}")
-
-    def remove_track(self, track_id: str):
-        """Удаление трека из плейлиста"""
-        try:
-            for i, playlist_track in enumerate(self.tracks):
-                if playlist_track.track.track_id == track_id:
-                    self.tracks.pop(i)
-                    # Обновляем позиции оставшихся треков
-                    for j, pt in enumerate(self.tracks[i:], start=i + 1):
-                        pt.position = j
-                    print(f"Трек удален из плейлиста {self.name}")
-                    return
-            raise TrackNotFoundError(f"Трек с ID {track_id} не найден в плейлисте")
-        except TrackNotFoundError:
-            raise
-        except Exception as e:
-            raise MusicServiceError(f"Ошибка при удалении трека: {str(e)}")
-
-    def get_tracks_info(self) -> List[Dict]:
-        """Получение информации о треках в плейлисте"""
-        return [pt.to_dict() for pt in self.tracks]
-
-    def to_dict(self) -> Dict:
-        return {
-            'playlist_id': self.playlist_id,
-            'name': self.name,
-            'description': self.description,
-            'owner': self.owner.username,
-            'is_public': self.is_public,
-            'created_date': self.created_date.isoformat(),
-            'tracks_count': len(self.tracks),
-            'tracks': self.get_tracks_info()
-        }
-
-    def __str__(self):
-        return f"Playlist({self.name}, owner: {self.owner.username}, tracks: {len(self.tracks)})"
-
-
-class MusicService:
-    """Основной класс музыкального сервиса"""
-
-    def __init__(self):
-        self.users: Dict[str, User] = {}
-        self.artists: Dict[str, Artist] = {}
-        self.tracks: Dict[str, Track] = {}
-        self.albums: Dict[str, Album] = {}
-        self.playlists: Dict[str, Playlist] = {}
-        self.current_user: Optional[User] = None
-
-    def register_user(self, username: str, email: str, password: str) -> User:
-        """Регистрация нового пользователя"""
-        try:
-            # Проверка на существующий email
-            for user in self.users.values():
-                if user.email == email:
-                    raise MusicServiceError(f"Пользователь с email {email} уже существует")
-
-            user_id = str(uuid.uuid4())
-            user = User(user_id, username, email, password)
-            self.users[user_id] = user
-            print(f"Пользователь {username} успешно зарегистрирован")
-            return user
-        except MusicServiceError:
-            raise
-        except Exception as e:
-            raise MusicServiceError(f"Ошибка при регистрации: {str(e)}")
-
-    def login(self, email: str, password: str) -> bool:
-        """Вход пользователя в систему"""
-        try:
-            for user in self.users.values():
-                if user.login(email, password):
-                    self.current_user = user
-                    return True
-            raise AuthenticationError("Неверный email или пароль")
-        except AuthenticationError:
-            raise
-        except Exception as e:
-            raise MusicServiceError(f"Ошибка при входе: {str(e)}")
-
-    def logout(self):
-        """Выход пользователя из системы"""
-        self.current_user = None
-        print("Пользователь вышел из системы")
-
-    def add_track(self, title: str, duration: int, file_path: str, artist_name: str) -> Track:
-        """Добавление нового трека"""
-        try:
-            if not self.current_user:
-                raise InsufficientPermissionsError("Требуется вход в систему")
-
-            # Создаем или находим артиста
-            artist = next((a for a in self.artists.values() if a.name == artist_name), None)
-            if not artist:
-                artist_id = str(uuid.uuid4())
-                artist = Artist(artist_id, artist_name)
-                self.artists[artist_id] = artist
-
-            track_id = str(uuid.uuid4())
-            track = Track(track_id, title, duration, file_path, artist)
-            self.tracks[track_id] = track
-            return track
-        except InsufficientPermissionsError:
-            raise
-        except Exception as e:
-            raise MusicServiceError(f"Ошибка при добавлении трека: {str(e)}")
-
-    def create_playlist(self, name: str, description: str = "", is_public: bool = True) -> Playlist:
-        """Создание плейлиста"""
-        try:
-            if not self.current_user:
-                raise InsufficientPermissionsError("Требуется вход в систему")
-
-            playlist_id = str(uuid.uuid4())
-            playlist = Playlist(playlist_id, name, description, self.current_user, is_public)
-            self.playlists[playlist_id] = playlist
-            print(f"Плейлист {name} создан")
-            return playlist
-        except InsufficientPermissionsError:
-            raise
-        except Exception as e:
-            raise MusicServiceError(f"Ошибка при создании плейлиста: {str(e)}")
-
-    def get_user_playlists(self, user_id: str = None) -> List[Playlist]:
-        """Получение плейлистов пользователя"""
-        try:
-            if not user_id and self.current_user:
-                user_id = self.current_user.user_id
-
-            if not user_id:
-                raise InsufficientPermissionsError("Требуется указать user_id или войти в систему")
-
-            user_playlists = []
-            for playlist in self.playlists.values():
-                if playlist.owner.user_id == user_id:
-                    user_playlists.append(playlist)
-
-            return user_playlists
-        except Exception as e:
-            raise MusicServiceError(f"Ошибка при получении плейлистов: {str(e)}")
-
-    def search_tracks(self, query: str) -> List[Track]:
-        """Поиск треков по названию или артисту"""
-        try:
-            results = []
-            query_lower = query.lower()
-
-            for track in self.tracks.values():
-                if (query_lower in track.title.lower() or
-                        query_lower in track.artist.name.lower()):
-                    results.append(track)
-
-            return results
-        except Exception as e:
-            raise MusicServiceError(f"Ошибка при поиске: {str(e)}")
-
-    def get_statistics(self) -> Dict:
-        """Получение статистики сервиса"""
-        return {
-            'users_count': len(self.users),
-            'artists_count': len(self.artists),
-            'tracks_count': len(self.tracks),
-            'albums_count': len(self.albums),
-            'playlists_count': len(self.playlists),
-            'total_streams': sum(track.stream_count for track in self.tracks.values())
+"""
+Модуль с основными классами музыкального сервиса
+"""
+import contextlib
+import gc
+import os
+import sys
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Dict, Optional, Tuple
+from exceptions import *
+from search_index import TrackSearchIndex
+from change_tracking import ChangeTracker
+from playlist_storage import PlaylistTrackList
+from user_stats import UserAggregates
+from catalog_stats import CatalogAggregates, totals_of
+from query_cache import QueryCache
+from sessions import Session, SessionStore, StripedLocks
+from event_log import get_logger
+
+_log = get_logger('models')
+
+
+# Даты хранятся целым числом микросекунд от этой точки, а не объектом datetime
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _to_timestamp(value: datetime) -> int:
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def _from_timestamp(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+_NO_LOCK = contextlib.nullcontext()
+
+_UUID_VARIANT = {digit: '89ab'[int(digit, 16) & 3] for digit in '0123456789abcdef'}
+
+
+def _new_ids(count: int) -> List[str]:
+    """count идентификаторов в формате str(uuid.uuid4()) из одного вызова os.urandom"""
+    data = os.urandom(16 * count).hex()
+    return [f"{h[:8]}-{h[8:12]}-4{h[13:16]}-{_UUID_VARIANT[h[16]]}{h[17:20]}-{h[20:]}"
+            for h in (data[i:i + 32] for i in range(0, 32 * count, 32))]
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    """
+    Сборщик мусора отключается на время пакетной операции: она создает
+    сотни тысяч объектов, и без этого полные сборки многократно обходят
+    весь каталог. Если сборщик уже был отключен, состояние не меняется.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _check_record(number: int, record: Dict, fields: Tuple[str, ...]):
+    """Проверка записи пакета: обязательные строковые поля заданы и не пусты"""
+    try:
+        valid = all(type(record[field]) is str and record[field] for field in fields)
+    except (KeyError, TypeError):
+        valid = False
+    if not valid:
+        raise MusicServiceError(f"Запись {number}: обязательные поля {', '.join(fields)} должны быть непустыми строками")
+
+
+def _lock_of(service: Optional['MusicService'], key: str):
+    """Блокировка объекта сервиса; объект вне сервиса между потоками не разделяется"""
+    return service.entity_lock(key) if service is not None else _NO_LOCK
+
+
+class User:
+    __slots__ = ('user_id', 'username', 'email', '_password', 'premium', '_created_at', '_service')
+
+    def __init__(self, user_id: str, username: str, email: str, password: str, premium: bool = False):
+        self.user_id = user_id
+        self.username = username
+        self.email = email
+        self._password = password
+        self.premium = premium
+        self._created_at = _to_timestamp(datetime.now())
+        self._service: Optional['MusicService'] = None
+
+    @property
+    def created_at(self) -> datetime:
+        return _from_timestamp(self._created_at)
+
+    @created_at.setter
+    def created_at(self, value: datetime):
+        self._created_at = _to_timestamp(value)
+
+    def login(self, email: str, password: str) -> bool:
+        """Аутентификация пользователя"""
+        try:
+            if email == self.email and password == self._password:
+                _log.info("Пользователь %s успешно вошел в систему", self.username)
+                return True
+            return False
+        except Exception as e:
+            raise MusicServiceError(f"Ошибка при входе: {str(e)}")
+
+    def upgrade_to_premium(self):
+        """Обновление до премиум-аккаунта"""
+        with _lock_of(self._service, self.user_id):
+            try:
+                if not self.premium:
+                    self.premium = True
+                    if self._service is not None:
+                        self._service.notify('user_updated', user=self)
+                    _log.info("Пользователь %s upgraded to premium", self.username)
+                else:
+                    _log.info("Аккаунт уже премиум")
+            except Exception as e:
+                raise MusicServiceError(f"Ошибка при обновлении: {str(e)}")
+
+    def to_dict(self) -> Dict:
+        return {
+            'user_id': self.user_id,
+            'username': self.username,
+            'email': self.email,
+            'premium': self.premium,
+            'created_at': self.created_at.isoformat()
+        }
+
+    def __str__(self):
+        return f"User({self.username}, {self.email}, premium: {self.premium})"
+
+
+class Artist:
+    __slots__ = ('artist_id', 'name', 'bio', 'albums')
+
+    def __init__(self, artist_id: str, name: str, bio: str = ""):
+        self.artist_id = artist_id
+        self.name = sys.intern(name)
+        self.bio = bio
+        self.albums: List['Album'] = []
+
+    def add_album(self, album: 'Album'):
+        """Добавление альбома артисту"""
+        try:
+            if album not in self.albums:
+                self.albums.append(album)
+        except Exception as e:
+            raise MusicServiceError(f"Ошибка при добавлении альбома: {str(e)}")
+
+    def get_albums(self) -> List['Album']:
+        return self.albums
+
+    def to_dict(self) -> Dict:
+        return {
+            'artist_id': self.artist_id,
+            'name': self.name,
+            'bio': self.bio,
+            'albums_count': len(self.albums)
+        }
+
+    def __str__(self):
+        return f"Artist({self.name}, albums: {len(self.albums)})"
+
+
+class Track:
+    __slots__ = ('track_id', 'title', 'duration', 'file_path', 'artist', '_stream_count', 'album', '_service')
+
+    def __init__(self, track_id: str, title: str, duration: int, file_path: str, artist: Artist):
+        self.track_id = track_id
+        self.title = title
+        self.duration = duration  # в секундах
+        self.file_path = file_path
+        self.artist = artist
+        self._stream_count = 0
+        self.album: Optional[Album] = None
+        self._service: Optional['MusicService'] = None
+
+    @property
+    def stream_count(self) -> int:
+        return self._stream_count
+
+    @stream_count.setter
+    def stream_count(self, value: int):
+        # Общее число прослушиваний сервиса и сводки альбома и артиста
+        # поддерживаются без пересчета по всем трекам
+        if self._service is not None:
+            delta = value - self._stream_count
+            with self._service._lock:
+                self._service._total_streams += delta
+            self._service.catalog_stats.add_streams(self, delta)
+        self._stream_count = value
+
+    def play(self):
+        """Воспроизведение трека"""
+        with _lock_of(self._service, self.track_id):
+            try:
+                self.stream_count += 1
+                if self._service is not None:
+                    self._service.notify('track_played', track=self, count=1)
+                _log.info("Воспроизведение: %s - %s", self.title, self.artist.name)
+            except Exception as e:
+                raise MusicServiceError(f"Ошибка при воспроизведении: {str(e)}")
+
+    def download(self, user: User) -> str:
+        """Скачивание трека"""
+        try:
+            if not user.premium:
+                raise InsufficientPermissionsError("Требуется премиум-аккаунт для скачивания")
+            _log.info("Скачивание: %s", self.title)
+            return self.file_path
+        except InsufficientPermissionsError:
+            raise
+        except Exception as e:
+            raise MusicServiceError(f"Ошибка при скачивании: {str(e)}")
+
+    def to_dict(self) -> Dict:
+        return {
+            'track_id': self.track_id,
+            'title': self.title,
+            'duration': self.duration,
+            'artist': self.artist.name,
+            'stream_count': self.stream_count,
+            'album': self.album.title if self.album else None
+        }
+
+    def __str__(self):
+        return f"Track({self.title}, {self.duration}s, by {self.artist.name})"
+
+
+class Album:
+    __slots__ = ('album_id', 'title', 'artist', 'release_date', 'genre', 'tracks', '_service')
+
+    def __init__(self, album_id: str, title: str, artist: Artist, release_date: str, genre: str = ""):
+        self.album_id = album_id
+        self.title = title
+        self.artist = artist
+        # Даты релиза и жанры повторяются у множества альбомов
+        self.release_date = sys.intern(release_date) if isinstance(release_date, str) else release_date
+        self.genre = sys.intern(genre) if isinstance(genre, str) else genre
+        self.tracks: List[Track] = []
+        self._service: Optional['MusicService'] = None
+        artist.add_album(self)
+
+    def add_track(self, track: Track):
+        """Добавление трека в альбом"""
+        with _lock_of(self._service, self.album_id):
+            try:
+                if track not in self.tracks:
+                    self.tracks.append(track)
+                    track.album = self
+                    if self._service is not None:
+                        self._service.notify('album_track_added', album=self, track=track)
+            except Exception as e:
+                raise MusicServiceError(f"Ошибка при добавлении трека: {str(e)}")
+
+    def add_tracks(self, tracks: Iterable[Track]) -> int:
+        """Пакетное добавление треков в альбом (одно событие на пачку)"""
+        with _lock_of(self._service, self.album_id):
+            try:
+                present = {id(track) for track in self.tracks}
+                added = []
+                for track in tracks:
+                    if id(track) not in present:
+                        present.add(id(track))
+                        self.tracks.append(track)
+                        track.album = self
+                        added.append(track)
+                if added and self._service is not None:
+                    self._service.notify('album_tracks_added', album=self, tracks=added)
+                return len(added)
+            except Exception as e:
+                raise MusicServiceError(f"Ошибка при добавлении треков: {str(e)}")
+
+    def get_tracks(self) -> List[Track]:
+        return self.tracks
+
+    def to_dict(self) -> Dict:
+        return {
+            'album_id': self.album_id,
+            'title': self.title,
+            'artist': self.artist.name,
+            'release_date': self.release_date,
+            'genre': self.genre,
+            'tracks_count': len(self.tracks)
+        }
+
+    def __str__(self):
+        return f"Album({self.title}, {self.artist.name}, tracks: {len(self.tracks)})"
+
+
+class PlaylistTrack:
+    """Промежуточный класс для связи плейлиста и трека с позицией"""
+    __slots__ = ('track', '_position', '_chunk')
+
+    def __init__(self, track: Track, position: int = 0):
+        self.track = track
+        self._position = position
+        # Блок PlaylistTrackList, в котором находится запись
+        self._chunk = None
+
+    @property
+    def position(self) -> int:
+        """Позиция в плейлисте (с 1), вычисляется по месту записи в списке"""
+        if self._chunk is not None:
+            return self._chunk.owner.index(self) + 1
+        return self._position
+
+    @position.setter
+    def position(self, value: int):
+        self._position = value
+
+    def to_dict(self, position: Optional[int] = None) -> Dict:
+        return {
+            'track_id': self.track.track_id,
+            'title': self.track.title,
+            'artist': self.track.artist.name,
+            'position': self.position if position is None else position
+        }
+
+
+class Playlist:
+    __slots__ = ('playlist_id', 'name', 'description', 'owner', 'is_public', '_created_date', 'tracks', '_service')
+
+    def __init__(self, playlist_id: str, name: str, description: str, owner: User, is_public: bool = True):
+        self.playlist_id = playlist_id
+        self.name = name
+        self.description = description
+        self.owner = owner
+        self.is_public = is_public
+        self._created_date = _to_timestamp(datetime.now())
+        self.tracks = PlaylistTrackList()
+        self._service: Optional['MusicService'] = None
+
+    @property
+    def created_date(self) -> datetime:
+        return _from_timestamp(self._created_date)
+
+    @created_date.setter
+    def created_date(self, value: datetime):
+        self._created_date = _to_timestamp(value)
+
+    def add_track(self, track: Track):
+        """Добавление трека в плейлист"""
+        with _lock_of(self._service, self.playlist_id):
+            try:
+                self.tracks.append(PlaylistTrack(track))
+                if self._service is not None:
+                    self._service.notify('playlist_track_added', playlist=self, track=track, position=len(self.tracks))
+                _log.info("Трек %s добавлен в плейлист %s", track.title, self.name)
+            except Exception as e:
+                raise MusicServiceError(f"Ошибка при добавлении трека: {str(e)}")
+
+    def add_tracks(self, tracks: Iterable[Track]):
+        """Добавление нескольких треков в конец плейлиста"""
+        with _lock_of(self._service, self.playlist_id):
+            tracks = list(tracks)
+            try:
+                start = len(self.tracks)
+                self.tracks.extend(PlaylistTrack(track) for track in tracks)
+                if self._service is not None and tracks:
+                    # Одно событие на пачку; position - позиция первого добавленного трека
+                    self._service.notify('playlist_tracks_added', playlist=self, tracks=tracks, position=start + 1)
+                _log.info("В плейлист %s добавлено треков: %s", self.name, len(tracks))
+            except Exception as e:
+                raise MusicServiceError(f"Ошибка при добавлении треков: {str(e)}")
+
+    def insert_track(self, track: Track, position: int):
+        """Вставка трека на позицию position (с 1); последующие треки сдвигаются"""
+        with _lock_of(self._service, self.playlist_id):
+            if not 1 <= position <= len(self.tracks) + 1:
+                raise MusicServiceError(f"Недопустимая позиция {position} в плейлисте {self.name}")
+            self.tracks.insert(position - 1, PlaylistTrack(track))
+            if self._service is not None:
+                self._service.notify('playlist_track_added', playlist=self, track=track, position=position)
+            _log.info("Трек %s добавлен в плейлист %s на позицию %s", track.title, self.name, position)
+
+    def remove_track(self, track_id: str):
+        """Удаление трека из плейлиста (первого вхождения)"""
+        with _lock_of(self._service, self.playlist_id):
+            playlist_track = self.tracks.first(track_id)
+            if playlist_track is None:
+                raise TrackNotFoundError(f"Трек с ID {track_id} не найден в плейлисте")
+            try:
+                self.tracks.remove(playlist_track)
+                if self._service is not None:
+                    self._service.notify('playlist_track_removed', playlist=self, track=playlist_track.track)
+                _log.info("Трек удален из плейлиста %s", self.name)
+            except Exception as e:
+                raise MusicServiceError(f"Ошибка при удалении трека: {str(e)}")
+
+    def remove_tracks(self, track_ids: Iterable[str]):
+        """
+        Удаление нескольких треков: каждый ID удаляет одно вхождение, как
+        remove_track. Если какого-то трека нет, плейлист не изменяется.
+        """
+        with _lock_of(self._service, self.playlist_id):
+            track_ids = list(track_ids)
+            wanted: Dict[str, int] = {}
+            for track_id in track_ids:
+                wanted[track_id] = wanted.get(track_id, 0) + 1
+            removed = []
+            for track_id, count in wanted.items():
+                entries = self.tracks.entries_for(track_id)
+                if len(entries) < count:
+                    raise TrackNotFoundError(f"Трек с ID {track_id} не найден в плейлисте")
+                removed.extend(entries[:count])
+            try:
+                self.tracks.remove_many(removed)
+                if self._service is not None:
+                    for playlist_track in removed:
+                        self._service.notify('playlist_track_removed', playlist=self, track=playlist_track.track)
+                _log.info("Из плейлиста %s удалено треков: %s", self.name, len(removed))
+            except Exception as e:
+                raise MusicServiceError(f"Ошибка при удалении треков: {str(e)}")
+
+    def move_track(self, from_position: int, to_position: int):
+        """Перемещение трека с позиции from_position на to_position (с 1)"""
+        with _lock_of(self._service, self.playlist_id):
+            size = len(self.tracks)
+            if not (1 <= from_position <= size and 1 <= to_position <= size):
+                raise MusicServiceError(f"Недопустимая позиция в плейлисте {self.name}")
+            playlist_track = self.tracks[from_position - 1]
+            self.tracks.move(from_position - 1, to_position - 1)
+            if self._service is not None:
+                self._service.notify('playlist_track_moved', playlist=self, track=playlist_track.track,
+                                     from_position=from_position, to_position=to_position)
+
+    def clear_tracks(self):
+        """Удаление всех треков из плейлиста"""
+        with _lock_of(self._service, self.playlist_id):
+            self.tracks.clear()
+            if self._service is not None:
+                self._service.notify('playlist_cleared', playlist=self)
+
+    def get_tracks_info(self) -> List[Dict]:
+        """Получение информации о треках в плейлисте"""
+        return [pt.to_dict(position) for position, pt in enumerate(self.tracks, start=1)]
+
+    def to_dict(self) -> Dict:
+        return {
+            'playlist_id': self.playlist_id,
+            'name': self.name,
+            'description': self.description,
+            'owner': self.owner.username,
+            'is_public': self.is_public,
+            'created_date': self.created_date.isoformat(),
+            'tracks_count': len(self.tracks),
+            'tracks': self.get_tracks_info()
+        }
+
+    def __str__(self):
+        return f"Playlist({self.name}, owner: {self.owner.username}, tracks: {len(self.tracks)})"
+
+
+class MusicService:
+    """
+    Основной класс музыкального сервиса.
+
+    Один экземпляр может обслуживать много пользователей из разных потоков.
+    Изменения отдельных объектов (плейлиста, трека, альбома, пользователя)
+    выполняются под блокировкой объекта (entity_lock), словари и индексы
+    сервиса - под общей блокировкой _lock. Общая блокировка берется только
+    на короткое время и никогда не удерживается при захвате блокировки
+    объекта. Подписчики событий сами отвечают за свою потокобезопасность.
+    """
+
+    def __init__(self):
+        self.users: Dict[str, User] = {}
+        self.artists: Dict[str, Artist] = {}
+        self.tracks: Dict[str, Track] = {}
+        self.albums: Dict[str, Album] = {}
+        self.playlists: Dict[str, Playlist] = {}
+        self.current_user: Optional[User] = None
+        self._search_index = TrackSearchIndex()
+        # Вторичные индексы для поиска без просмотра всех объектов
+        self._users_by_email: Dict[str, User] = {}
+        self._users_by_username: Dict[str, User] = {}
+        self._artists_by_name: Dict[str, Artist] = {}
+        # (название, artist_id) -> альбом
+        self._albums_by_key: Dict[Tuple[str, str], Album] = {}
+        # user_id владельца -> {playlist_id: плейлист}
+        self._playlists_by_owner: Dict[str, Dict[str, Playlist]] = {}
+        # Подписчики на изменения данных: listener(event, payload)
+        self._listeners: List[Callable[[str, Dict], None]] = []
+        self.change_tracker = ChangeTracker()
+        self.add_listener(self.change_tracker)
+        self.user_stats = UserAggregates()
+        self.add_listener(self.user_stats)
+        self.catalog_stats = CatalogAggregates()
+        self.add_listener(self.catalog_stats)
+        # Кэш результатов search_tracks и get_user_playlists
+        self.query_cache = QueryCache()
+        self.add_listener(self.query_cache)
+        # Каталог только для чтения (mmap_catalog.MappedCatalog), если подключен
+        self.catalog = None
+        # Сумма stream_count по трекам, обновляется при каждом изменении счетчика
+        self._total_streams = 0
+        self._lock = threading.RLock()
+        self._entity_locks = StripedLocks()
+        self.sessions = SessionStore()
+
+    def entity_lock(self, key: str):
+        """Блокировка изменений объекта с данным ID"""
+        return self._entity_locks(key)
+
+    def attach_catalog(self, catalog):
+        """
+        Подключение каталога только для чтения: tracks, albums и artists
+        начинают обращаться к нему, объекты создаются по требованию
+        """
+        self.catalog = catalog
+        catalog.service = self
+        self.query_cache.clear()
+        self.tracks = catalog.tracks
+        self.albums = catalog.albums
+        self.artists = catalog.artists
+        self._search_index = TrackSearchIndex()
+        self._artists_by_name = {}
+        for artist in catalog.artists.values():
+            self._index_put(self._artists_by_name, artist.name, artist)
+        self._albums_by_key = {}
+        for album in catalog.albums.values():
+            self._index_put(self._albums_by_key, (album.title, album.artist.artist_id), album)
+
+    def add_listener(self, listener: Callable[[str, Dict], None]):
+        """Подписка на события изменения данных сервиса"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, Dict], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def notify(self, event: str, **payload):
+        """Оповещение подписчиков об изменении (вызывается моделями и сервисом)"""
+        for listener in self._listeners:
+            listener(event, payload)
+
+    @staticmethod
+    def _index_put(index: Dict, key, value):
+        # Как и прежний поиск через next(...), индекс возвращает первый добавленный объект
+        index.setdefault(key, value)
+
+    @staticmethod
+    def _index_drop(index: Dict, key, value):
+        if index.get(key) is value:
+            del index[key]
+
+    def store_user(self, user: User):
+        """Сохранение готового пользователя с обновлением индексов"""
+        with self._lock:
+            previous = self.users.get(user.user_id)
+            if previous is not None:
+                self._index_drop(self._users_by_email, previous.email, previous)
+                self._index_drop(self._users_by_username, previous.username, previous)
+            self.users[user.user_id] = user
+            self._index_put(self._users_by_email, user.email, user)
+            self._index_put(self._users_by_username, user.username, user)
+            user._service = self
+            self.notify('user_stored', user=user)
+
+    def store_users(self, users: List[User]):
+        """Пакетное сохранение готовых пользователей (одно событие на пачку)"""
+        with self._lock:
+            by_email = self._users_by_email
+            by_username = self._users_by_username
+            for user in users:
+                previous = self.users.get(user.user_id)
+                if previous is not None:
+                    self._index_drop(by_email, previous.email, previous)
+                    self._index_drop(by_username, previous.username, previous)
+                self.users[user.user_id] = user
+                by_email.setdefault(user.email, user)
+                by_username.setdefault(user.username, user)
+                user._service = self
+            self.notify('users_stored', users=users)
+
+    def store_artist(self, artist: Artist):
+        """Сохранение готового артиста с обновлением индекса по имени"""
+        with self._lock:
+            previous = self.artists.get(artist.artist_id)
+            if previous is not None:
+                self._index_drop(self._artists_by_name, previous.name, previous)
+            self.artists[artist.artist_id] = artist
+            self._index_put(self._artists_by_name, artist.name, artist)
+            self.notify('artist_stored', artist=artist)
+
+    def store_track(self, track: Track):
+        """Сохранение готового трека в каталоге с обновлением поискового индекса"""
+        with self._lock:
+            previous = self.tracks.get(track.track_id)
+            if previous is not None and previous is not track:
+                self._total_streams -= previous.stream_count
+                self.query_cache.invalidate_tracks((previous,))
+            if track._service is not self:
+                self._total_streams += track.stream_count
+            self.tracks[track.track_id] = track
+            self._search_index.add(track)
+            track._service = self
+            self.notify('track_stored', track=track)
+
+    def store_tracks(self, tracks: List[Track]):
+        """Пакетное сохранение готовых треков; триграммы названий строятся одним проходом"""
+        with self._lock:
+            catalog = self.tracks
+            replaced = []
+            for track in tracks:
+                previous = catalog.get(track.track_id)
+                if previous is not None and previous is not track:
+                    self._total_streams -= previous.stream_count
+                    replaced.append(previous)
+                if track._service is not self:
+                    self._total_streams += track.stream_count
+                catalog[track.track_id] = track
+                track._service = self
+            self._search_index.add_many(tracks)
+            if replaced:
+                self.query_cache.invalidate_tracks(replaced)
+            self.notify('tracks_stored', tracks=tracks)
+
+    def store_album(self, album: Album):
+        """Сохранение готового альбома с обновлением индекса по названию и артисту"""
+        with self._lock:
+            previous = self.albums.get(album.album_id)
+            if previous is not None:
+                self._index_drop(self._albums_by_key, (previous.title, previous.artist.artist_id), previous)
+            self.albums[album.album_id] = album
+            self._index_put(self._albums_by_key, (album.title, album.artist.artist_id), album)
+            album._service = self
+            self.notify('album_stored', album=album)
+
+    def store_playlist(self, playlist: Playlist):
+        """Сохранение готового плейлиста с обновлением индекса по владельцу"""
+        with self._lock:
+            previous = self.playlists.get(playlist.playlist_id)
+            if previous is not None:
+                owned = self._playlists_by_owner.get(previous.owner.user_id, {})
+                if owned.get(previous.playlist_id) is previous:
+                    del owned[previous.playlist_id]
+                self.query_cache.invalidate_playlist(previous)
+            self.playlists[playlist.playlist_id] = playlist
+            self._playlists_by_owner.setdefault(playlist.owner.user_id, {})[playlist.playlist_id] = playlist
+            playlist._service = self
+            self.notify('playlist_stored', playlist=playlist)
+
+    def find_user_by_email(self, email: str) -> Optional[User]:
+        return self._users_by_email.get(email)
+
+    def find_user_by_username(self, username: str) -> Optional[User]:
+        return self._users_by_username.get(username)
+
+    def find_artist_by_name(self, name: str) -> Optional[Artist]:
+        return self._artists_by_name.get(name)
+
+    def find_album(self, title: str, artist: Artist) -> Optional[Album]:
+        return self._albums_by_key.get((title, artist.artist_id))
+
+    def register_user(self, username: str, email: str, password: str) -> User:
+        """Регистрация нового пользователя"""
+        with self._lock:
+            try:
+                # Проверка на существующий email
+                if email in self._users_by_email:
+                    raise MusicServiceError(f"Пользователь с email {email} уже существует")
+
+                user_id = str(uuid.uuid4())
+                user = User(user_id, username, email, password)
+                self.store_user(user)
+                _log.info("Пользователь %s успешно зарегистрирован", username)
+                return user
+            except MusicServiceError:
+                raise
+            except Exception as e:
+                raise MusicServiceError(f"Ошибка при регистрации: {str(e)}")
+
+    def register_users(self, records: Iterable[Dict]) -> List[User]:
+        """
+        Пакетная регистрация пользователей из записей {'username', 'email', 'password'}.
+        Пачка проверяется целиком до изменений: если какой-то email занят или
+        повторяется в пачке, не регистрируется никто.
+        """
+        records = list(records)
+        with self._lock, _gc_paused():
+            emails = set()
+            for number, record in enumerate(records, start=1):
+                _check_record(number, record, ('username', 'email', 'password'))
+                email = record['email']
+                if email in self._users_by_email or email in emails:
+                    raise MusicServiceError(f"Пользователь с email {email} уже существует")
+                emails.add(email)
+
+            users = [User(user_id, record['username'], record['email'], record['password'])
+                     for user_id, record in zip(_new_ids(len(records)), records)]
+            self.store_users(users)
+        _log.info("Зарегистрировано пользователей: %s", len(users))
+        return users
+
+    def login(self, email: str, password: str) -> bool:
+        """Вход пользователя в систему"""
+        try:
+            user = self._users_by_email.get(email)
+            if user is not None and user.login(email, password):
+                self.current_user = user
+                return True
+            raise AuthenticationError("Неверный email или пароль")
+        except AuthenticationError:
+            raise
+        except Exception as e:
+            raise MusicServiceError(f"Ошибка при входе: {str(e)}")
+
+    def logout(self):
+        """Выход пользователя из системы"""
+        self.current_user = None
+        _log.info("Пользователь вышел из системы")
+
+    def start_session(self, email: str, password: str) -> Session:
+        """
+        Вход с созданием отдельной сессии. В отличие от login, current_user
+        не меняется, поэтому сессий может быть сколько угодно одновременно.
+        """
+        user = self._users_by_email.get(email)
+        if user is None or not user.login(email, password):
+            raise AuthenticationError("Неверный email или пароль")
+        return self.sessions.create(user)
+
+    def end_session(self, session):
+        self.sessions.remove(session.token if isinstance(session, Session) else session)
+
+    def _session_user(self, session) -> Optional[User]:
+        """Пользователь сессии (объект Session или токен); без сессии - current_user"""
+        if session is None:
+            return self.current_user
+        active = self.sessions.get(session.token if isinstance(session, Session) else session)
+        if active is None:
+            raise AuthenticationError("Сессия не найдена или истекла")
+        return active.user
+
+    def add_track(self, title: str, duration: int, file_path: str, artist_name: str,
+                  session=None) -> Track:
+        """Добавление нового трека"""
+        try:
+            if not self._session_user(session):
+                raise InsufficientPermissionsError("Требуется вход в систему")
+
+            with self._lock:
+                # Создаем или находим артиста
+                artist = self._artists_by_name.get(artist_name)
+                if not artist:
+                    artist_id = str(uuid.uuid4())
+                    artist = Artist(artist_id, artist_name)
+                    self.store_artist(artist)
+
+                track_id = str(uuid.uuid4())
+                track = Track(track_id, title, duration, file_path, artist)
+                self.store_track(track)
+            return track
+        except (InsufficientPermissionsError, AuthenticationError):
+            raise
+        except Exception as e:
+            raise MusicServiceError(f"Ошибка при добавлении трека: {str(e)}")
+
+    def add_tracks(self, records: Iterable[Dict], session=None) -> List[Track]:
+        """
+        Пакетное добавление треков из записей {'title', 'duration', 'artist', 'file_path'}
+        (file_path необязателен). Пачка проверяется целиком до изменений: при
+        ошибке в любой записи не добавляется ничего. Артисты находятся или
+        создаются одним проходом по уникальным именам.
+        """
+        if not self._session_user(session):
+            raise InsufficientPermissionsError("Требуется вход в систему")
+
+        records = list(records)
+        for number, record in enumerate(records, start=1):
+            _check_record(number, record, ('title', 'artist'))
+            duration = record.get('duration')
+            if type(duration) is not int or duration <= 0:
+                raise MusicServiceError(f"Запись {number}: недопустимая длительность {duration!r}")
+            if not isinstance(record.get('file_path', ''), str):
+                raise MusicServiceError(f"Запись {number}: недопустимый путь к файлу")
+
+        with self._lock, _gc_paused():
+            artists = self._artists_by_name
+            missing = [name for name in dict.fromkeys(record['artist'] for record in records)
+                       if name not in artists]
+            for artist_id, name in zip(_new_ids(len(missing)), missing):
+                self.store_artist(Artist(artist_id, name))
+
+            tracks = [Track(track_id, record['title'], record['duration'], record.get('file_path', ''),
+                            artists[record['artist']])
+                      for track_id, record in zip(_new_ids(len(records)), records)]
+            self.store_tracks(tracks)
+        _log.info("Добавлено треков: %s, новых артистов: %s", len(tracks), len(missing))
+        return tracks
+
+    def create_playlist(self, name: str, description: str = "", is_public: bool = True,
+                        session=None) -> Playlist:
+        """Создание плейлиста"""
+        try:
+            owner = self._session_user(session)
+            if not owner:
+                raise InsufficientPermissionsError("Требуется вход в систему")
+
+            playlist_id = str(uuid.uuid4())
+            playlist = Playlist(playlist_id, name, description, owner, is_public)
+            self.store_playlist(playlist)
+            _log.info("Плейлист %s создан", name)
+            return playlist
+        except (InsufficientPermissionsError, AuthenticationError):
+            raise
+        except Exception as e:
+            raise MusicServiceError(f"Ошибка при создании плейлиста: {str(e)}")
+
+    def add_playlist_tracks(self, entries: Iterable[Tuple[str, str]]) -> int:
+        """
+        Пакетное добавление треков в плейлисты из пар (playlist_id, track_id).
+        Все плейлисты и треки проверяются заранее: если чего-то нет, не
+        изменяется ни один плейлист. Треки каждого плейлиста добавляются
+        в конец одним вызовом Playlist.add_tracks в порядке следования пар.
+        Возвращает число добавленных треков.
+        """
+        grouped: Dict[str, List[Track]] = {}
+        for playlist_id, track_id in entries:
+            if playlist_id not in self.playlists:
+                raise PlaylistNotFoundError(f"Плейлист с ID {playlist_id} не найден")
+            track = self.tracks.get(track_id)
+            if track is None:
+                raise TrackNotFoundError(f"Трек с ID {track_id} не найден")
+            grouped.setdefault(playlist_id, []).append(track)
+
+        with _gc_paused():
+            for playlist_id, tracks in grouped.items():
+                self.playlists[playlist_id].add_tracks(tracks)
+        return sum(len(tracks) for tracks in grouped.values())
+
+    def get_user_playlists(self, user_id: str = None, session=None) -> List[Playlist]:
+        """Получение плейлистов пользователя"""
+        try:
+            if not user_id:
+                user = self._session_user(session)
+                if user:
+                    user_id = user.user_id
+
+            if not user_id:
+                raise InsufficientPermissionsError("Требуется указать user_id или войти в систему")
+
+            with self._lock:
+                key = ('playlists', user_id)
+                playlists = self.query_cache.get(key)
+                if playlists is None:
+                    playlists = list(self._playlists_by_owner.get(user_id, {}).values())
+                    self.query_cache.put(key, playlists)
+                return playlists
+        except AuthenticationError:
+            raise
+        except Exception as e:
+            raise MusicServiceError(f"Ошибка при получении плейлистов: {str(e)}")
+
+    def get_user_stats(self, user_id: str = None, session=None) -> Dict:
+        """Число плейлистов пользователя, треков в них и их общая длительность"""
+        if not user_id:
+            user = self._session_user(session)
+            if user:
+                user_id = user.user_id
+        if not user_id:
+            raise InsufficientPermissionsError("Требуется указать user_id или войти в систему")
+        return self.user_stats.get(user_id).to_dict()
+
+    def get_album_stats(self, album_id: str) -> Dict:
+        """Число треков альбома, их общая длительность и сумма прослушиваний"""
+        if album_id not in self.albums:
+            raise AlbumNotFoundError(f"Альбом {album_id} не найден")
+        if self.catalog is not None:
+            return totals_of(self.albums[album_id].tracks).to_dict()
+        return self.catalog_stats.album(album_id).to_dict()
+
+    def get_artist_stats(self, artist_id: str) -> Dict:
+        """Число треков артиста, их общая длительность и сумма прослушиваний"""
+        if artist_id not in self.artists:
+            raise ArtistNotFoundError(f"Артист {artist_id} не найден")
+        if self.catalog is not None:
+            return totals_of(self.artists[artist_id].tracks).to_dict()
+        return self.catalog_stats.artist(artist_id).to_dict()
+
+    def search_tracks(self, query: str) -> List[Track]:
+        """Поиск треков по названию или артисту"""
+        try:
+            # Поиск не зависит от регистра, поэтому и ключ кэша - в нижнем регистре
+            key = ('search', query.lower())
+            with self._lock:
+                tracks = self.query_cache.get(key)
+                if tracks is not None:
+                    return tracks
+                if self.catalog is not None:
+                    tracks = self.catalog.search(query)
+                    self.query_cache.put(key, tracks)
+                    return tracks
+                tracks = [self.tracks[track_id] for track_id in self._search_index.search(query)]
+                self.query_cache.put(key, tracks)
+                return tracks
+        except Exception as e:
+            raise MusicServiceError(f"Ошибка при поиске: {str(e)}")
+
+    def get_statistics(self) -> Dict:
+        """Получение статистики сервиса"""
+        return {
+            'users_count': len(self.users),
+            'artists_count': len(self.artists),
+            'tracks_count': len(self.tracks),
+            'albums_count': len(self.albums),
+            'playlists_count': len(self.playlists),
+            'total_streams': (self.catalog.total_streams() if self.catalog is not None
+                              else self._total_streams)
         }
\ No newline at end of file
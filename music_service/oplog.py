@@ -0,0 +1,475 @@
+"""
+Модуль журнала операций (write-ahead log) для восстановления состояния после сбоя
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from models import MusicService, User, Artist, Track, Album, Playlist
+from file_operations import FileOperations, _ENTITY_KEYS
+from exceptions import InvalidFileFormatError
+from streaming import iter_json_sections, write_json_document
+
+LOG_FILE = "operations.log"
+# Журнал, отложенный на время свертки: удаляется после установки нового снимка
+OLD_LOG_FILE = "operations.log.old"
+SNAPSHOT_FILE = "snapshot.json"
+TAIL_CHUNK_SIZE = 64 * 1024
+
+
+class OperationLog:
+    """
+    Журнал изменений MusicService, дописываемый в конец файла по строке JSON
+    на операцию. Записи сбрасываются на диск группами (fsync раз в
+    group_commit_size операций или раз в group_commit_interval секунд),
+    журнал периодически сворачивается в снимок. Фоновый поток досбрасывает
+    записи, если операций долго нет.
+
+    Каждая операция получает порядковый номер seq. Свертка идет в
+    отдельном потоке и не останавливает запись: журнал откладывается в
+    operations.log.old, под блокировкой сервиса снимаются списки объектов
+    и номер последней операции (log_sequence), затем снимок пишется
+    потоково. Операции, пришедшие во время записи снимка, могут уже быть
+    в нем: для таких объектов в снимке сохраняется номер последней
+    учтенной операции (секция log_sequences). При восстановлении операции
+    с номерами не больше записанных в снимке пропускаются, поэтому сбой
+    на любом шаге свертки не приводит к повтору операций.
+    """
+
+    def __init__(self, directory: str, group_commit_size: int = 64, group_commit_interval: float = 0.05,
+                 compact_every: Optional[int] = None, background_sync: bool = True):
+        self.directory = directory
+        self.group_commit_size = group_commit_size
+        self.group_commit_interval = group_commit_interval
+        self.compact_every = compact_every
+        self._service: Optional[MusicService] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._ops_since_compaction = 0
+        self._last_sync = time.monotonic()
+        # Объект (секция, ID) -> номер его последней операции за время текущей свертки
+        self._window: Optional[Dict[Tuple[str, str], int]] = None
+        self._compaction_lock = threading.Lock()
+        self._compactor: Optional[threading.Thread] = None
+
+        os.makedirs(directory, exist_ok=True)
+        # Недописанная при сбое строка обрезается, иначе следующая запись склеится с ней
+        self._sequence = max(_snapshot_sequence(self.snapshot_path),
+                             _last_sequence(_drop_torn_tail(os.path.join(directory, OLD_LOG_FILE))),
+                             _last_sequence(_drop_torn_tail(self.log_path)))
+        self._file = open(self.log_path, 'a', encoding='utf-8')
+
+        self._closed = threading.Event()
+        self._flusher = None
+        if background_sync:
+            self._flusher = threading.Thread(target=self._flush_loop, name="oplog-sync", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.group_commit_interval):
+            with self._lock:
+                if self._pending:
+                    self._sync_locked()
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.directory, LOG_FILE)
+
+    @property
+    def old_log_path(self) -> str:
+        return os.path.join(self.directory, OLD_LOG_FILE)
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, SNAPSHOT_FILE)
+
+    def attach(self, service: MusicService):
+        """Начало журналирования изменений сервиса"""
+        self._service = service
+        service.add_listener(self)
+
+    def detach(self):
+        if self._service is not None:
+            self._service.remove_listener(self)
+            self._service = None
+
+    def close(self):
+        self.detach()
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._lock:
+            self._sync_locked()
+            self._file.close()
+
+    def __call__(self, event: str, payload: Dict):
+        record = _EVENT_RECORDS.get(event)
+        if record is not None:
+            self.append(record(payload))
+
+    def append(self, op: Dict):
+        """Запись операции с очередным номером; fsync выполняется для всей накопленной группы"""
+        with self._lock:
+            self._sequence += 1
+            op['seq'] = self._sequence
+            self._file.write(json.dumps(op, ensure_ascii=False, separators=(',', ':')) + '\n')
+            if self._window is not None:
+                for key in _op_keys(op):
+                    self._window[key] = self._sequence
+            self._pending += 1
+            self._ops_since_compaction += 1
+            if (self._pending >= self.group_commit_size
+                    or time.monotonic() - self._last_sync >= self.group_commit_interval):
+                self._sync_locked()
+            need_compaction = self.compact_every is not None and self._ops_since_compaction >= self.compact_every
+
+        if need_compaction and self._service is not None:
+            self._start_compaction()
+
+    def sync(self):
+        """Принудительный сброс накопленных записей на диск"""
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        if self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def _start_compaction(self):
+        """
+        Запуск свертки в отдельном потоке: append вызывается из обработчиков
+        событий под блокировками сервиса и объектов, а снимок берет их сам
+        """
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._ops_since_compaction = 0
+            self._compactor = threading.Thread(target=self.compact, name="oplog-compact", daemon=True)
+            self._compactor.start()
+
+    def _rotate_locked(self):
+        """Перенос журнала в operations.log.old (дописывается, если остался от прерванной свертки)"""
+        self._sync_locked()
+        self._file.close()
+        if os.path.exists(self.old_log_path):
+            with open(self.log_path, 'rb') as src, open(self.old_log_path, 'ab') as dst:
+                shutil.copyfileobj(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+            self._file = open(self.log_path, 'w', encoding='utf-8')
+        else:
+            os.replace(self.log_path, self.old_log_path)
+            self._file = open(self.log_path, 'a', encoding='utf-8')
+
+    def compact(self):
+        """
+        Свертка журнала: снимок сервиса заменяет отложенный журнал.
+        Снимок строится без блокировки журнала, операции продолжают записываться.
+        """
+        service = self._service
+        with self._compaction_lock:
+            with service._lock:
+                entities = FileOperations._entities(service)
+                statistics = service.get_statistics()
+                with self._lock:
+                    self._rotate_locked()
+                    base = self._sequence
+                    window = self._window = {}
+                    self._ops_since_compaction = 0
+
+            try:
+                applied: Dict[Tuple[str, str], int] = {}
+
+                def observe(section: str, entity):
+                    # Вызывается под блокировкой объекта: его операции после этого получат номер больше
+                    entity_id = getattr(entity, _ENTITY_KEYS[section])
+                    sequence = window.get((section, entity_id))
+                    # Для замененного объекта в снимок попадает старая версия, операции не пропускаются
+                    if sequence is not None and getattr(service, section).get(entity_id) is entity:
+                        applied[(section, entity_id)] = sequence
+
+                def log_sequences():
+                    # Начинается после записи всех объектов, когда applied заполнен
+                    for (section, entity_id), sequence in applied.items():
+                        yield {'section': section, 'id': entity_id, 'seq': sequence}
+
+                records = FileOperations._iter_records(service, entities, observe)
+                sections = FileOperations._json_sections(datetime.now().isoformat(), records, statistics)
+                sections[0][1]['log_sequence'] = base
+                sections.append(('log_sequences', log_sequences()))
+
+                tmp_path = self.snapshot_path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    write_json_document(f, sections, compact=True)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.snapshot_path)
+                os.remove(self.old_log_path)
+            finally:
+                with self._lock:
+                    self._window = None
+
+    @staticmethod
+    def recover(directory: str, service: Optional[MusicService] = None) -> MusicService:
+        """
+        Восстановление состояния: загрузка последнего снимка и повтор
+        отложенного и текущего журналов. Операции, уже учтенные в снимке,
+        пропускаются по номерам. Недописанная последняя строка (сбой во
+        время записи) обрезается.
+        """
+        service = service or MusicService()
+        snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+
+        base = 0
+        applied: Dict[Tuple[str, str], int] = {}
+        if os.path.exists(snapshot_path):
+            def metadata(record: Dict):
+                nonlocal base
+                base = record.get('log_sequence', 0)
+
+            def log_sequence(record: Dict):
+                applied[(record['section'], record['id'])] = record['seq']
+
+            FileOperations._load_from_json(service, snapshot_path,
+                                           handlers={'metadata': metadata, 'log_sequences': log_sequence})
+
+        last = base
+        for filename in (OLD_LOG_FILE, LOG_FILE):
+            for op in _read_log(os.path.join(directory, filename)):
+                sequence = op.pop('seq', None)
+                if sequence is not None:
+                    # Операция уже в снимке или повторена при переносе журнала
+                    if sequence <= last:
+                        continue
+                    last = sequence
+                    op = _unapplied(op, sequence, applied)
+                    if op is None:
+                        continue
+                _replay(service, op)
+
+        service.change_tracker.checkpoint()
+        return service
+
+
+def _drop_torn_tail(path: str) -> Optional[bytes]:
+    """
+    Обрезка журнала до последней целой строки (сбой посреди записи).
+    Возвращает последнюю целую строку или None, если их нет.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r+b') as f:
+        end = f.seek(0, os.SEEK_END)
+        tail = b''
+        start = end
+        # Читаем с конца, пока не найдутся границы последней целой строки
+        while start > 0 and tail.count(b'\n') < 2:
+            chunk_start = max(0, start - TAIL_CHUNK_SIZE)
+            f.seek(chunk_start)
+            tail = f.read(start - chunk_start) + tail
+            start = chunk_start
+
+        last_newline = tail.rfind(b'\n')
+        complete = start + last_newline + 1
+        if complete < end:
+            f.truncate(complete)
+            f.flush()
+            os.fsync(f.fileno())
+        if last_newline < 0:
+            return None
+        return tail[tail.rfind(b'\n', 0, last_newline) + 1:last_newline]
+
+
+def _last_sequence(line: Optional[bytes]) -> int:
+    if not line:
+        return 0
+    try:
+        return json.loads(line).get('seq', 0)
+    except json.JSONDecodeError:
+        return 0
+
+
+def _snapshot_sequence(path: str) -> int:
+    """Номер последней операции, учтенной в снимке (метаданные - первая секция)"""
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for section, record in iter_json_sections(f):
+            return record.get('log_sequence', 0) if section == 'metadata' else 0
+    return 0
+
+
+def _read_log(path: str) -> Iterator[Dict]:
+    if not os.path.exists(path):
+        return
+    _drop_torn_tail(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise InvalidFileFormatError(f"Поврежден журнал операций {path}, строка {line_number}: {e}")
+
+
+def _user_record(payload: Dict) -> Dict:
+    user = payload['user']
+    # Пароль в журнал не пишется, как и в экспорте данных
+    return {'op': 'user', 'user_id': user.user_id, 'username': user.username,
+            'email': user.email, 'premium': user.premium}
+
+
+def _artist_record(payload: Dict) -> Dict:
+    artist = payload['artist']
+    return {'op': 'artist', 'artist_id': artist.artist_id, 'name': artist.name, 'bio': artist.bio}
+
+
+def _track_record(payload: Dict) -> Dict:
+    track = payload['track']
+    return {'op': 'track', 'track_id': track.track_id, 'title': track.title, 'duration': track.duration,
+            'file_path': track.file_path, 'artist_id': track.artist.artist_id,
+            'stream_count': track.stream_count}
+
+
+def _album_record(payload: Dict) -> Dict:
+    album = payload['album']
+    return {'op': 'album', 'album_id': album.album_id, 'title': album.title,
+            'artist_id': album.artist.artist_id, 'release_date': album.release_date, 'genre': album.genre}
+
+
+def _playlist_record(payload: Dict) -> Dict:
+    playlist = payload['playlist']
+    return {'op': 'playlist', 'playlist_id': playlist.playlist_id, 'name': playlist.name,
+            'description': playlist.description, 'owner_id': playlist.owner.user_id,
+            'is_public': playlist.is_public,
+            'track_ids': [pt.track.track_id for pt in playlist.tracks]}
+
+
+_EVENT_RECORDS = {
+    'user_stored': _user_record,
+    'user_updated': _user_record,
+    'users_stored': lambda p: {'op': 'users', 'users': [_user_record({'user': user}) for user in p['users']]},
+    'artist_stored': _artist_record,
+    'track_stored': _track_record,
+    'tracks_stored': lambda p: {'op': 'tracks', 'tracks': [_track_record({'track': track}) for track in p['tracks']]},
+    'album_stored': _album_record,
+    'playlist_stored': _playlist_record,
+    'album_track_added': lambda p: {'op': 'album_track', 'album_id': p['album'].album_id,
+                                    'track_id': p['track'].track_id},
+    'album_tracks_added': lambda p: {'op': 'album_tracks', 'album_id': p['album'].album_id,
+                                     'track_ids': [track.track_id for track in p['tracks']]},
+    'playlist_track_added': lambda p: {'op': 'playlist_add', 'playlist_id': p['playlist'].playlist_id,
+                                       'track_id': p['track'].track_id, 'position': p['position']},
+    'playlist_tracks_added': lambda p: {'op': 'playlist_add_many', 'playlist_id': p['playlist'].playlist_id,
+                                        'track_ids': [track.track_id for track in p['tracks']]},
+    'playlist_track_removed': lambda p: {'op': 'playlist_remove', 'playlist_id': p['playlist'].playlist_id,
+                                         'track_id': p['track'].track_id},
+    'playlist_track_moved': lambda p: {'op': 'playlist_move', 'playlist_id': p['playlist'].playlist_id,
+                                       'from': p['from_position'], 'to': p['to_position']},
+    'playlist_cleared': lambda p: {'op': 'playlist_clear', 'playlist_id': p['playlist'].playlist_id},
+    'track_played': lambda p: {'op': 'play', 'track_id': p['track'].track_id, 'count': p['count']},
+}
+
+
+# Операция -> секция и поле ID объекта, который она меняет. Добавление
+# треков в альбом повторяется безопасно и по номерам не пропускается
+_OP_OBJECTS = {
+    'user': ('users', 'user_id'),
+    'artist': ('artists', 'artist_id'),
+    'track': ('tracks', 'track_id'),
+    'play': ('tracks', 'track_id'),
+    'album': ('albums', 'album_id'),
+    'playlist': ('playlists', 'playlist_id'),
+    'playlist_add': ('playlists', 'playlist_id'),
+    'playlist_add_many': ('playlists', 'playlist_id'),
+    'playlist_remove': ('playlists', 'playlist_id'),
+    'playlist_move': ('playlists', 'playlist_id'),
+    'playlist_clear': ('playlists', 'playlist_id'),
+}
+
+# Пакетные операции -> поле со списком записей
+_BATCH_OPS = {'users': 'users', 'tracks': 'tracks'}
+
+
+def _op_key(op: Dict) -> Optional[Tuple[str, str]]:
+    target = _OP_OBJECTS.get(op['op'])
+    return (target[0], op[target[1]]) if target is not None else None
+
+
+def _op_keys(op: Dict) -> List[Tuple[str, str]]:
+    field = _BATCH_OPS.get(op['op'])
+    records = op[field] if field is not None else (op,)
+    return [key for key in map(_op_key, records) if key is not None]
+
+
+def _unapplied(op: Dict, sequence: int, applied: Dict[Tuple[str, str], int]) -> Optional[Dict]:
+    """Операция без частей, уже учтенных в снимке (None, если учтена целиком)"""
+    field = _BATCH_OPS.get(op['op'])
+    if field is not None:
+        records = [record for record in op[field] if sequence > applied.get(_op_key(record), 0)]
+        return dict(op, **{field: records}) if records else None
+    key = _op_key(op)
+    if key is not None and sequence <= applied.get(key, 0):
+        return None
+    return op
+
+
+def _replay(service: MusicService, op: Dict):
+    """Применение одной операции журнала к сервису"""
+    kind = op['op']
+    if kind == 'user':
+        user = service.users.get(op['user_id'])
+        if user is not None:
+            user.premium = op['premium']
+        else:
+            service.store_user(User(op['user_id'], op['username'], op['email'], "default_password", op['premium']))
+    elif kind == 'users':
+        for record in op['users']:
+            _replay(service, record)
+    elif kind == 'artist':
+        service.store_artist(Artist(op['artist_id'], op['name'], op['bio']))
+    elif kind == 'track':
+        track = Track(op['track_id'], op['title'], op['duration'], op['file_path'], service.artists[op['artist_id']])
+        track.stream_count = op['stream_count']
+        service.store_track(track)
+    elif kind == 'tracks':
+        for record in op['tracks']:
+            _replay(service, record)
+    elif kind == 'album':
+        service.store_album(Album(op['album_id'], op['title'], service.artists[op['artist_id']],
+                                  op['release_date'], op['genre']))
+    elif kind == 'album_track':
+        service.albums[op['album_id']].add_track(service.tracks[op['track_id']])
+    elif kind == 'album_tracks':
+        service.albums[op['album_id']].add_tracks(service.tracks[track_id] for track_id in op['track_ids'])
+    elif kind == 'playlist':
+        playlist = Playlist(op['playlist_id'], op['name'], op['description'],
+                            service.users[op['owner_id']], op['is_public'])
+        playlist.add_tracks(service.tracks[track_id] for track_id in op['track_ids'])
+        service.store_playlist(playlist)
+    elif kind == 'playlist_add':
+        playlist = service.playlists[op['playlist_id']]
+        track = service.tracks[op['track_id']]
+        if 'position' in op:
+            playlist.insert_track(track, op['position'])
+        else:
+            playlist.add_track(track)
+    elif kind == 'playlist_add_many':
+        service.playlists[op['playlist_id']].add_tracks(service.tracks[track_id] for track_id in op['track_ids'])
+    elif kind == 'playlist_remove':
+        service.playlists[op['playlist_id']].remove_track(op['track_id'])
+    elif kind == 'playlist_move':
+        service.playlists[op['playlist_id']].move_track(op['from'], op['to'])
+    elif kind == 'playlist_clear':
+        service.playlists[op['playlist_id']].clear_tracks()
+    elif kind == 'play':
+        service.tracks[op['track_id']].stream_count += op['count']
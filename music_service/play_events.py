@@ -0,0 +1,159 @@
+"""
+Модуль приема событий прослушивания с шардированными счетчиками
+"""
+import threading
+import weakref
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models import MusicService
+from exceptions import TrackNotFoundError, UserNotFoundError
+
+
+class _Shard:
+    """Счетчики одного потока; блокировка почти всегда свободна"""
+    __slots__ = ('lock', 'tracks', 'users', 'owner')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tracks: Dict[str, int] = {}
+        self.users: Dict[str, int] = {}
+        # Слабая ссылка на поток-владелец: шард завершившегося потока удаляется при слиянии
+        self.owner = weakref.ref(threading.current_thread())
+
+
+class PlayRecorder:
+    """
+    Прием событий прослушивания. Каждый поток пишет в собственный шард,
+    поэтому record_play не конкурирует за общую блокировку и не печатает
+    в stdout. Шарды периодически (и при flush) сливаются в Track.stream_count
+    одним событием track_played на трек, что также группирует записи
+    журнала операций и отметки ChangeTracker. Опустевший после слияния
+    шард завершившегося потока удаляется, поэтому короткоживущие потоки
+    не накапливают шарды.
+    """
+
+    def __init__(self, service: MusicService, flush_interval: float = 0.5, background: bool = True,
+                 validate_users: bool = True):
+        self.service = service
+        self.flush_interval = flush_interval
+        self.validate_users = validate_users
+        # Прослушивания по пользователям с момента создания
+        self.user_plays: Dict[str, int] = {}
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+
+        self._closed = threading.Event()
+        self._merger = None
+        if background:
+            self._merger = threading.Thread(target=self._merge_loop, name="play-merge", daemon=True)
+            self._merger.start()
+
+    def _merge_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def _check(self, track_id: str, user_id: Optional[str]):
+        if track_id not in self.service.tracks:
+            raise TrackNotFoundError(f"Трек с ID {track_id} не найден")
+        if self.validate_users and user_id is not None and user_id not in self.service.users:
+            raise UserNotFoundError(f"Пользователь с ID {user_id} не найден")
+
+    def record_play(self, track_id: str, user_id: Optional[str] = None):
+        """Учет одного прослушивания; счетчик трека обновится при следующем слиянии"""
+        if track_id not in self.service.tracks or user_id is not None:
+            self._check(track_id, user_id)
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        with shard.lock:
+            tracks = shard.tracks
+            tracks[track_id] = tracks.get(track_id, 0) + 1
+            if user_id is not None:
+                users = shard.users
+                users[user_id] = users.get(user_id, 0) + 1
+
+    def record_plays(self, plays: Iterable[Tuple[str, Optional[str]]]):
+        """Учет пачки прослушиваний (track_id, user_id) под одной блокировкой шарда"""
+        plays = list(plays)
+        for track_id, user_id in plays:
+            self._check(track_id, user_id)
+        shard = self._shard()
+        with shard.lock:
+            tracks, users = shard.tracks, shard.users
+            for track_id, user_id in plays:
+                tracks[track_id] = tracks.get(track_id, 0) + 1
+                if user_id is not None:
+                    users[user_id] = users.get(user_id, 0) + 1
+
+    def pending_count(self) -> int:
+        """Прослушивания, еще не перенесенные в stream_count"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        total = 0
+        for shard in shards:
+            with shard.lock:
+                total += sum(shard.tracks.values())
+        return total
+
+    def flush(self) -> int:
+        """Слияние шардов в счетчики треков; возвращает число перенесенных прослушиваний"""
+        with self._merge_lock:
+            with self._shards_lock:
+                shards = list(self._shards)
+
+            tracks: Dict[str, int] = {}
+            users: Dict[str, int] = {}
+            dead: List[_Shard] = []
+            for shard in shards:
+                # Под блокировкой шарда только подменяются словари
+                with shard.lock:
+                    shard_tracks, shard.tracks = shard.tracks, {}
+                    shard_users, shard.users = shard.users, {}
+                    # Завершившийся поток больше не пишет: шард пуст навсегда
+                    owner = shard.owner()
+                    if owner is None or not owner.is_alive():
+                        dead.append(shard)
+                for track_id, count in shard_tracks.items():
+                    tracks[track_id] = tracks.get(track_id, 0) + count
+                for user_id, count in shard_users.items():
+                    users[user_id] = users.get(user_id, 0) + count
+
+            if dead:
+                dead_ids = {id(shard) for shard in dead}
+                with self._shards_lock:
+                    self._shards = [shard for shard in self._shards if id(shard) not in dead_ids]
+
+            for user_id, count in users.items():
+                self.user_plays[user_id] = self.user_plays.get(user_id, 0) + count
+
+            merged = 0
+            for track_id, count in tracks.items():
+                track = self.service.tracks.get(track_id)
+                if track is None:
+                    continue
+                # Событие под той же блокировкой, что и счетчик, как в Track.play:
+                # свертка журнала операций видит их вместе
+                with self.service.entity_lock(track_id):
+                    track.stream_count += count
+                    merged += count
+                    self.service.notify('track_played', track=track, count=count)
+            return merged
+
+    def close(self):
+        """Остановка фонового слияния и перенос оставшихся прослушиваний"""
+        self._closed.set()
+        if self._merger is not None:
+            self._merger.join()
+        self.flush()
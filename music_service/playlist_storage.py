@@ -0,0 +1,293 @@
+"""
+Модуль хранения треков плейлиста с неявными позициями
+"""
+from typing import Dict, Iterable, Iterator, List, Optional
+
+DEFAULT_LOAD = 256
+
+
+class _Chunk:
+    """Блок подряд идущих записей плейлиста"""
+    __slots__ = ('entries', 'index', 'owner')
+
+    def __init__(self, owner: 'PlaylistTrackList', entries: List):
+        self.owner = owner
+        self.entries = entries
+        self.index = 0
+
+
+class PlaylistTrackList:
+    """
+    Последовательность записей плейлиста (PlaylistTrack), разбитая на блоки
+    размером порядка load. Длины блоков хранятся в дереве Фенвика, поэтому
+    позиция записи и запись по позиции находятся за O(log n + load), а
+    вставка и удаление не перенумеровывают остальные записи. Словарь
+    track_id -> записи позволяет находить трек без просмотра плейлиста.
+
+    Записи должны иметь атрибуты track и _chunk; в _chunk хранится блок,
+    в котором запись сейчас находится (None - запись не в списке).
+    """
+
+    def __init__(self, entries: Iterable = (), load: int = DEFAULT_LOAD):
+        self._load = load
+        self._chunks: List[_Chunk] = []
+        self._tree: List[int] = []
+        self._len = 0
+        self._by_track: Dict[str, object] = {}
+        self.extend(entries)
+
+    # --- дерево Фенвика по длинам блоков ---
+
+    def _rebuild(self):
+        """Перенумерация блоков и перестроение дерева за O(число блоков)"""
+        tree = [0] * (len(self._chunks) + 1)
+        for i, chunk in enumerate(self._chunks):
+            chunk.index = i
+            tree[i + 1] += len(chunk.entries)
+            parent = (i + 1) + ((i + 1) & -(i + 1))
+            if parent <= len(self._chunks):
+                tree[parent] += tree[i + 1]
+        self._tree = tree
+
+    def _update(self, chunk_index: int, delta: int):
+        i = chunk_index + 1
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, chunk_index: int) -> int:
+        """Количество записей в блоках до chunk_index"""
+        total = 0
+        i = chunk_index
+        tree = self._tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, index: int):
+        """Блок и смещение в нем для записи с номером index (с нуля)"""
+        tree = self._tree
+        pos = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(tree) and tree[nxt] <= index:
+                index -= tree[nxt]
+                pos = nxt
+            step >>= 1
+        return self._chunks[pos], index
+
+    def _normalize(self, index: int) -> int:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("Позиция вне плейлиста")
+        return index
+
+    # --- размещение записей в блоках ---
+
+    def _place(self, index: int, entry):
+        if not self._chunks:
+            self._chunks.append(_Chunk(self, []))
+            self._rebuild()
+        if index >= self._len:
+            chunk = self._chunks[-1]
+            chunk.entries.append(entry)
+        else:
+            chunk, offset = self._locate(index)
+            chunk.entries.insert(offset, entry)
+        entry._chunk = chunk
+        self._len += 1
+        self._update(chunk.index, 1)
+
+        if len(chunk.entries) > 2 * self._load:
+            # Переполненный блок делится пополам
+            half = len(chunk.entries) // 2
+            tail = _Chunk(self, chunk.entries[half:])
+            del chunk.entries[half:]
+            for moved in tail.entries:
+                moved._chunk = tail
+            self._chunks.insert(chunk.index + 1, tail)
+            self._rebuild()
+
+    def _unplace(self, entry):
+        chunk = entry._chunk
+        chunk.entries.remove(entry)
+        entry._chunk = None
+        self._len -= 1
+        self._update(chunk.index, -1)
+
+        if len(chunk.entries) < self._load // 4 and len(self._chunks) > 1:
+            # Маленький блок сливается с соседним
+            i = chunk.index
+            if i + 1 < len(self._chunks):
+                left, right = chunk, self._chunks[i + 1]
+            else:
+                left, right = self._chunks[i - 1], chunk
+            for moved in right.entries:
+                moved._chunk = left
+            left.entries.extend(right.entries)
+            del self._chunks[right.index]
+            if len(left.entries) > 2 * self._load:
+                half = len(left.entries) // 2
+                tail = _Chunk(self, left.entries[half:])
+                del left.entries[half:]
+                for moved in tail.entries:
+                    moved._chunk = tail
+                self._chunks.insert(left.index + 1, tail)
+            self._rebuild()
+        elif not chunk.entries:
+            del self._chunks[chunk.index]
+            self._rebuild()
+
+    # Для трека с одной записью в словаре хранится сама запись, а не список
+    def _link(self, entry):
+        track_id = entry.track.track_id
+        current = self._by_track.get(track_id)
+        if current is None:
+            self._by_track[track_id] = entry
+        elif type(current) is list:
+            current.append(entry)
+        else:
+            self._by_track[track_id] = [current, entry]
+
+    def _unlink(self, entry):
+        track_id = entry.track.track_id
+        current = self._by_track[track_id]
+        if type(current) is not list:
+            del self._by_track[track_id]
+            return
+        current.remove(entry)
+        if len(current) == 1:
+            self._by_track[track_id] = current[0]
+
+    def _entries(self, track_id: str) -> List:
+        current = self._by_track.get(track_id)
+        if current is None:
+            return []
+        return current if type(current) is list else [current]
+
+    # --- публичный интерфейс ---
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator:
+        for chunk in self._chunks:
+            yield from chunk.entries
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        chunk, offset = self._locate(self._normalize(index))
+        return chunk.entries[offset]
+
+    def __contains__(self, entry) -> bool:
+        """Проверка записи, как у list: запись знает свой блок, поэтому без просмотра"""
+        chunk = getattr(entry, '_chunk', None)
+        if chunk is not None:
+            return chunk.owner is self
+        return any(current == entry for current in self)
+
+    def contains_track(self, track_id: str) -> bool:
+        """Есть ли в плейлисте трек с данным ID"""
+        return track_id in self._by_track
+
+    def index(self, entry) -> int:
+        """Номер записи (с нуля)"""
+        chunk = entry._chunk
+        if chunk is None or chunk.owner is not self:
+            raise ValueError("Запись не принадлежит плейлисту")
+        return self._prefix(chunk.index) + chunk.entries.index(entry)
+
+    def append(self, entry):
+        self._place(self._len, entry)
+        self._link(entry)
+
+    def insert(self, index: int, entry):
+        """Вставка перед записью с номером index (с нуля), как list.insert"""
+        if index < 0:
+            index = max(0, index + self._len)
+        self._place(min(index, self._len), entry)
+        self._link(entry)
+
+    def extend(self, entries: Iterable):
+        """Добавление записей в конец с одним перестроением дерева"""
+        entries = list(entries)
+        if not entries:
+            return
+        if self._chunks and len(self._chunks[-1].entries) < self._load:
+            last = self._chunks[-1]
+            room = self._load - len(last.entries)
+            head, entries = entries[:room], entries[room:]
+            last.entries.extend(head)
+            for entry in head:
+                entry._chunk = last
+                self._link(entry)
+        for start in range(0, len(entries), self._load):
+            chunk = _Chunk(self, entries[start:start + self._load])
+            for entry in chunk.entries:
+                entry._chunk = chunk
+                self._link(entry)
+            self._chunks.append(chunk)
+        self._len = sum(len(chunk.entries) for chunk in self._chunks)
+        self._rebuild()
+
+    def pop(self, index: int = -1):
+        entry = self[index]
+        self.remove(entry)
+        return entry
+
+    def remove(self, entry):
+        self.index(entry)
+        self._unplace(entry)
+        self._unlink(entry)
+
+    def remove_many(self, entries: Iterable):
+        """
+        Удаление набора записей. Если записей много, список собирается
+        заново за один проход вместо удаления по одной.
+        """
+        entries = list(entries)
+        for entry in entries:
+            self.index(entry)
+        if len(entries) * self._load < self._len:
+            for entry in entries:
+                self.remove(entry)
+            return
+        removed = {id(entry) for entry in entries}
+        kept = [entry for entry in self if id(entry) not in removed]
+        for entry in entries:
+            entry._chunk = None
+        self._chunks = []
+        self._by_track = {}
+        self._len = 0
+        self.extend(kept)
+
+    def move(self, from_index: int, to_index: int):
+        """Перемещение записи так, чтобы она оказалась под номером to_index"""
+        entry = self[from_index]
+        to_index = self._normalize(to_index)
+        self._unplace(entry)
+        self._place(to_index, entry)
+
+    def first(self, track_id: str) -> Optional:
+        """Самая ранняя по позиции запись трека или None"""
+        current = self._by_track.get(track_id)
+        if type(current) is list:
+            return min(current, key=self.index)
+        return current
+
+    def entries_for(self, track_id: str) -> List:
+        """Все записи трека в порядке позиций"""
+        return sorted(self._entries(track_id), key=self.index)
+
+    def clear(self):
+        for entry in self:
+            entry._chunk = None
+        self._chunks = []
+        self._tree = []
+        self._len = 0
+        self._by_track = {}
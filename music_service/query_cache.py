@@ -0,0 +1,171 @@
+"""
+Модуль кэша результатов запросов с точной инвалидацией по событиям сервиса
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Set
+
+NGRAM_SIZE = 3
+
+
+class _Entry:
+    __slots__ = ('value', 'stored_at')
+
+    def __init__(self, value: List, stored_at: float):
+        self.value = value
+        self.stored_at = stored_at
+
+
+class QueryCache:
+    """
+    LRU-кэш с TTL перед search_tracks и get_user_playlists.
+
+    Память ограничена числом записей (max_entries) и суммарным числом
+    объектов в результатах (max_items); при превышении вытесняется самая
+    давно использованная запись, результат больше max_items не кэшируется.
+    Запись устаревает через ttl секунд.
+
+    Кэш - подписчик событий MusicService и сбрасывает только затронутые
+    записи. Сохранение трека сбрасывает поиски, запрос которых входит в
+    его название или имя артиста; такие запросы находятся по триграммам
+    текста трека, а не перебором всех записей. Сохранение плейлиста
+    сбрасывает список плейлистов владельца. Замененные трек или плейлист
+    в событии не передаются, их сервис сбрасывает сам вызовом
+    invalidate_tracks / invalidate_playlist. Правки содержимого
+    плейлиста кэш не трогают: в нем хранятся сами объекты Playlist,
+    поэтому изменения видны без сброса.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_items: int = 1_000_000, ttl: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.max_items = max_items
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries: 'OrderedDict[Hashable, _Entry]' = OrderedDict()
+        self._items = 0
+        # Триграмма запроса -> запросы (для запросов из NGRAM_SIZE символов и длиннее)
+        self._queries_by_gram: Dict[str, Set[str]] = {}
+        self._short_queries: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --- чтение и запись ---
+
+    def get(self, key: Hashable):
+        """Копия закэшированного результата или None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if self.clock() - entry.stored_at > self.ttl:
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry.value)
+
+    def put(self, key: Hashable, value: List):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            # max_entries=0 отключает кэш
+            if not self.max_entries or len(value) > self.max_items:
+                return
+            self._entries[key] = _Entry(list(value), self.clock())
+            self._items += len(value)
+            if key[0] == 'search':
+                query = key[1]
+                if len(query) < NGRAM_SIZE:
+                    self._short_queries.add(query)
+                else:
+                    self._queries_by_gram.setdefault(query[:NGRAM_SIZE], set()).add(query)
+            while len(self._entries) > self.max_entries or self._items > self.max_items:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._items = 0
+            self._queries_by_gram.clear()
+            self._short_queries.clear()
+
+    def _drop(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._items -= len(entry.value)
+        if key[0] == 'search':
+            query = key[1]
+            if len(query) < NGRAM_SIZE:
+                self._short_queries.discard(query)
+            else:
+                queries = self._queries_by_gram[query[:NGRAM_SIZE]]
+                queries.discard(query)
+                if not queries:
+                    del self._queries_by_gram[query[:NGRAM_SIZE]]
+
+    def _invalidate(self, key: Hashable):
+        if key in self._entries:
+            self._drop(key)
+            self.invalidations += 1
+
+    # --- события сервиса ---
+
+    def __call__(self, event: str, payload: Dict):
+        if event == 'track_stored':
+            self.invalidate_tracks((payload['track'],))
+        elif event == 'tracks_stored':
+            self.invalidate_tracks(payload['tracks'])
+        elif event == 'playlist_stored':
+            self.invalidate_playlist(payload['playlist'])
+
+    def invalidate_tracks(self, tracks):
+        """Сброс поисков, результат которых может измениться из-за сохранения треков"""
+        with self._lock:
+            if not self._entries:
+                return
+            by_gram = self._queries_by_gram
+            short = self._short_queries
+            if not by_gram and not short:
+                return
+            for track in tracks:
+                for text in (track.title.lower(), track.artist.name.lower()):
+                    # Запрос входит в текст - значит, его первая триграмма тоже
+                    for i in range(len(text) - NGRAM_SIZE + 1):
+                        queries = by_gram.get(text[i:i + NGRAM_SIZE])
+                        if queries:
+                            for query in [q for q in queries if q in text]:
+                                self._invalidate(('search', query))
+                    for query in [q for q in short if q in text]:
+                        self._invalidate(('search', query))
+
+    def invalidate_playlist(self, playlist):
+        with self._lock:
+            self._invalidate(('playlists', playlist.owner.user_id))
+
+    def stats(self) -> Dict:
+        """Счетчики для подбора размера кэша"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'items': self._items,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
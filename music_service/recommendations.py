@@ -0,0 +1,221 @@
+"""
+Модуль рекомендаций по совместной встречаемости треков в плейлистах
+"""
+import heapq
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models import MusicService, Track
+from exceptions import PlaylistNotFoundError, TrackNotFoundError
+
+
+class RecommendationEngine:
+    """
+    Рекомендации "похожие треки" и "продолжить плейлист" по матрице
+    совместной встречаемости: c(a, b) - число плейлистов, где есть оба
+    трека. Похожесть нормируется по популярности:
+    c(a, b) / sqrt(n(a) * n(b)), где n - число плейлистов с треком.
+
+    Матрица хранится разреженно и строками по требованию: для каждого
+    трека известны его плейлисты, а строка c(a, *) собирается при первом
+    запросе и держится в LRU-кэше. Размер кэша ограничен суммарным числом
+    элементов строк (max_row_entries), а не числом строк: строка
+    популярного трека может содержать почти весь каталог. События
+    изменения плейлистов обновляют состав плейлистов и закэшированные
+    строки на величину изменения, поэтому матрица целиком не
+    перестраивается, а память не растет квадратично от длины плейлистов.
+    """
+
+    def __init__(self, max_row_entries: int = 1_000_000):
+        self.max_row_entries = max_row_entries
+        self._service: Optional[MusicService] = None
+        # playlist_id -> {track_id: сколько раз трек встречается в плейлисте}
+        self._playlists: Dict[str, Dict[str, int]] = {}
+        # track_id -> плейлисты с треком (словарь как упорядоченное множество)
+        self._membership: Dict[str, Dict[str, None]] = {}
+        self._rows: 'OrderedDict[str, Dict[str, int]]' = OrderedDict()
+        self._row_entries = 0
+        self._lock = threading.Lock()
+
+    def attach(self, service: MusicService):
+        """
+        Подключение к сервису: один проход по плейлистам, затем обновление
+        по событиям. Подписка и список плейлистов берутся под блокировкой
+        сервиса, поэтому новый плейлист либо попадет в проход, либо придет
+        событием. Треки плейлиста читаются под его блокировкой: события
+        плейлиста отправляются под ней же и не дублируют прочитанное.
+        """
+        with self._lock:
+            self._playlists = {}
+            self._membership = {}
+            self._rows.clear()
+            self._row_entries = 0
+        with service._lock:
+            self._service = service
+            service.add_listener(self)
+            playlists = list(service.playlists.values())
+
+        for playlist in playlists:
+            with service.entity_lock(playlist.playlist_id), self._lock:
+                # Замененный плейлист уже учтен событием playlist_stored
+                if service.playlists.get(playlist.playlist_id) is playlist:
+                    self._replace(playlist.playlist_id, (pt.track.track_id for pt in playlist.tracks))
+
+    def detach(self):
+        if self._service is not None:
+            self._service.remove_listener(self)
+            self._service = None
+
+    def __call__(self, event: str, payload: Dict):
+        if not event.startswith('playlist_'):
+            return
+        playlist_id = payload['playlist'].playlist_id
+        with self._lock:
+            if event == 'playlist_stored':
+                self._replace(playlist_id, (pt.track.track_id for pt in payload['playlist'].tracks))
+            elif event == 'playlist_track_added':
+                self._add(playlist_id, payload['track'].track_id)
+            elif event == 'playlist_tracks_added':
+                for track in payload['tracks']:
+                    self._add(playlist_id, track.track_id)
+            elif event == 'playlist_track_removed':
+                self._remove(playlist_id, payload['track'].track_id)
+            elif event == 'playlist_cleared':
+                self._replace(playlist_id, ())
+
+    # --- обновление матрицы ---
+
+    def _replace(self, playlist_id: str, track_ids: Iterable[str]):
+        counts = self._playlists.get(playlist_id)
+        if counts:
+            for track_id in list(counts):
+                counts[track_id] = 1
+                self._remove(playlist_id, track_id)
+        for track_id in track_ids:
+            self._add(playlist_id, track_id)
+
+    def _add(self, playlist_id: str, track_id: str):
+        counts = self._playlists.setdefault(playlist_id, {})
+        present = counts.get(track_id, 0)
+        counts[track_id] = present + 1
+        # Повтор трека в плейлисте не меняет совместную встречаемость
+        if present:
+            return
+        self._membership.setdefault(track_id, {})[playlist_id] = None
+        self._shift_rows(track_id, counts, 1)
+
+    def _remove(self, playlist_id: str, track_id: str):
+        counts = self._playlists.get(playlist_id)
+        if not counts or track_id not in counts:
+            return
+        counts[track_id] -= 1
+        if counts[track_id]:
+            return
+        del counts[track_id]
+        playlists = self._membership[track_id]
+        del playlists[playlist_id]
+        if not playlists:
+            del self._membership[track_id]
+        self._shift_rows(track_id, counts, -1)
+
+    def _shift_rows(self, track_id: str, others: Dict[str, int], delta: int):
+        """Изменение c(track, other) на delta в закэшированных строках обоих треков"""
+        rows = self._rows
+        if not rows:
+            return
+        row = rows.get(track_id)
+        for other in others:
+            if other == track_id:
+                continue
+            if row is not None:
+                self._bump(row, other, delta)
+            other_row = rows.get(other)
+            if other_row is not None:
+                self._bump(other_row, track_id, delta)
+        self._trim()
+
+    def _bump(self, row: Dict[str, int], key: str, delta: int):
+        present = row.get(key, 0)
+        value = present + delta
+        if value:
+            row[key] = value
+            if not present:
+                self._row_entries += 1
+        else:
+            del row[key]
+            self._row_entries -= 1
+
+    def _trim(self):
+        """Вытеснение давно использованных строк, пока элементов больше max_row_entries"""
+        rows = self._rows
+        while self._row_entries > self.max_row_entries and rows:
+            self._row_entries -= len(rows.popitem(last=False)[1])
+
+    def _row(self, track_id: str) -> Dict[str, int]:
+        """Строка c(track, *) из кэша или одним проходом по плейлистам трека"""
+        rows = self._rows
+        row = rows.get(track_id)
+        if row is not None:
+            rows.move_to_end(track_id)
+            return row
+        row = {}
+        get = row.get
+        playlists = self._playlists
+        for playlist_id in self._membership.get(track_id, ()):
+            for other in playlists[playlist_id]:
+                row[other] = get(other, 0) + 1
+        row.pop(track_id, None)
+        # Строка больше всего кэша не кэшируется
+        if len(row) <= self.max_row_entries:
+            rows[track_id] = row
+            self._row_entries += len(row)
+            self._trim()
+        return row
+
+    # --- запросы ---
+
+    def cooccurrence(self, track_id: str, other_id: str) -> int:
+        """Число плейлистов, в которых есть оба трека"""
+        with self._lock:
+            return self._row(track_id).get(other_id, 0)
+
+    def _accumulate(self, scores: Dict[str, float], track_id: str, exclude: Dict[str, int]):
+        membership = self._membership
+        norm = math.sqrt(len(membership.get(track_id, ())))
+        if not norm:
+            return
+        get = scores.get
+        for other, count in self._row(track_id).items():
+            if other not in exclude:
+                scores[other] = get(other, 0.0) + count / (norm * math.sqrt(len(membership[other])))
+
+    def _top(self, scores: Dict[str, float], k: int) -> List[Tuple[Track, float]]:
+        tracks = self._service.tracks
+        # При равном счете - по track_id, чтобы выдача была детерминированной
+        best = heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(tracks[track_id], score) for track_id, score in best if track_id in tracks]
+
+    def similar_tracks(self, track_id: str, k: int = 10) -> List[Tuple[Track, float]]:
+        """k треков, чаще всего встречающихся в плейлистах вместе с данным: пары (трек, счет)"""
+        if track_id not in self._service.tracks:
+            raise TrackNotFoundError(f"Трек {track_id} не найден")
+        with self._lock:
+            scores: Dict[str, float] = {}
+            self._accumulate(scores, track_id, {track_id: 1})
+            return self._top(scores, k)
+
+    def continue_playlist(self, playlist_id: str, k: int = 10) -> List[Tuple[Track, float]]:
+        """
+        k треков для продолжения плейлиста: сумма похожести на все его
+        треки, уже добавленные в плейлист треки исключаются
+        """
+        if playlist_id not in self._service.playlists:
+            raise PlaylistNotFoundError(f"Плейлист {playlist_id} не найден")
+        with self._lock:
+            seeds = self._playlists.get(playlist_id, {})
+            scores: Dict[str, float] = {}
+            for track_id in seeds:
+                self._accumulate(scores, track_id, seeds)
+            return self._top(scores, k)
@@ -0,0 +1,174 @@
+"""
+Модуль с инвертированным триграммным индексом для поиска треков
+"""
+from typing import Dict, Iterable, List, Set
+
+NGRAM_SIZE = 3
+
+
+def _ngrams(text: str) -> Set[str]:
+    """Множество триграмм строки (строка уже приведена к нижнему регистру)"""
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+class TrackSearchIndex:
+    """
+    Инвертированный индекс по триграммам названий треков и имен артистов.
+
+    Индекс возвращает те же результаты, что и поиск подстроки без учета
+    регистра, и в том же порядке (порядок добавления треков). Кандидаты
+    берутся из пересечения списков триграмм запроса и затем проверяются
+    на точное вхождение подстроки.
+
+    Треки, добавленные пакетом (add_many), сразу учитываются во всех
+    словарях, кроме списков триграмм названий: эти списки достраиваются
+    одним проходом перед ближайшим поиском.
+    """
+
+    def __init__(self):
+        self._title_postings: Dict[str, Set[str]] = {}
+        self._artist_postings: Dict[str, Set[str]] = {}
+        self._artist_tracks: Dict[str, Set[str]] = {}
+        self._titles: Dict[str, str] = {}
+        self._artist_names: Dict[str, str] = {}
+        self._track_artist: Dict[str, str] = {}
+        self._order: Dict[str, int] = {}
+        self._next_order = 0
+        # Треки пакетных добавлений, названия которых еще не разбиты на триграммы
+        self._pending: Dict[str, None] = {}
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def __contains__(self, track_id: str) -> bool:
+        return track_id in self._titles
+
+    def add(self, track):
+        """Добавление (или переиндексация) трека"""
+        track_id = track.track_id
+        title = self._register(track, self._take_order(track_id))
+        for gram in _ngrams(title):
+            self._title_postings.setdefault(gram, set()).add(track_id)
+
+    def _take_order(self, track_id: str) -> int:
+        order = self._order.get(track_id)
+        if order is not None:
+            # Повторное добавление сохраняет исходную позицию, как и ключ в dict
+            self.remove(track_id)
+            return order
+        order = self._next_order
+        self._next_order += 1
+        return order
+
+    def _register(self, track, order: int) -> str:
+        """Учет трека во всех словарях, кроме списков триграмм названий"""
+        track_id = track.track_id
+        title = track.title.lower()
+        self._titles[track_id] = title
+        self._order[track_id] = order
+
+        artist_id = track.artist.artist_id
+        self._track_artist[track_id] = artist_id
+        if artist_id not in self._artist_tracks:
+            artist_name = track.artist.name.lower()
+            self._artist_names[artist_id] = artist_name
+            self._artist_tracks[artist_id] = set()
+            for gram in _ngrams(artist_name):
+                self._artist_postings.setdefault(gram, set()).add(artist_id)
+        self._artist_tracks[artist_id].add(track_id)
+        return title
+
+    def add_many(self, tracks: Iterable):
+        """Пакетное добавление; триграммы названий строятся при следующем поиске"""
+        pending = self._pending
+        for track in tracks:
+            self._register(track, self._take_order(track.track_id))
+            pending[track.track_id] = None
+
+    def _build_pending(self):
+        postings = self._title_postings
+        get = postings.get
+        titles = self._titles
+        for track_id in self._pending:
+            title = titles[track_id]
+            for gram in {title[i:i + NGRAM_SIZE] for i in range(len(title) - NGRAM_SIZE + 1)}:
+                ids = get(gram)
+                if ids is None:
+                    postings[gram] = {track_id}
+                else:
+                    ids.add(track_id)
+        self._pending = {}
+
+    def remove(self, track_id: str):
+        """Удаление трека из индекса"""
+        title = self._titles.pop(track_id, None)
+        if title is None:
+            return
+        del self._order[track_id]
+        if track_id in self._pending:
+            # Триграммы названия еще не построены
+            del self._pending[track_id]
+        else:
+            for gram in _ngrams(title):
+                postings = self._title_postings.get(gram)
+                if postings is not None:
+                    postings.discard(track_id)
+                    if not postings:
+                        del self._title_postings[gram]
+
+        artist_id = self._track_artist.pop(track_id)
+        artist_tracks = self._artist_tracks[artist_id]
+        artist_tracks.discard(track_id)
+        if not artist_tracks:
+            del self._artist_tracks[artist_id]
+            artist_name = self._artist_names.pop(artist_id)
+            for gram in _ngrams(artist_name):
+                postings = self._artist_postings.get(gram)
+                if postings is not None:
+                    postings.discard(artist_id)
+                    if not postings:
+                        del self._artist_postings[gram]
+
+    def clear(self):
+        self.__init__()
+
+    @staticmethod
+    def _intersect(postings: Dict[str, Set[str]], grams: Set[str]) -> Set[str]:
+        lists = []
+        for gram in grams:
+            ids = postings.get(gram)
+            if not ids:
+                return set()
+            lists.append(ids)
+        lists.sort(key=len)
+        result = set(lists[0])
+        for ids in lists[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def search(self, query: str) -> List[str]:
+        """
+        Поиск ID треков, в названии или имени артиста которых встречается query.
+        Для запросов короче триграммы выполняется полный просмотр индекса.
+        """
+        query_lower = query.lower()
+        if self._pending:
+            self._build_pending()
+
+        if len(query_lower) < NGRAM_SIZE:
+            matched = [track_id for track_id, title in self._titles.items()
+                       if query_lower in title
+                       or query_lower in self._artist_names[self._track_artist[track_id]]]
+            matched.sort(key=self._order.__getitem__)
+            return matched
+
+        grams = _ngrams(query_lower)
+        matched = {track_id for track_id in self._intersect(self._title_postings, grams)
+                   if query_lower in self._titles[track_id]}
+        for artist_id in self._intersect(self._artist_postings, grams):
+            if query_lower in self._artist_names[artist_id]:
+                matched |= self._artist_tracks[artist_id]
+
+        return sorted(matched, key=self._order.__getitem__)
@@ -0,0 +1,100 @@
+"""
+Модуль сессий пользователей и блокировок для одновременной работы с сервисом
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Optional
+
+
+class Session:
+    """Сессия вошедшего пользователя, идентифицируемая токеном"""
+    __slots__ = ('token', 'user', 'created_at', 'last_access')
+
+    def __init__(self, token: str, user, now: float):
+        self.token = token
+        self.user = user
+        self.created_at = now
+        self.last_access = now
+
+    def __str__(self):
+        return f"Session({self.user.username})"
+
+
+class SessionStore:
+    """
+    Хранилище сессий: словарь в порядке последнего обращения (OrderedDict).
+    Поиск, создание и продление - O(1). Сессия истекает через ttl секунд
+    без обращений; при превышении max_sessions вытесняется самая давно
+    использованная. Так как порядок совпадает с временем обращения,
+    истекшие сессии всегда находятся в начале и удаляются по одной.
+    """
+
+    def __init__(self, ttl: float = 3600.0, max_sessions: int = 100_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.clock = clock
+        self._sessions: 'OrderedDict[str, Session]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(self, user) -> Session:
+        now = self.clock()
+        session = Session(secrets.token_urlsafe(24), user, now)
+        with self._lock:
+            self._purge(now)
+            self._sessions[session.token] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, token: str) -> Optional[Session]:
+        """Действующая сессия по токену (с продлением) или None"""
+        now = self.clock()
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            if now - session.last_access > self.ttl:
+                del self._sessions[token]
+                return None
+            session.last_access = now
+            self._sessions.move_to_end(token)
+            return session
+
+    def remove(self, token: str):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._purge(self.clock())
+
+    def _purge(self, now: float) -> int:
+        removed = 0
+        sessions = self._sessions
+        while sessions:
+            token, session = next(iter(sessions.items()))
+            if now - session.last_access <= self.ttl:
+                break
+            del sessions[token]
+            removed += 1
+        return removed
+
+
+class StripedLocks:
+    """
+    Блокировки объектов по ключу: ключ отображается на одну из stripes
+    блокировок, поэтому память не растет с числом объектов, а операции
+    над разными объектами почти никогда не ждут друг друга.
+    """
+
+    def __init__(self, stripes: int = 256):
+        self._locks: List[threading.RLock] = [threading.RLock() for _ in range(stripes)]
+
+    def __call__(self, key: Hashable) -> threading.RLock:
+        return self._locks[hash(key) % len(self._locks)]
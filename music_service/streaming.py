@@ -0,0 +1,293 @@
+"""
+Модуль потокового чтения и записи данных без построения всего документа в памяти
+"""
+import contextvars
+import json
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+from exceptions import OperationCancelledError
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+# Наибольшая длина одной записи при чтении (в символах): дальше документ считается поврежденным
+MAX_RECORD_SIZE = 64 * 1024 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+# Событие отмены текущей операции записи (см. cancellation_scope)
+_cancel_event: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar(
+    'streaming_cancel_event', default=None)
+
+
+@contextmanager
+def cancellation_scope(event: threading.Event):
+    """
+    Область, в которой потоковая запись проверяет event перед сбросом
+    каждой порции и прерывается OperationCancelledError, если он установлен
+    """
+    token = _cancel_event.set(event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
+
+class _JsonStreamReader:
+    """Инкрементальный разбор JSON-документа поверх буфера фиксированного размера"""
+
+    def __init__(self, f: IO[str], chunk_size: int = DEFAULT_CHUNK_SIZE, max_record_size: int = MAX_RECORD_SIZE):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._max_record_size = max_record_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, size: int) -> bool:
+        """Дочитывает size символов в буфер, отбрасывая уже разобранную часть"""
+        if self._eof:
+            return False
+        chunk = self._file.read(size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _error(self, message: str):
+        raise json.JSONDecodeError(message, self._buffer, self._pos)
+
+    def _peek(self) -> str:
+        """Первый непробельный символ (пустая строка в конце файла)"""
+        while True:
+            buffer = self._buffer
+            pos = self._pos
+            length = len(buffer)
+            while pos < length and buffer[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < length:
+                return buffer[pos]
+            if not self._fill(self._chunk_size):
+                return ''
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            self._error(f"Expecting '{char}'")
+        self._pos += 1
+
+    def _value(self) -> Any:
+        """
+        Разбор одного значения; буфер растет, пока значение не поместится
+        целиком, но не больше max_record_size символов
+        """
+        self._peek()
+        size = self._chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # Поврежденная запись иначе дочитывалась бы до конца файла
+                if len(self._buffer) - self._pos >= self._max_record_size:
+                    self._error(f"Запись длиннее {self._max_record_size} символов или повреждена")
+                if not self._fill(size):
+                    raise
+                # Удваиваем порцию, чтобы большие записи не разбирались квадратично
+                size = min(size * 2, self._max_record_size)
+                continue
+            # Число или литерал в конце буфера могут быть обрезаны
+            if end == len(self._buffer) and self._buffer[self._pos] not in '{["':
+                if self._fill(size):
+                    continue
+            self._pos = end
+            return value
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+
+        while True:
+            key = self._value()
+            if not isinstance(key, str):
+                self._error("Expecting property name enclosed in double quotes")
+            self._expect(':')
+
+            if self._peek() == '[':
+                self._pos += 1
+                if self._peek() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        yield key, self._value()
+                        char = self._peek()
+                        self._pos += 1
+                        if char == ']':
+                            break
+                        if char != ',':
+                            self._pos -= 1
+                            self._error("Expecting ',' delimiter")
+            else:
+                yield key, self._value()
+
+            char = self._peek()
+            self._pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                self._pos -= 1
+                self._error("Expecting ',' delimiter")
+
+
+def iter_json_sections(f: IO[str], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       max_record_size: int = MAX_RECORD_SIZE) -> Iterator[Tuple[str, Any]]:
+    """
+    Потоковый обход JSON-объекта верхнего уровня.
+    Для массивов возвращает пары (ключ, элемент) по одному элементу,
+    для остальных значений - пару (ключ, значение). Запись длиннее
+    max_record_size символов считается ошибкой формата.
+    """
+    return _JsonStreamReader(f, chunk_size, max_record_size).items()
+
+
+class _ChunkedWriter:
+    """Накопление мелких фрагментов и запись в файл порциями"""
+
+    def __init__(self, f: IO[str], chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._parts: List[str] = []
+        self._size = 0
+        self._cancel = _cancel_event.get()
+
+    def write(self, text: str):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._cancel is not None and self._cancel.is_set():
+            raise OperationCancelledError("Запись прервана")
+        if self._parts:
+            self._file.write(''.join(self._parts))
+            self._parts = []
+            self._size = 0
+
+
+_JSON_SCALARS = (str, int, float, bool, type(None))
+
+
+def _is_stream(value: Any) -> bool:
+    """Значение записывается как массив поэлементно"""
+    return not isinstance(value, (dict, str, bytes, int, float, bool, type(None)))
+
+
+def write_json_document(f: IO[str], sections: Iterable[Tuple[str, Any]], compact: bool = False,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Потоковая запись JSON-объекта верхнего уровня.
+    Значения-итераторы (и списки) записываются поэлементно, поэтому весь
+    документ в памяти не собирается. Без compact результат совпадает с
+    json.dump(..., indent=2, ensure_ascii=False), в режиме compact
+    пишется без отступов и пробелов.
+    """
+    writer = _ChunkedWriter(f, chunk_size)
+    if compact:
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        newline, indent, item_indent, colon = '', '', '', ':'
+    else:
+        encoder = json.JSONEncoder(ensure_ascii=False, indent=2)
+        newline, indent, item_indent, colon = '\n', '  ', '    ', ': '
+        # Плоские записи кодируются C-кодировщиком: отступы задаются разделителями
+        flat_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',\n      ', ': '))
+
+    def nested(value: Any, prefix: str) -> str:
+        if not newline:
+            return encoder.encode(value)
+        if (prefix == item_indent and type(value) is dict and value
+                and all(type(v) in _JSON_SCALARS for v in value.values())):
+            return '{\n      ' + flat_encoder.encode(value)[1:-1] + '\n    }'
+        return encoder.encode(value).replace('\n', '\n' + prefix)
+
+    writer.write('{')
+    first_section = True
+    for key, value in sections:
+        writer.write(('' if first_section else ',') + newline + indent + encoder.encode(key) + colon)
+        first_section = False
+
+        if not _is_stream(value):
+            writer.write(nested(value, indent))
+            continue
+
+        writer.write('[')
+        first_item = True
+        for item in value:
+            writer.write(('' if first_item else ',') + newline + item_indent + nested(item, item_indent))
+            first_item = False
+        writer.write(']' if first_item else newline + indent + ']')
+
+    writer.write('}' if first_section else newline + '}')
+    writer.flush()
+
+
+def _xml_escape(text: str) -> str:
+    # То же экранирование, что и у ElementTree для текста элементов
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    return text
+
+
+def _xml_fields(fields: Dict[str, Any], nested: Dict[str, Tuple[str, str]]) -> str:
+    parts = []
+    for key, value in fields.items():
+        if key in nested:
+            list_tag, item_tag = nested[key]
+            items = ''.join(f'<{item_tag}>{_xml_fields(item, nested)}</{item_tag}>'
+                            if item else f'<{item_tag} />' for item in value)
+            parts.append(f'<{list_tag}>{items}</{list_tag}>' if items else f'<{list_tag} />')
+        else:
+            text = _xml_escape(str(value))
+            parts.append(f'<{key}>{text}</{key}>' if text else f'<{key} />')
+    return ''.join(parts)
+
+
+def write_xml_document(f: IO[str], root_tag: str, sections: Iterable[Tuple[str, Optional[str], Any]],
+                       nested: Optional[Dict[str, Tuple[str, str]]] = None,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Потоковая запись XML-документа в том же виде, что и ElementTree.write
+    с xml_declaration=True. Секция задается кортежем (тег, тег_элемента, данные):
+    при теге элемента None данные - словарь полей секции, иначе - итератор
+    словарей, каждый из которых записывается отдельным элементом.
+    nested задает вложенные списки полей: ключ -> (тег_списка, тег_элемента).
+    """
+    nested = nested or {}
+    writer = _ChunkedWriter(f, chunk_size)
+    writer.write(f"<?xml version='1.0' encoding='utf-8'?>\n<{root_tag}>")
+
+    for section_tag, item_tag, data in sections:
+        if item_tag is None:
+            fields = _xml_fields(data, nested)
+            writer.write(f'<{section_tag}>{fields}</{section_tag}>' if fields else f'<{section_tag} />')
+            continue
+
+        opened = False
+        for record in data:
+            if not opened:
+                writer.write(f'<{section_tag}>')
+                opened = True
+            fields = _xml_fields(record, nested)
+            writer.write(f'<{item_tag}>{fields}</{item_tag}>' if fields else f'<{item_tag} />')
+        writer.write(f'</{section_tag}>' if opened else f'<{section_tag} />')
+
+    writer.write(f'</{root_tag}>')
+    writer.flush()
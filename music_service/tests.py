@@ -1,152 +1,1845 @@
-"""
-Модуль с юнит-тестами для музыкального сервиса с тестированием загрузки данных
-"""
-import unittest
-import os
-import json
-import tempfile
-import shutil
-
-from models import MusicService
-from file_operations import FileOperations
-from exceptions import *
-
-class TestDataLoading(unittest.TestCase):
-    """Тесты загрузки данных из файлов"""
-
-    def setUp(self):
-        """Настройка перед каждым тестом"""
-        self.service = MusicService()
-        self.test_data_dir = tempfile.mkdtemp()
-
-        # Создаем тестовые JSON и XML файлы
-        self.create_test_json()
-        self.create_test_xml()
-
-    def tearDown(self):
-        """Очистка после каждого теста"""
-        shutil.rmtree(self.test_data_dir)
-
-    def create_test_json(self):
-        """Создание тестового JSON файла"""
-        test_data = {
-            "users": [
-                {
-                    "user_id": "test_user_1",
-                    "username": "test_user",
-                    "email": "test@example.com",
-                    "premium": True,
-                    "created_at": "2024-01-01T00:00:00"
-                }
-            ],
-            "artists": [
-                {
-                    "artist_id": "test_artist_1",
-                    "name": "Test Artist",
-                    "bio": "Test bio"
-                }
-            ],
-            "tracks": [
-                {
-                    "track_id": "test_track_1",
-                    "title": "Test Track",
-                    "duration": 180,
-                    "artist": "Test Artist",
-                    "file_path": "/music/test.mp3"
-                }
-            ],
-            "albums": [
-                {
-                    "album_id": "test_album_1",
-                    "title": "Test Album",
-                    "artist": "Test Artist",
-                    "release_date": "2024-01-01",
-                    "genre": "Test"
-                }
-            ],
-            "playlists": [
-                {
-                    "playlist_id": "test_playlist_1",
-                    "name": "Test Playlist",
-                    "description": "Test description",
-                    "owner": "test_user",
-                    "is_public": True,
-                    "created_date": "2024-01-01T00:00:00",
-                    "tracks": [
-                        {
-                            "track_id": "test_track_1",
-                            "title": "Test Track",
-                            "artist": "Test Artist",
-                            "position": 1
-                        }
-                    ]
-                }
-            ]
-        }
-
-        json_file = os.path.join(self.test_data_dir, "test_data.json")
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(test_data, f, indent=2)
-
-        self.json_file = json_file
-
-    def create_test_xml(self):
-        """Создание тестового XML файла"""
-        xml_content = '''<?xml version='1.0' encoding='utf-8'?>
-<MusicService>
-  <Users>
-    <User>
-      <user_id>xml_user_1</user_id>
-      <username>xml_user</username>
-      <email>xml@example.com</email>
-      <premium>false</premium>
-      <created_at>2024-01-01T00:00:00</created_at>
-    </User>
-  </Users>
-  <Artists>
-    <Artist>
-      <artist_id>xml_artist_1</artist_id>
-      <name>XML Artist</name>
-      <bio>XML bio</bio>
-    </Artist>
-  </Artists>
-</MusicService>'''
-
-        xml_file = os.path.join(self.test_data_dir, "test_data.xml")
-        with open(xml_file, 'w', encoding='utf-8') as f:
-            f.write(xml_content)
-
-        self.xml_file = xml_file
-
-    def test_load_from_json(self):
-        """Тест загрузки данных из JSON"""
-        loaded, errors = FileOperations.load_initial_data(self.service, self.json_file, None)
-
-        self.assertGreater(loaded, 0)
-        self.assertEqual(errors, 0)
-        self.assertIn("test_user_1", self.service.users)
-        self.assertIn("test_artist_1", self.service.artists)
-        self.assertIn("test_track_1", self.service.tracks)
-        self.assertIn("test_playlist_1", self.service.playlists)
-
-    def test_load_from_xml(self):
-        """Тест загрузки данных из XML"""
-        loaded, errors = FileOperations.load_initial_data(self.service, None, self.xml_file)
-
-        self.assertGreater(loaded, 0)
-        self.assertEqual(errors, 0)
-        self.assertIn("xml_user_1", self.service.users)
-        self.assertIn("xml_artist_1", self.service.artists)
-
-    def test_load_from_both(self):
-        """Тест загрузки данных из обоих файлов"""
-        loaded, errors = FileOperations.load_initial_data(self.service, self.json_file, self.xml_file)
-
-        self.assertGreater(loaded, 0)
-        # Должны быть загружены данные из обоих файлов
-        self.assertIn("test_user_1", self.service.users)
-        self.assertIn("xml_user_1", self.service.users)
-
-    def test_load_nonexistent_file(self):
-        """Тест загрузки из несуществующего файла"""
-        loaded, errors =
\ No newline at end of file
+"""
+Модуль с юнит-тестами для музыкального сервиса с тестированием загрузки данных
+"""
+import unittest
+import logging
+import asyncio
+import io
+import contextlib
+import math
+import os
+import json
+import random
+import tempfile
+import threading
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import xml.etree.ElementTree as ET
+
+from datetime import datetime
+
+from models import MusicService, Playlist, PlaylistTrack, User, Artist, Track, Album
+from file_operations import FileOperations
+from mmap_catalog import MappedCatalog
+from oplog import OperationLog
+from playlist_storage import PlaylistTrackList
+from play_events import PlayRecorder
+from charts import ChartsEngine
+from recommendations import RecommendationEngine
+from query_cache import QueryCache
+from sessions import SessionStore
+from async_service import AsyncMusicService
+from event_log import configure_logging, get_logger, shutdown_logging
+from streaming import cancellation_scope, iter_json_sections, write_json_document, write_xml_document
+from datagen import SyntheticCatalog
+from instrumentation import instrumentation
+from exceptions import *
+
+class TestDataLoading(unittest.TestCase):
+    """Тесты загрузки данных из файлов"""
+
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.service = MusicService()
+        self.test_data_dir = tempfile.mkdtemp()
+
+        # Создаем тестовые JSON и XML файлы
+        self.create_test_json()
+        self.create_test_xml()
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        shutil.rmtree(self.test_data_dir)
+
+    def create_test_json(self):
+        """Создание тестового JSON файла"""
+        test_data = {
+            "users": [
+                {
+                    "user_id": "test_user_1",
+                    "username": "test_user",
+                    "email": "test@example.com",
+                    "premium": True,
+                    "created_at": "2024-01-01T00:00:00"
+                }
+            ],
+            "artists": [
+                {
+                    "artist_id": "test_artist_1",
+                    "name": "Test Artist",
+                    "bio": "Test bio"
+                }
+            ],
+            "tracks": [
+                {
+                    "track_id": "test_track_1",
+                    "title": "Test Track",
+                    "duration": 180,
+                    "artist": "Test Artist",
+                    "file_path": "/music/test.mp3"
+                }
+            ],
+            "albums": [
+                {
+                    "album_id": "test_album_1",
+                    "title": "Test Album",
+                    "artist": "Test Artist",
+                    "release_date": "2024-01-01",
+                    "genre": "Test"
+                }
+            ],
+            "playlists": [
+                {
+                    "playlist_id": "test_playlist_1",
+                    "name": "Test Playlist",
+                    "description": "Test description",
+                    "owner": "test_user",
+                    "is_public": True,
+                    "created_date": "2024-01-01T00:00:00",
+                    "tracks": [
+                        {
+                            "track_id": "test_track_1",
+                            "title": "Test Track",
+                            "artist": "Test Artist",
+                            "position": 1
+                        }
+                    ]
+                }
+            ]
+        }
+
+        json_file = os.path.join(self.test_data_dir, "test_data.json")
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(test_data, f, indent=2)
+
+        self.json_file = json_file
+
+    def create_test_xml(self):
+        """Создание тестового XML файла"""
+        xml_content = '''<?xml version='1.0' encoding='utf-8'?>
+<MusicService>
+  <Users>
+    <User>
+      <user_id>xml_user_1</user_id>
+      <username>xml_user</username>
+      <email>xml@example.com</email>
+      <premium>false</premium>
+      <created_at>2024-01-01T00:00:00</created_at>
+    </User>
+  </Users>
+  <Artists>
+    <Artist>
+      <artist_id>xml_artist_1</artist_id>
+      <name>XML Artist</name>
+      <bio>XML bio</bio>
+    </Artist>
+  </Artists>
+</MusicService>'''
+
+        xml_file = os.path.join(self.test_data_dir, "test_data.xml")
+        with open(xml_file, 'w', encoding='utf-8') as f:
+            f.write(xml_content)
+
+        self.xml_file = xml_file
+
+    def test_load_from_json(self):
+        """Тест загрузки данных из JSON"""
+        loaded, errors = FileOperations.load_initial_data(self.service, self.json_file, None)
+
+        self.assertGreater(loaded, 0)
+        self.assertEqual(errors, 0)
+        self.assertIn("test_user_1", self.service.users)
+        self.assertIn("test_artist_1", self.service.artists)
+        self.assertIn("test_track_1", self.service.tracks)
+        self.assertIn("test_playlist_1", self.service.playlists)
+
+    def test_load_from_xml(self):
+        """Тест загрузки данных из XML"""
+        loaded, errors = FileOperations.load_initial_data(self.service, None, self.xml_file)
+
+        self.assertGreater(loaded, 0)
+        self.assertEqual(errors, 0)
+        self.assertIn("xml_user_1", self.service.users)
+        self.assertIn("xml_artist_1", self.service.artists)
+
+    def test_load_playlists_from_xml(self):
+        """Тест загрузки плейлистов из XML"""
+        xml_content = '''<?xml version='1.0' encoding='utf-8'?>
+<MusicService>
+  <Users>
+    <User><user_id>u1</user_id><username>owner</username><email>o@example.com</email><premium>False</premium></User>
+  </Users>
+  <Artists>
+    <Artist><artist_id>a1</artist_id><name>Band</name><bio /></Artist>
+  </Artists>
+  <Tracks>
+    <Track><track_id>t1</track_id><title>One</title><duration>100</duration><artist>Band</artist></Track>
+    <Track><track_id>t2</track_id><title>Two</title><duration>120</duration><artist>Band</artist></Track>
+  </Tracks>
+  <Playlists>
+    <Playlist>
+      <playlist_id>p1</playlist_id><name>Mix</name><description /><owner>owner</owner><is_public>False</is_public>
+      <Tracks>
+        <TrackInfo><track_id>t2</track_id><position>1</position></TrackInfo>
+        <TrackInfo><track_id>t1</track_id><position>2</position></TrackInfo>
+      </Tracks>
+    </Playlist>
+  </Playlists>
+</MusicService>'''
+        xml_file = os.path.join(self.test_data_dir, "playlists.xml")
+        with open(xml_file, 'w', encoding='utf-8') as f:
+            f.write(xml_content)
+
+        loaded, errors = FileOperations.load_initial_data(self.service, None, xml_file)
+
+        self.assertEqual((loaded, errors), (5, 0))
+        playlist = self.service.playlists["p1"]
+        self.assertFalse(playlist.is_public)
+        self.assertEqual(playlist.description, "")
+        self.assertEqual([t["track_id"] for t in playlist.get_tracks_info()], ["t2", "t1"])
+
+    def test_load_from_both(self):
+        """Тест загрузки данных из обоих файлов"""
+        loaded, errors = FileOperations.load_initial_data(self.service, self.json_file, self.xml_file)
+
+        self.assertGreater(loaded, 0)
+        # Должны быть загружены данные из обоих файлов
+        self.assertIn("test_user_1", self.service.users)
+        self.assertIn("xml_user_1", self.service.users)
+
+    def test_load_nonexistent_file(self):
+        """Тест загрузки из несуществующего файла"""
+        loaded, errors = FileOperations.load_initial_data(
+            self.service,
+            os.path.join(self.test_data_dir, "missing.json"),
+            os.path.join(self.test_data_dir, "missing.xml")
+        )
+
+        self.assertEqual(loaded, 0)
+        self.assertEqual(errors, 0)
+
+
+class TestSearchTracks(unittest.TestCase):
+    """Тесты поиска треков по индексу"""
+
+    def setUp(self):
+        self.service = MusicService()
+        self.service.register_user("searcher", "search@example.com", "secret")
+        self.service.login("search@example.com", "secret")
+        self.service.add_track("Bohemian Rhapsody", 355, "/music/br.mp3", "Queen")
+        self.service.add_track("Yesterday", 125, "/music/y.mp3", "The Beatles")
+        self.service.add_track("Killer Queen", 180, "/music/kq.mp3", "Queen")
+        self.service.add_track("Here Comes The Sun", 185, "/music/hcts.mp3", "The Beatles")
+
+    def linear_search(self, query):
+        query_lower = query.lower()
+        return [t for t in self.service.tracks.values()
+                if query_lower in t.title.lower() or query_lower in t.artist.name.lower()]
+
+    def test_search_matches_linear_scan(self):
+        """Тест совпадения результатов индекса с линейным поиском"""
+        for query in ["queen", "QUEEN", "the", "sun", "e", "ye", "rhapsody", "xyz", "", "een k"]:
+            self.assertEqual(self.service.search_tracks(query), self.linear_search(query), query)
+
+    def test_search_after_load(self):
+        """Тест поиска по трекам, загруженным из файла"""
+        service = MusicService()
+        json_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "initial_data.json")
+        FileOperations.load_initial_data(service, json_file, None)
+
+        titles = [t.title for t in service.search_tracks("queen")]
+        self.assertIn("Bohemian Rhapsody", titles)
+
+
+class TestQueryCache(unittest.TestCase):
+    """Тесты кэша результатов поиска и списков плейлистов"""
+
+    def setUp(self):
+        self.service = MusicService()
+        self.user = self.service.register_user("cacher", "cache@example.com", "pwd")
+        self.service.login("cache@example.com", "pwd")
+        self.service.add_track("Bohemian Rhapsody", 355, "", "Queen")
+        self.service.add_track("Yesterday", 125, "", "The Beatles")
+        self.cache = self.service.query_cache
+
+    def linear_search(self, query):
+        query_lower = query.lower()
+        return [t for t in self.service.tracks.values()
+                if query_lower in t.title.lower() or query_lower in t.artist.name.lower()]
+
+    def test_precise_invalidation(self):
+        """Сбрасываются только поиски, затронутые новым или замененным треком"""
+        for query in ("queen", "day", "xyz", "e"):
+            self.service.search_tracks(query)
+        self.assertEqual(self.service.search_tracks("QUEEN"), self.linear_search("queen"))
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+        # "Killer Queen" касается "queen" и "e", но не "day" и "xyz"
+        self.service.add_track("Killer Queen", 180, "", "Queen")
+        self.assertEqual(self.cache.invalidations, 2)
+        self.assertEqual(self.service.search_tracks("day"), self.linear_search("day"))
+        self.assertEqual(self.service.search_tracks("queen"), self.linear_search("queen"))
+        self.assertEqual(self.cache.stats()['hits'], 2)
+
+        # Замена трека сбрасывает поиски, в которых он был
+        yesterday = self.linear_search("yesterday")[0]
+        self.service.store_track(Track(yesterday.track_id, "Help!", 140, "", yesterday.artist))
+        self.assertEqual(self.service.search_tracks("day"), [])
+
+    def test_matches_uncached_search(self):
+        """Результаты с кэшем совпадают с поиском без кэша при случайных изменениях"""
+        rnd = random.Random(9)
+        words = ["love", "night", "queen", "dream", "fire", "heart"]
+        queries = ["queen", "ove", "re", "night fire", "heart", "Band 1", "zzz", ""]
+        for step in range(300):
+            action = rnd.random()
+            if action < 0.15:
+                self.service.add_track(" ".join(rnd.sample(words, 2)), 100, "", f"Band {rnd.randrange(5)}")
+            elif action < 0.2:
+                self.service.add_tracks([{'title': rnd.choice(words), 'duration': 100, 'file_path': "",
+                                          'artist': f"Band {rnd.randrange(5)}"} for _ in range(3)])
+            elif action < 0.25:
+                track = rnd.choice(list(self.service.tracks.values()))
+                self.service.store_track(Track(track.track_id, rnd.choice(words), 100, "", track.artist))
+            else:
+                query = rnd.choice(queries)
+                self.assertEqual(self.service.search_tracks(query), self.linear_search(query), (step, query))
+        self.assertGreater(self.cache.hits, 0)
+
+    def test_user_playlists(self):
+        """Список плейлистов сбрасывается при создании плейлиста, правки видны сразу"""
+        track = next(iter(self.service.tracks.values()))
+        first = self.service.create_playlist("First")
+        self.assertEqual(self.service.get_user_playlists(self.user.user_id), [first])
+        first.add_track(track)
+        cached = self.service.get_user_playlists(self.user.user_id)
+        self.assertEqual(cached[0].tracks[0].track, track)
+        cached.append("foreign")
+        second = self.service.create_playlist("Second")
+        self.assertEqual(self.service.get_user_playlists(self.user.user_id), [first, second])
+        self.assertEqual(self.cache.hits, 1)
+
+        # Замена плейлиста с другим владельцем сбрасывает списки обоих
+        other = self.service.register_user("other", "other@example.com", "pwd")
+        self.assertEqual(self.service.get_user_playlists(other.user_id), [])
+        moved = Playlist(first.playlist_id, "Moved", "", other)
+        self.service.store_playlist(moved)
+        self.assertEqual(self.service.get_user_playlists(self.user.user_id), [second])
+        self.assertEqual(self.service.get_user_playlists(other.user_id), [moved])
+
+    def test_bounds_and_ttl(self):
+        """Вытеснение по числу записей и объектов, устаревание по TTL"""
+        now = [0.0]
+        self.service.query_cache = self.cache = QueryCache(max_entries=2, max_items=3, ttl=10,
+                                                           clock=lambda: now[0])
+        self.service.add_listener(self.cache)
+        self.service.search_tracks("queen")
+        self.service.search_tracks("the")
+        self.service.search_tracks("queen")
+        self.service.search_tracks("day")
+        self.assertEqual(self.cache.evictions, 1)
+        self.service.search_tracks("queen")
+        self.assertEqual(self.cache.hits, 2)
+
+        # Результат больше max_items не кэшируется, а "e" находит оба трека
+        self.cache.max_items = 1
+        self.service.search_tracks("e")
+        self.assertNotIn(('search', 'e'), self.cache._entries)
+
+        now[0] = 11.0
+        self.service.search_tracks("queen")
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['expirations']), (2, 1))
+
+
+class TestServiceIndexes(unittest.TestCase):
+    """Тесты вторичных индексов сервиса"""
+
+    def setUp(self):
+        self.service = MusicService()
+
+    def test_register_and_login_use_email_index(self):
+        """Тест регистрации и входа по индексу email"""
+        user = self.service.register_user("alice", "alice@example.com", "pwd")
+
+        self.assertIs(self.service.find_user_by_email("alice@example.com"), user)
+        self.assertIs(self.service.find_user_by_username("alice"), user)
+        with self.assertRaises(MusicServiceError):
+            self.service.register_user("alice2", "alice@example.com", "pwd")
+        with self.assertRaises(AuthenticationError):
+            self.service.login("alice@example.com", "wrong")
+        self.assertTrue(self.service.login("alice@example.com", "pwd"))
+        self.assertIs(self.service.current_user, user)
+
+    def test_add_track_reuses_artist(self):
+        """Тест поиска артиста по имени при добавлении трека"""
+        self.service.register_user("bob", "bob@example.com", "pwd")
+        self.service.login("bob@example.com", "pwd")
+        first = self.service.add_track("Song 1", 100, "", "Band")
+        second = self.service.add_track("Song 2", 100, "", "Band")
+
+        self.assertIs(first.artist, second.artist)
+        self.assertEqual(len(self.service.artists), 1)
+        self.assertIs(self.service.find_artist_by_name("Band"), first.artist)
+
+    def test_owner_index_and_user_stats(self):
+        """Тест индекса плейлистов по владельцу и сводки пользователя"""
+        owner = self.service.register_user("carol", "carol@example.com", "pwd")
+        other = self.service.register_user("dave", "dave@example.com", "pwd")
+        self.service.login("dave@example.com", "pwd")
+        foreign = self.service.create_playlist("Dave's")
+        self.service.login("carol@example.com", "pwd")
+        short = self.service.add_track("Short", 100, "", "Band")
+        long = self.service.add_track("Long", 300, "", "Band")
+        first = self.service.create_playlist("First")
+        second = self.service.create_playlist("Second")
+        first.add_tracks([short, long, short])
+        second.add_track(long)
+        first.remove_track(short.track_id)
+        foreign.add_track(long)
+
+        self.assertEqual(self.service.get_user_playlists(owner.user_id), [first, second])
+        self.assertEqual(self.service.get_user_playlists(other.user_id), [foreign])
+        self.assertEqual(self.service.get_user_stats(),
+                         {'playlists_count': 2, 'tracks_count': 3, 'total_duration': 700})
+
+        second.clear_tracks()
+        self.assertEqual(self.service.get_user_stats(owner.user_id)['total_duration'], 400)
+
+        # Загрузчики заполняют индекс и сводку так же, как create_playlist
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "data.json")
+            FileOperations.export_to_json(self.service, filename)
+            restored = MusicService()
+            FileOperations._load_from_json(restored, filename)
+        self.assertEqual([p.playlist_id for p in restored.get_user_playlists(owner.user_id)],
+                         [first.playlist_id, second.playlist_id])
+        self.assertEqual(restored.get_user_stats(owner.user_id), self.service.get_user_stats(owner.user_id))
+        self.assertEqual(restored.get_user_stats(other.user_id)['tracks_count'], 1)
+
+
+class TestStreamingJson(unittest.TestCase):
+    """Тесты потокового чтения JSON"""
+
+    def test_sections_match_json_load(self):
+        """Тест совпадения потокового разбора с json.load при маленьком буфере"""
+        data = {
+            "metadata": {"version": "1.0", "nested": [1, 2, {"a": None}]},
+            "users": [{"id": i, "name": "юзер \"%d\"" % i, "score": 12345.5 * i} for i in range(20)],
+            "empty": [],
+            "count": 1234567,
+            "flag": True,
+        }
+        text = json.dumps(data, indent=2, ensure_ascii=False)
+
+        with tempfile.TemporaryFile('w+', encoding='utf-8') as f:
+            f.write(text)
+            f.seek(0)
+            items = list(iter_json_sections(f, chunk_size=7))
+
+        self.assertEqual([v for k, v in items if k == "users"], data["users"])
+        self.assertEqual(dict((k, v) for k, v in items if k != "users"),
+                         {"metadata": data["metadata"], "count": 1234567, "flag": True})
+
+    def test_invalid_json_raises(self):
+        """Тест ошибки формата для поврежденного JSON"""
+        test_dir = tempfile.mkdtemp()
+        try:
+            bad_file = os.path.join(test_dir, "bad.json")
+            with open(bad_file, 'w', encoding='utf-8') as f:
+                f.write('{"users": [{"user_id": "u1"}, ')
+
+            with self.assertRaises(InvalidFileFormatError):
+                FileOperations.load_initial_data(MusicService(), bad_file, None)
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_record_size_limit(self):
+        """Тест: поврежденная запись не дочитывается до конца файла"""
+        big = {"users": [{"name": "x" * 500}, {"name": "y"}]}
+        items = list(iter_json_sections(io.StringIO(json.dumps(big)), chunk_size=16, max_record_size=1024))
+        self.assertEqual([v for k, v in items], big["users"])
+
+        class CountingReader(io.StringIO):
+            consumed = 0
+
+            def read(self, size=-1):
+                chunk = super().read(size)
+                self.consumed += len(chunk)
+                return chunk
+
+        broken = CountingReader('{"users": [{"name": "a" "b"}, ' + '{"name": "z"}, ' * 100000 + ']}')
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_sections(broken, chunk_size=16, max_record_size=1024))
+        self.assertLess(broken.consumed, 4096)
+
+
+class TestStreamingExport(unittest.TestCase):
+    """Тесты потоковой записи JSON и XML"""
+
+    def test_json_writer_matches_json_dump(self):
+        """Тест совпадения потоковой записи с json.dump(indent=2)"""
+        data = {
+            "metadata": {"version": "1.0"},
+            "users": [{"name": "Тест <&>", "tags": ["a", "b"], "empty": {}}, {"name": "B"}],
+            "empty": [],
+            "statistics": {"count": 2},
+        }
+        sections = [(key, iter(value) if isinstance(value, list) else value) for key, value in data.items()]
+
+        out = io.StringIO()
+        write_json_document(out, sections, chunk_size=16)
+        self.assertEqual(out.getvalue(), json.dumps(data, indent=2, ensure_ascii=False))
+
+        out = io.StringIO()
+        write_json_document(out, list(data.items()), compact=True)
+        self.assertNotIn("\n", out.getvalue())
+        self.assertEqual(json.loads(out.getvalue()), data)
+
+    def test_xml_writer_matches_element_tree(self):
+        """Тест совпадения потоковой записи XML с ElementTree.write"""
+        records = [{"id": 1, "name": "A & <B>", "note": "", "tracks": [{"track_id": "t1"}]},
+                   {"id": 2, "name": "C", "note": None, "tracks": []}]
+
+        root = ET.Element("Root")
+        ET.SubElement(ET.SubElement(root, "Meta"), "Version").text = "1.0"
+        ET.SubElement(root, "Empty")
+        items_elem = ET.SubElement(root, "Items")
+        for record in records:
+            item_elem = ET.SubElement(items_elem, "Item")
+            for key, value in record.items():
+                if key == "tracks":
+                    tracks_elem = ET.SubElement(item_elem, "Tracks")
+                    for info in value:
+                        ET.SubElement(ET.SubElement(tracks_elem, "TrackInfo"), "track_id").text = info["track_id"]
+                else:
+                    ET.SubElement(item_elem, key).text = str(value)
+        expected = io.BytesIO()
+        ET.ElementTree(root).write(expected, encoding='utf-8', xml_declaration=True)
+
+        out = io.StringIO()
+        write_xml_document(out, "Root", [("Meta", None, {"Version": "1.0"}),
+                                         ("Empty", "Item", iter([])),
+                                         ("Items", "Item", iter(records))],
+                           nested={"tracks": ("Tracks", "TrackInfo")})
+        self.assertEqual(out.getvalue(), expected.getvalue().decode('utf-8'))
+
+
+class TestBackup(unittest.TestCase):
+    """Тесты резервного копирования"""
+
+    def setUp(self):
+        self.service = MusicService()
+        self.backup_dir = tempfile.mkdtemp()
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+        FileOperations.load_initial_data(self.service, os.path.join(data_dir, "initial_data.json"), None)
+
+    def tearDown(self):
+        shutil.rmtree(self.backup_dir)
+
+    def assert_restores(self, json_file, xml_file):
+        for files in ((json_file, None), (None, xml_file)):
+            restored = MusicService()
+            loaded, errors = FileOperations.load_initial_data(restored, *files)
+            self.assertEqual(errors, 0)
+            self.assertEqual(set(restored.tracks), set(self.service.tracks))
+            self.assertEqual(set(restored.playlists), set(self.service.playlists))
+
+    def test_backup(self):
+        """Тест последовательной записи JSON и XML из одного снимка"""
+        json_file, xml_file = FileOperations.create_backup(self.service, self.backup_dir)
+        self.assert_restores(json_file, xml_file)
+
+    def test_parallel_backup(self):
+        """Тест параллельной записи JSON и XML в пуле потоков"""
+        json_file, xml_file = FileOperations.create_backup(self.service, self.backup_dir, parallel=True)
+        self.assert_restores(json_file, xml_file)
+
+    def test_process_backup(self):
+        """Тест записи JSON и XML в пуле процессов"""
+        self.service.tracks["track_001"].play()
+        json_file, xml_file = FileOperations.create_backup(self.service, self.backup_dir, use_processes=True)
+        self.assert_restores(json_file, xml_file)
+        self.assertFalse(self.service.change_tracker.has_changes())
+
+    def test_failed_backup_keeps_changes(self):
+        """Тест: прерванная полная копия не становится контрольной точкой"""
+        self.service.change_tracker.checkpoint()
+        self.service.tracks["track_001"].play()
+        sequence = self.service.change_tracker.sequence
+        cancel = threading.Event()
+        cancel.set()
+        with cancellation_scope(cancel):
+            with self.assertRaises(InvalidFileFormatError):
+                FileOperations.create_backup(self.service, self.backup_dir)
+        self.assertEqual(self.service.change_tracker.changes()['tracks'], [self.service.tracks["track_001"]])
+        self.assertEqual(self.service.change_tracker.sequence, sequence)
+
+    def test_compressed_backup(self):
+        """Тест резервной копии со сжатием"""
+        json_file, xml_file = FileOperations.create_backup(self.service, self.backup_dir,
+                                                           compression="gzip")
+        self.assertTrue(json_file.endswith(".json.gz"))
+        self.assertTrue(xml_file.endswith(".xml.gz"))
+        self.assert_restores(json_file, xml_file)
+
+    def test_delta_backup_chain(self):
+        """Тест инкрементальных копий и восстановления из цепочки"""
+        base_file, _ = FileOperations.create_backup(self.service, self.backup_dir)
+        self.assertFalse(self.service.change_tracker.has_changes())
+        self.assertIsNone(FileOperations.create_delta_backup(self.service, self.backup_dir))
+
+        user = self.service.register_user("delta", "delta@example.com", "pwd")
+        self.service.login("delta@example.com", "pwd")
+        track = self.service.add_track("Delta Song", 200, "", "Queen")
+        track.play()
+        self.service.tracks["track_001"].play()
+        playlist = self.service.create_playlist("Delta Mix")
+        playlist.add_track(track)
+        playlist.add_track(self.service.tracks["track_001"])
+        self.assertEqual(self.service.change_tracker.changes_count(), 4)
+        first_delta = FileOperations.create_delta_backup(self.service, self.backup_dir)
+
+        playlist.remove_track(track.track_id)
+        user.upgrade_to_premium()
+        second_delta = FileOperations.create_delta_backup(self.service, self.backup_dir, compression="gzip")
+        self.assertEqual(self.service.change_tracker.changes_count(), 0)
+
+        restored = MusicService()
+        loaded, errors = FileOperations.restore_backup_chain(restored, base_file, [first_delta, second_delta])
+        self.assertEqual(errors, 0)
+        self.assertEqual({k: t.to_dict() for k, t in restored.tracks.items()},
+                         {k: t.to_dict() for k, t in self.service.tracks.items()})
+        self.assertEqual(restored.playlists[playlist.playlist_id].get_tracks_info(), playlist.get_tracks_info())
+        self.assertTrue(restored.users[user.user_id].premium)
+        self.assertFalse(restored.change_tracker.has_changes())
+
+    def test_failed_delta_keeps_changes(self):
+        """Тест: прерванная инкрементальная копия не сбрасывает изменения"""
+        FileOperations.create_backup(self.service, self.backup_dir)
+        track = self.service.tracks["track_001"]
+        track.play()
+        sequence = self.service.change_tracker.sequence
+        cancel = threading.Event()
+        cancel.set()
+        with cancellation_scope(cancel):
+            with self.assertRaises(InvalidFileFormatError):
+                FileOperations.create_delta_backup(self.service, self.backup_dir)
+        self.assertEqual(self.service.change_tracker.changes()['tracks'], [track])
+        self.assertEqual(self.service.change_tracker.sequence, sequence)
+
+        delta_file = FileOperations.create_delta_backup(self.service, self.backup_dir)
+        with open(delta_file, encoding='utf-8') as f:
+            self.assertEqual([record['track_id'] for record in json.load(f)['tracks']], [track.track_id])
+        self.assertEqual(self.service.change_tracker.sequence, sequence + 1)
+
+    def test_tracker_take_and_restore(self):
+        """Тест атомарной выборки изменений и их возврата после неудачной записи"""
+        tracker = self.service.change_tracker
+        tracker.checkpoint()
+        first, second = self.service.tracks["track_001"], self.service.tracks["track_002"]
+        tracker.mark('tracks', first.track_id, first)
+        taken = tracker.take()
+        self.assertFalse(tracker.has_changes())
+
+        # Отметки во время записи копии не теряются и не перетираются возвратом
+        replacement = Track(first.track_id, "New", 100, "", first.artist)
+        tracker.mark('tracks', first.track_id, replacement)
+        tracker.mark('tracks', second.track_id, second)
+        tracker.restore(taken)
+        self.assertEqual(tracker.changes()['tracks'], [replacement, second])
+
+        sequence = tracker.sequence
+        tracker.take()
+        tracker.commit()
+        self.assertEqual(tracker.sequence, sequence + 1)
+        self.assertFalse(tracker.has_changes())
+
+    def test_threaded_marks(self):
+        """Тест отметок из нескольких потоков во время выборки изменений"""
+        tracker = self.service.change_tracker
+        tracker.checkpoint()
+        tracks = list(self.service.tracks.values())
+        collected = {}
+
+        def mark(offset):
+            for i in range(2000):
+                track = tracks[(offset + i) % len(tracks)]
+                tracker.mark('tracks', f"{offset}_{i}", track)
+
+        workers = [threading.Thread(target=mark, args=(n,)) for n in range(4)]
+        for worker in workers:
+            worker.start()
+        while any(worker.is_alive() for worker in workers):
+            collected.update(tracker.take()['tracks'])
+        for worker in workers:
+            worker.join()
+        collected.update(tracker.take()['tracks'])
+        self.assertEqual(len(collected), 8000)
+
+
+class TestUserExport(unittest.TestCase):
+    """Тесты экспорта данных пользователя"""
+
+    def setUp(self):
+        self.service = MusicService()
+        self.output_dir = tempfile.mkdtemp()
+        catalog_file = os.path.join(self.output_dir, "catalog.json")
+        SyntheticCatalog(200, users=5, playlists=20).write_json(catalog_file)
+        FileOperations.load_initial_data(self.service, catalog_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def expected(self, user):
+        playlists = [p for p in self.service.playlists.values() if p.owner is user]
+        track_ids = list(dict.fromkeys(pt.track.track_id for p in playlists for pt in p.tracks))
+        return ([p.to_dict() for p in playlists],
+                [self.service.tracks[track_id].to_dict() for track_id in track_ids])
+
+    def test_export_user_data(self):
+        """Экспорт содержит профиль, плейлисты владельца и их треки"""
+        user = next(iter(self.service.users.values()))
+        filename = os.path.join(self.output_dir, "user.json")
+        FileOperations.export_user_data(self.service, user.user_id, filename)
+        with open(filename, encoding='utf-8') as f:
+            data = json.load(f)
+
+        playlists, tracks = self.expected(user)
+        self.assertEqual(data['user'], user.to_dict())
+        self.assertEqual(data['playlists'], playlists)
+        self.assertEqual(data['tracks'], tracks)
+        self.assertEqual(data['statistics'], self.service.get_user_stats(user.user_id))
+        with self.assertRaises(UserNotFoundError):
+            FileOperations.export_user_data(self.service, "missing", filename)
+
+    def test_batch_export(self):
+        """Пакетный экспорт пишет файл на каждого пользователя"""
+        user_ids = list(self.service.users)
+        exported = FileOperations.export_users_data(self.service, user_ids, self.output_dir,
+                                                    compression="gzip", max_workers=3)
+        self.assertEqual(list(exported), user_ids)
+        for user_id, filename in exported.items():
+            self.assertTrue(filename.endswith(".json.gz"))
+            with FileOperations._open_for_read(filename) as f:
+                data = json.load(f)
+            self.assertEqual(data['user']['user_id'], user_id)
+            self.assertEqual(data['playlists'], self.expected(self.service.users[user_id])[0])
+        with self.assertRaises(UserNotFoundError):
+            FileOperations.export_users_data(self.service, [user_ids[0], "missing"], self.output_dir)
+
+
+class TestBinarySnapshot(unittest.TestCase):
+    """Тесты бинарного снимка"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_round_trip(self):
+        """Тест идентичности сервиса после записи и чтения снимка"""
+        service = MusicService()
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+        FileOperations.load_initial_data(service, os.path.join(data_dir, "initial_data.json"), None)
+        service.albums["album_001"].add_track(service.tracks["track_001"])
+        service.tracks["track_002"].play()
+        service.register_user("юзер", "u@example.com", "pwd")
+        service.login("u@example.com", "pwd")
+        service.create_playlist("Пусто", "")
+
+        snapshot_file = os.path.join(self.test_dir, "snapshot.bin")
+        FileOperations.export_to_binary(service, snapshot_file)
+        restored = MusicService()
+        loaded, errors = FileOperations.load_from_binary(restored, snapshot_file)
+
+        self.assertEqual(errors, 0)
+        for section in ("users", "artists", "tracks", "albums", "playlists"):
+            original = getattr(service, section)
+            copy = getattr(restored, section)
+            self.assertEqual(list(copy), list(original))
+            self.assertEqual([e.to_dict() for e in copy.values()], [e.to_dict() for e in original.values()])
+        self.assertIs(restored.tracks["track_001"].album, restored.albums["album_001"])
+        self.assertEqual(restored.search_tracks("queen"), [restored.tracks[t.track_id] for t in service.search_tracks("queen")])
+
+    def test_invalid_file(self):
+        """Тест ошибки формата для чужого файла"""
+        bad_file = os.path.join(self.test_dir, "bad.bin")
+        with open(bad_file, 'wb') as f:
+            f.write(b"not a snapshot at all")
+
+        with self.assertRaises(InvalidFileFormatError):
+            FileOperations.load_from_binary(MusicService(), bad_file)
+
+
+class TestMappedCatalog(unittest.TestCase):
+    """Тесты каталога только для чтения поверх mmap"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.source = MusicService()
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+        FileOperations.load_initial_data(self.source, os.path.join(data_dir, "initial_data.json"), None)
+        self.source.albums["album_001"].add_track(self.source.tracks["track_001"])
+        self.source.tracks["track_002"].play()
+        self.catalog_file = os.path.join(self.test_dir, "catalog.bin")
+        MappedCatalog.build(self.source, self.catalog_file)
+        self.catalog = MappedCatalog(self.catalog_file)
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.test_dir)
+
+    def test_views_match_source(self):
+        """Тест совпадения представлений с исходными объектами"""
+        for section in ("tracks", "albums", "artists"):
+            table = getattr(self.catalog, section)
+            original = getattr(self.source, section)
+            self.assertEqual(list(table), list(original))
+            for key, entity in original.items():
+                self.assertIn(key, table)
+                self.assertEqual(table[key].to_dict(), entity.to_dict())
+        self.assertNotIn("missing", self.catalog.tracks)
+        self.assertEqual(self.catalog.tracks["track_001"].album, self.catalog.albums["album_001"])
+
+    def test_concurrent_plays(self):
+        """Тест: воспроизведения из нескольких потоков не теряются"""
+        service = MusicService()
+        service.attach_catalog(self.catalog)
+        before = service.tracks["track_001"].stream_count
+
+        def worker():
+            for _ in range(2000):
+                service.tracks["track_001"].play()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            threads = [threading.Thread(target=worker) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(service.tracks["track_001"].stream_count, before + 8000)
+        self.assertEqual(service.get_statistics()['total_streams'],
+                         sum(track.stream_count for track in service.tracks.values()))
+
+    def test_total_streams_tracks_overlay(self):
+        """Тест: общая сумма прослушиваний учитывает изменения счетчиков без пересчета"""
+        tracks = self.catalog.tracks
+        self.assertEqual(self.catalog.total_streams(), 1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracks["track_001"].play()
+            tracks["track_002"].play()
+            tracks["track_002"].play()
+        tracks["track_003"].stream_count = 10
+        tracks["track_002"].stream_count = 0
+        self.assertEqual(self.catalog.total_streams(), 11)
+        self.assertEqual(self.catalog.total_streams(),
+                         sum(track.stream_count for track in tracks.values()))
+
+    def test_service_over_catalog(self):
+        """Тест поиска, воспроизведения и плейлистов поверх каталога"""
+        service = MusicService()
+        service.register_user("reader", "reader@example.com", "pwd")
+        service.login("reader@example.com", "pwd")
+        service.attach_catalog(self.catalog)
+
+        for query in ("queen", "E", "numb", "zzz"):
+            self.assertEqual([t.track_id for t in service.search_tracks(query)],
+                             [t.track_id for t in self.source.search_tracks(query)])
+
+        track = service.tracks["track_002"]
+        track.play()
+        self.assertEqual(service.tracks["track_002"].stream_count, 2)
+        self.assertEqual(service.get_statistics()["total_streams"], 2)
+
+        playlist = service.create_playlist("Mapped")
+        playlist.add_track(track)
+        self.assertEqual(playlist.get_tracks_info()[0]["title"], "Yesterday")
+        with self.assertRaises(MusicServiceError):
+            service.add_track("New", 100, "", "Queen")
+
+
+class TestOperationLog(unittest.TestCase):
+    """Тесты журнала операций и восстановления после сбоя"""
+
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.log_dir)
+
+    def make_changes(self, service):
+        service.register_user("wal", "wal@example.com", "pwd")
+        service.login("wal@example.com", "pwd")
+        first = service.add_track("First", 100, "", "Band")
+        second = service.add_track("Second", 120, "", "Band")
+        first.play()
+        first.play()
+        playlist = service.create_playlist("WAL Mix")
+        playlist.add_track(first)
+        playlist.add_track(second)
+        playlist.remove_track(first.track_id)
+        playlist.insert_track(first, 1)
+        playlist.move_track(1, 2)
+        service.register_users([{'username': "batch", 'email': "batch@example.com", 'password': "pwd"}])
+        batch = service.add_tracks([{'title': "Third", 'duration': 90, 'artist': "Other Band"}])
+        service.add_playlist_tracks([(playlist.playlist_id, batch[0].track_id),
+                                     (playlist.playlist_id, second.track_id)])
+        return playlist
+
+    def assert_same_state(self, restored, service):
+        self.assertEqual({k: t.to_dict() for k, t in restored.tracks.items()},
+                         {k: t.to_dict() for k, t in service.tracks.items()})
+        self.assertEqual({k: p.get_tracks_info() for k, p in restored.playlists.items()},
+                         {k: p.get_tracks_info() for k, p in service.playlists.items()})
+        self.assertEqual(set(restored.users), set(service.users))
+
+    def test_recover_from_log(self):
+        """Тест повтора журнала без снимка"""
+        service = MusicService()
+        log = OperationLog(self.log_dir, background_sync=False)
+        log.attach(service)
+        self.make_changes(service)
+        log.sync()
+
+        # Недописанная строка после сбоя игнорируется
+        with open(log.log_path, 'a', encoding='utf-8') as f:
+            f.write('{"op": "play", "track_')
+        log.close()
+
+        self.assert_same_state(OperationLog.recover(self.log_dir), service)
+
+    def test_recover_after_compaction(self):
+        """Тест восстановления из снимка и остатка журнала"""
+        service = MusicService()
+        log = OperationLog(self.log_dir, compact_every=5, background_sync=False)
+        log.attach(service)
+        playlist = self.make_changes(service)
+        playlist.add_track(service.search_tracks("First")[0])
+        log.close()
+
+        self.assertTrue(os.path.exists(log.snapshot_path))
+        self.assert_same_state(OperationLog.recover(self.log_dir), service)
+
+    def test_append_after_torn_tail(self):
+        """Тест: новый журнал дописывается после обрезки недописанной строки"""
+        service = MusicService()
+        log = OperationLog(self.log_dir, background_sync=False)
+        log.attach(service)
+        playlist = self.make_changes(service)
+        log.close()
+        with open(log.log_path, 'a', encoding='utf-8') as f:
+            f.write('{"op": "play", "track_')
+
+        log = OperationLog(self.log_dir, background_sync=False)
+        log.attach(service)
+        playlist.tracks[0].track.play()
+        log.close()
+        self.assert_same_state(OperationLog.recover(self.log_dir), service)
+
+    def test_crash_before_log_removal(self):
+        """Тест: операции отложенного журнала, уже учтенные в снимке, не повторяются"""
+        service = MusicService()
+        log = OperationLog(self.log_dir, background_sync=False)
+        log.attach(service)
+        self.make_changes(service)
+        log.sync()
+        with open(log.log_path, 'rb') as f:
+            logged = f.read()
+        log.compact()
+        # Сбой между установкой снимка и удалением отложенного журнала
+        with open(log.old_log_path, 'wb') as f:
+            f.write(logged)
+        service.search_tracks("First")[0].play()
+        log.close()
+        self.assert_same_state(OperationLog.recover(self.log_dir), service)
+
+    def test_compaction_during_changes(self):
+        """Тест свертки, пока другой поток меняет треки и плейлисты"""
+        service = MusicService()
+        log = OperationLog(self.log_dir, background_sync=False)
+        log.attach(service)
+        playlist = self.make_changes(service)
+        tracks = list(service.tracks.values())
+        done = threading.Event()
+
+        def mutate():
+            i = 0
+            while not done.is_set():
+                track = tracks[i % len(tracks)]
+                track.play()
+                playlist.add_track(track)
+                if i % 3 == 0:
+                    playlist.remove_track(track.track_id)
+                i += 1
+
+        worker = threading.Thread(target=mutate)
+        worker.start()
+        for _ in range(5):
+            log.compact()
+        done.set()
+        worker.join()
+        log.close()
+        self.assert_same_state(OperationLog.recover(self.log_dir), service)
+
+
+class TestBulkIngest(unittest.TestCase):
+    """Тесты пакетного добавления треков, пользователей и записей плейлистов"""
+
+    def setUp(self):
+        self.service = MusicService()
+        self.owner = self.service.register_user("bulk", "bulk@example.com", "pwd")
+        self.service.login("bulk@example.com", "pwd")
+        self.existing = self.service.add_track("Old Song", 200, "", "Queen")
+
+    def test_add_tracks(self):
+        """Артисты создаются по одному на имя, треки находятся поиском"""
+        tracks = self.service.add_tracks([
+            {'title': "Radio Ga Ga", 'duration': 343, 'artist': "Queen", 'file_path': "/q/radio.mp3"},
+            {'title': "Come Together", 'duration': 259, 'artist': "The Beatles"},
+            {'title': "Something", 'duration': 182, 'artist': "The Beatles"},
+        ])
+
+        self.assertEqual(len(self.service.artists), 2)
+        self.assertIs(tracks[0].artist, self.existing.artist)
+        self.assertIs(tracks[1].artist, tracks[2].artist)
+        self.assertEqual(len({track.track_id for track in tracks}), 3)
+        self.assertEqual(self.service.search_tracks("queen"), [self.existing, tracks[0]])
+        self.assertEqual(self.service.search_tracks("beatles"), tracks[1:])
+        self.assertEqual(self.service.search_tracks("some"), [tracks[2]])
+        self.assertEqual(set(self.service.change_tracker.changes()['tracks']), {self.existing, *tracks})
+
+    def test_add_tracks_all_or_nothing(self):
+        """Ошибка в любой записи отменяет всю пачку"""
+        before = (dict(self.service.tracks), dict(self.service.artists))
+        for bad in ({'title': "", 'duration': 100, 'artist': "New"},
+                    {'title': "Song", 'duration': 0, 'artist': "New"},
+                    {'title': "Song", 'duration': "100", 'artist': "New"},
+                    {'title': "Song", 'duration': 100}):
+            with self.assertRaises(MusicServiceError):
+                self.service.add_tracks([{'title': "Fine", 'duration': 100, 'artist': "New"}, bad])
+        self.assertEqual((self.service.tracks, self.service.artists), before)
+
+        self.service.logout()
+        with self.assertRaises(InsufficientPermissionsError):
+            self.service.add_tracks([{'title': "Fine", 'duration': 100, 'artist': "New"}])
+
+    def test_register_users(self):
+        """Пакетная регистрация; повтор email отменяет всю пачку"""
+        with self.assertRaises(MusicServiceError):
+            self.service.register_users([
+                {'username': "a", 'email': "a@example.com", 'password': "pwd"},
+                {'username': "b", 'email': "bulk@example.com", 'password': "pwd"},
+            ])
+        with self.assertRaises(MusicServiceError):
+            self.service.register_users([
+                {'username': "a", 'email': "a@example.com", 'password': "pwd"},
+                {'username': "b", 'email': "a@example.com", 'password': "pwd"},
+            ])
+        self.assertEqual(len(self.service.users), 1)
+
+        users = self.service.register_users([
+            {'username': f"user{i}", 'email': f"user{i}@example.com", 'password': "pwd"} for i in range(3)
+        ])
+        self.assertEqual(len(self.service.users), 4)
+        self.assertIs(self.service.find_user_by_username("user1"), users[1])
+        self.assertTrue(self.service.login("user2@example.com", "pwd"))
+
+    def test_add_playlist_tracks(self):
+        """Записи группируются по плейлистам; неизвестный трек отменяет всю пачку"""
+        first = self.service.create_playlist("First")
+        second = self.service.create_playlist("Second")
+        other = self.service.add_track("Other", 100, "", "Band")
+
+        with self.assertRaises(TrackNotFoundError):
+            self.service.add_playlist_tracks([(first.playlist_id, other.track_id), (second.playlist_id, "missing")])
+        with self.assertRaises(PlaylistNotFoundError):
+            self.service.add_playlist_tracks([("missing", other.track_id)])
+        self.assertEqual((len(first.tracks), len(second.tracks)), (0, 0))
+
+        added = self.service.add_playlist_tracks([
+            (first.playlist_id, other.track_id),
+            (second.playlist_id, self.existing.track_id),
+            (first.playlist_id, self.existing.track_id),
+        ])
+        self.assertEqual(added, 3)
+        self.assertEqual([info['track_id'] for info in first.get_tracks_info()],
+                         [other.track_id, self.existing.track_id])
+        self.assertEqual(self.service.get_user_stats(self.owner.user_id),
+                         {'playlists_count': 2, 'tracks_count': 3, 'total_duration': 500})
+
+
+class TestPlaylistStorage(unittest.TestCase):
+    """Тесты хранения треков плейлиста с неявными позициями"""
+
+    def setUp(self):
+        artist = Artist("artist", "Artist")
+        self.tracks = [Track(f"track_{i}", f"Title {i}", 100, "", artist) for i in range(50)]
+
+    def test_matches_plain_list(self):
+        """Случайные операции дают тот же порядок, что и обычный список"""
+        rnd = random.Random(7)
+        storage = PlaylistTrackList(load=4)
+        expected = []
+        for _ in range(2000):
+            action = rnd.random()
+            if action < 0.4 or not expected:
+                entry = PlaylistTrack(rnd.choice(self.tracks))
+                index = rnd.randint(0, len(expected))
+                storage.insert(index, entry)
+                expected.insert(index, entry)
+            elif action < 0.7:
+                entry = expected.pop(rnd.randrange(len(expected)))
+                storage.remove(entry)
+            elif action < 0.9:
+                source, target = rnd.randrange(len(expected)), rnd.randrange(len(expected))
+                storage.move(source, target)
+                expected.insert(target, expected.pop(source))
+            else:
+                removed = rnd.sample(expected, rnd.randint(0, len(expected)))
+                storage.remove_many(removed)
+                expected = [e for e in expected if e not in removed]
+
+            self.assertEqual(len(storage), len(expected))
+        self.assertEqual(list(storage), expected)
+        for position, entry in enumerate(expected, start=1):
+            self.assertEqual(entry.position, position)
+            self.assertIs(storage[position - 1], entry)
+        track_id = expected[0].track.track_id
+        self.assertIs(storage.first(track_id), next(e for e in expected if e.track.track_id == track_id))
+
+    def test_playlist_positions(self):
+        """Позиции записей плейлиста пересчитываются после вставки, перемещения и удаления"""
+        playlist = Playlist("p", "P", "", User("u", "u", "u@example.com", "pwd"))
+        playlist.add_tracks(self.tracks[:5])
+        playlist.insert_track(self.tracks[10], 2)
+        playlist.move_track(6, 1)
+        playlist.remove_tracks(["track_0", "track_3"])
+        info = playlist.get_tracks_info()
+        self.assertEqual([t['track_id'] for t in info], ["track_4", "track_10", "track_1", "track_2"])
+        self.assertEqual([t['position'] for t in info], [1, 2, 3, 4])
+        self.assertEqual(playlist.tracks[2].position, 3)
+
+        with self.assertRaises(TrackNotFoundError):
+            playlist.remove_tracks(["track_1", "missing"])
+        self.assertEqual(len(playlist.tracks), 4)
+        with self.assertRaises(MusicServiceError):
+            playlist.insert_track(self.tracks[0], 7)
+
+        # Вхождение проверяется для записей, как у списка, а трек ищется по ID
+        entry = playlist.tracks[0]
+        self.assertIn(entry, playlist.tracks)
+        self.assertNotIn(PlaylistTrack(self.tracks[4]), playlist.tracks)
+        self.assertNotIn("track_4", playlist.tracks)
+        self.assertTrue(playlist.tracks.contains_track("track_4"))
+        self.assertFalse(playlist.tracks.contains_track("track_0"))
+        playlist.remove_tracks(["track_4"])
+        self.assertNotIn(entry, playlist.tracks)
+
+
+class TestPlayRecorder(unittest.TestCase):
+    """Тесты приема прослушиваний и общего счетчика"""
+
+    def setUp(self):
+        self.service = MusicService()
+        self.user = self.service.register_user("listener", "listener@example.com", "pwd")
+        self.service.login("listener@example.com", "pwd")
+        self.first = self.service.add_track("First", 100, "", "Band")
+        self.second = self.service.add_track("Second", 120, "", "Band")
+
+    def test_threads_merge_into_stream_count(self):
+        """Прослушивания из нескольких потоков сливаются в stream_count"""
+        recorder = PlayRecorder(self.service, background=False)
+
+        def worker():
+            for _ in range(1000):
+                recorder.record_play(self.first.track_id, self.user.user_id)
+            recorder.record_plays([(self.second.track_id, None)] * 10)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(recorder.pending_count(), 4040)
+        self.assertEqual(self.first.stream_count, 0)
+        self.assertEqual(recorder.flush(), 4040)
+        recorder.close()
+
+        self.assertEqual(self.first.stream_count, 4000)
+        self.assertEqual(self.second.stream_count, 40)
+        self.assertEqual(recorder.user_plays, {self.user.user_id: 4000})
+        self.assertEqual(self.service.get_statistics()['total_streams'], 4040)
+        self.assertEqual(self.service.change_tracker.changes()['tracks'], [self.first, self.second])
+
+    def test_dead_thread_shards_dropped(self):
+        """Шарды завершившихся потоков удаляются после слияния"""
+        recorder = PlayRecorder(self.service, background=False)
+        recorder.record_play(self.first.track_id)
+        threads = [threading.Thread(target=recorder.record_play, args=(self.second.track_id,)) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(recorder._shards), 11)
+
+        self.assertEqual(recorder.flush(), 11)
+        # Остается только шард живого текущего потока
+        self.assertEqual(len(recorder._shards), 1)
+        recorder.record_play(self.first.track_id)
+        recorder.close()
+        self.assertEqual(self.first.stream_count, 2)
+        self.assertEqual(self.second.stream_count, 10)
+
+    def test_flush_during_compaction(self):
+        """Свертка журнала между переносом счетчика и записью операции не дублирует прослушивания"""
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        compactions = []
+
+        def compact_before_log(event, payload):
+            # Подписан раньше журнала: свертка стартует до записи операции и ждет ее
+            if event == 'track_played':
+                compaction = threading.Thread(target=log.compact)
+                compaction.start()
+                compaction.join(0.2)
+                compactions.append(compaction)
+
+        self.service.add_listener(compact_before_log)
+        log = OperationLog(log_dir, background_sync=False)
+        log.attach(self.service)
+        recorder = PlayRecorder(self.service, background=False)
+        recorder.record_plays([(self.first.track_id, None)] * 5)
+        recorder.close()
+        for compaction in compactions:
+            compaction.join()
+        log.close()
+
+        restored = OperationLog.recover(log_dir)
+        self.assertEqual(restored.tracks[self.first.track_id].stream_count, 5)
+
+    def test_unknown_ids_rejected(self):
+        """Неизвестные трек и пользователь отклоняются до записи"""
+        recorder = PlayRecorder(self.service, background=False)
+        with self.assertRaises(TrackNotFoundError):
+            recorder.record_play("missing")
+        with self.assertRaises(UserNotFoundError):
+            recorder.record_plays([(self.first.track_id, None), (self.first.track_id, "missing")])
+        self.assertEqual(recorder.pending_count(), 0)
+
+    def test_total_streams_follows_counters(self):
+        """Общий счетчик прослушиваний следует за счетчиками треков"""
+        self.first.play()
+        self.second.stream_count = 10
+        self.service.store_track(self.second)
+        self.assertEqual(self.service.get_statistics()['total_streams'], 11)
+        self.assertEqual(self.service.get_statistics()['total_streams'],
+                         sum(track.stream_count for track in self.service.tracks.values()))
+
+
+class TestCharts(unittest.TestCase):
+    """Тесты чартов с затуханием"""
+
+    def setUp(self):
+        self.now = 0.0
+        self.service = MusicService()
+        self.service.register_user("fan", "fan@example.com", "pwd")
+        self.service.login("fan@example.com", "pwd")
+        self.old = self.service.add_track("Old Hit", 100, "", "Veteran")
+        self.new = self.service.add_track("New Hit", 100, "", "Rookie")
+        self.other = self.service.add_track("Other", 100, "", "Rookie")
+        self.charts = ChartsEngine(clock=lambda: self.now)
+        self.charts.attach(self.service)
+
+    def test_windows_rank_by_recency(self):
+        """Недавние прослушивания весят больше в коротком окне, старые - в длинном"""
+        self.charts.record(self.old, 10)
+        self.now = 6 * 3600.0
+        self.charts.record(self.new, 3)
+        self.charts.record(self.other, 1)
+
+        self.assertEqual([t for t, _ in self.charts.top_tracks(2, 'hour')], [self.new, self.other])
+        self.assertEqual([t for t, _ in self.charts.top_tracks(3, 'week')], [self.old, self.new, self.other])
+        self.assertEqual([a.name for a, _ in self.charts.top_artists(1, 'hour')], ["Rookie"])
+        score = self.charts.score('tracks', self.old.track_id, 'hour')
+        self.assertAlmostEqual(score, 10 * math.exp(-6), places=6)
+
+    def test_play_events_and_rebase(self):
+        """События воспроизведения попадают в чарт, счет переносится к новой точке отсчета"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.old.play()
+        self.now = 1000 * 3600.0
+        self.charts.record(self.new)
+        self.assertEqual(self.charts.top_tracks(1, 'hour')[0][0], self.new)
+        self.assertAlmostEqual(self.charts.score('tracks', self.new.track_id, 'hour'), 1.0)
+        with self.assertRaises(ValueError):
+            self.charts.top_tracks(1, 'year')
+
+
+class TestRecommendations(unittest.TestCase):
+    """Тесты рекомендаций по совместной встречаемости в плейлистах"""
+
+    def setUp(self):
+        self.service = MusicService()
+        self.service.register_user("curator", "curator@example.com", "pwd")
+        self.service.login("curator@example.com", "pwd")
+        self.tracks = [self.service.add_track(f"Song {i}", 100, "", f"Band {i % 3}") for i in range(12)]
+        self.rnd = random.Random(5)
+        self.playlists = []
+        for i in range(6):
+            playlist = self.service.create_playlist(f"Mix {i}")
+            playlist.add_tracks(self.rnd.sample(self.tracks, 5))
+            self.playlists.append(playlist)
+
+    def brute_force(self):
+        counts = {}
+        for playlist in self.service.playlists.values():
+            present = {pt.track.track_id for pt in playlist.tracks}
+            for a in present:
+                for b in present - {a}:
+                    counts[(a, b)] = counts.get((a, b), 0) + 1
+        return counts
+
+    def assert_matrix(self, engine):
+        counts = self.brute_force()
+        for a in self.tracks:
+            for b in self.tracks:
+                if a is not b:
+                    self.assertEqual(engine.cooccurrence(a.track_id, b.track_id),
+                                     counts.get((a.track_id, b.track_id), 0))
+
+    def test_incremental_matches_rebuild(self):
+        """Матрица, обновляемая по событиям, совпадает с посчитанной заново"""
+        engine = RecommendationEngine(max_row_entries=20)
+        engine.attach(self.service)
+        self.assert_matrix(engine)
+
+        for _ in range(200):
+            playlist = self.rnd.choice(self.playlists)
+            action = self.rnd.random()
+            if action < 0.4:
+                playlist.add_track(self.rnd.choice(self.tracks))
+            elif action < 0.5:
+                playlist.add_tracks(self.rnd.sample(self.tracks, 3))
+            elif action < 0.8 and playlist.tracks:
+                playlist.remove_track(self.rnd.choice(list(playlist.tracks)).track.track_id)
+            elif action < 0.85:
+                playlist.clear_tracks()
+            else:
+                engine.similar_tracks(self.rnd.choice(self.tracks).track_id)
+        self.service.add_playlist_tracks([(self.playlists[0].playlist_id, self.tracks[0].track_id)])
+        self.assert_matrix(engine)
+        self.assertEqual(engine._row_entries, sum(len(row) for row in engine._rows.values()))
+        self.assertLessEqual(engine._row_entries, 20)
+
+        rebuilt = RecommendationEngine()
+        rebuilt.attach(self.service)
+        seed = self.tracks[0].track_id
+        self.assertEqual(engine.similar_tracks(seed, 5), rebuilt.similar_tracks(seed, 5))
+        engine.detach()
+
+    def test_attach_during_changes(self):
+        """Подключение, пока другой поток меняет плейлисты, не теряет и не дублирует изменения"""
+        done = threading.Event()
+        rnd = random.Random(9)
+
+        def mutate():
+            while not done.is_set():
+                playlist = rnd.choice(self.playlists)
+                playlist.add_track(rnd.choice(self.tracks))
+                if len(playlist.tracks) > 8:
+                    playlist.remove_track(playlist.tracks[0].track.track_id)
+
+        worker = threading.Thread(target=mutate)
+        worker.start()
+        engines = []
+        for _ in range(20):
+            engine = RecommendationEngine()
+            engine.attach(self.service)
+            engines.append(engine)
+        done.set()
+        worker.join()
+        for engine in engines:
+            self.assert_matrix(engine)
+            engine.detach()
+
+    def test_recommendations(self):
+        """Похожие треки ранжируются по нормированной встречаемости, плейлист не повторяется"""
+        engine = RecommendationEngine()
+        engine.attach(self.service)
+        seed = self.tracks[0]
+        membership = {t.track_id: sum(1 for p in self.playlists if t in [pt.track for pt in p.tracks])
+                      for t in self.tracks}
+        counts = self.brute_force()
+        expected = sorted(
+            ((other.track_id, counts[(seed.track_id, other.track_id)] /
+              math.sqrt(membership[seed.track_id] * membership[other.track_id]))
+             for other in self.tracks if (seed.track_id, other.track_id) in counts),
+            key=lambda item: (-item[1], item[0]))[:3]
+        result = engine.similar_tracks(seed.track_id, 3)
+        self.assertEqual([(t.track_id, round(score, 9)) for t, score in result],
+                         [(track_id, round(score, 9)) for track_id, score in expected])
+
+        playlist = self.playlists[0]
+        present = {pt.track.track_id for pt in playlist.tracks}
+        suggestions = engine.continue_playlist(playlist.playlist_id, 20)
+        self.assertTrue(suggestions)
+        self.assertFalse(present & {t.track_id for t, _ in suggestions})
+        self.assertEqual([score for _, score in suggestions],
+                         sorted((score for _, score in suggestions), reverse=True))
+
+        with self.assertRaises(TrackNotFoundError):
+            engine.similar_tracks("missing")
+        with self.assertRaises(PlaylistNotFoundError):
+            engine.continue_playlist("missing")
+
+
+class TestSessions(unittest.TestCase):
+    """Тесты сессий и одновременной работы пользователей"""
+
+    def test_store_ttl_and_lru(self):
+        """Сессии истекают по TTL, при переполнении вытесняется давно не использованная"""
+        now = [0.0]
+        store = SessionStore(ttl=10, max_sessions=2, clock=lambda: now[0])
+        first = store.create("first")
+        second = store.create("second")
+        now[0] = 5
+        self.assertIs(store.get(first.token), first)
+        store.create("third")
+        # Вытесняется давно не использованная сессия
+        self.assertIsNone(store.get(second.token))
+        now[0] = 16
+        self.assertIsNone(store.get(first.token))
+        self.assertEqual(len(store), 1)
+
+    def test_concurrent_sessions(self):
+        """Пользователи работают одновременно в своих сессиях без потери изменений"""
+        service = MusicService()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(8):
+                service.register_user(f"user{i}", f"user{i}@example.com", "pwd")
+            sessions = [service.start_session(f"user{i}@example.com", "pwd") for i in range(8)]
+            tracks = [service.add_track(f"Song {i}", 100, "", "Band", session=sessions[0]) for i in range(20)]
+            shared = service.create_playlist("Shared", session=sessions[0])
+
+            def work(session):
+                own = service.create_playlist(f"{session.user.username} mix", session=session)
+                for track in tracks:
+                    own.add_track(track)
+                    shared.add_track(track)
+                    track.play()
+                return service.get_user_playlists(session=session)
+
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(work, sessions))
+
+        self.assertIsNone(service.current_user)
+        self.assertEqual([len(playlists) for playlists in results], [2] + [1] * 7)
+        self.assertEqual(len(shared.tracks), 8 * 20)
+        self.assertEqual([e['position'] for e in shared.get_tracks_info()], list(range(1, 161)))
+        self.assertEqual(service.get_statistics()['total_streams'], 160)
+        self.assertEqual(service.get_user_stats(session=sessions[0])['tracks_count'], 180)
+
+        service.end_session(sessions[1])
+        with self.assertRaises(AuthenticationError):
+            service.create_playlist("Late", session=sessions[1])
+        with self.assertRaises(AuthenticationError):
+            service.start_session("user2@example.com", "wrong")
+
+
+class TestAsyncService(unittest.TestCase):
+    """Тесты асинхронного интерфейса"""
+
+    def setUp(self):
+        self.service = MusicService()
+        self.tmp = tempfile.mkdtemp()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.service.register_user("async", "async@example.com", "pwd")
+            self.service.login("async@example.com", "pwd")
+            self.track = self.service.add_track("Async Song", 100, "", "Band")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_requests(self):
+        """Запросы выполняются через асинхронный интерфейс, экспорт - в фоновом потоке"""
+        async def scenario():
+            facade = AsyncMusicService(self.service)
+            session = await facade.login("async@example.com", "pwd")
+            playlist = await facade.create_playlist(session, "Async")
+            await facade.add_to_playlist(playlist.playlist_id, self.track.track_id)
+            await facade.play(self.track.track_id, session)
+            found = await facade.search_tracks("async")
+            playlists = await facade.get_user_playlists(session)
+            await facade.export_to_json(os.path.join(self.tmp, "export.json"))
+            facade.close()
+            return found, playlists, playlist
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            found, playlists, playlist = asyncio.run(scenario())
+        self.assertEqual(found, [self.track])
+        self.assertEqual(playlists, [playlist])
+        self.assertEqual(self.track.stream_count, 1)
+        with open(os.path.join(self.tmp, "export.json"), encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)['tracks']), 1)
+
+    def test_backpressure_and_cancellation(self):
+        """Лишний фоновый экспорт отклоняется, отмененный прерывается до записи данных"""
+        release = threading.Event()
+        target = os.path.join(self.tmp, "cancelled.json")
+
+        async def scenario():
+            executor = ThreadPoolExecutor(max_workers=1)
+            facade = AsyncMusicService(self.service, max_jobs=1, max_pending=1, executor=executor)
+            # Занимаем единственный поток пула, чтобы экспорт ждал в очереди
+            executor.submit(release.wait)
+            export = asyncio.ensure_future(facade.export_to_json(target))
+            await asyncio.sleep(0.01)
+            with self.assertRaises(MusicServiceError):
+                await facade.create_backup(self.tmp)
+            export.cancel()
+            await asyncio.sleep(0.01)
+            release.set()
+            with self.assertRaises(asyncio.CancelledError):
+                await export
+            executor.shutdown()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(scenario())
+        # Запись прервана до первой порции данных
+        self.assertEqual(os.path.getsize(target), 0)
+
+    def test_export_during_mutation(self):
+        """Экспорт не падает, пока другие потоки добавляют плейлисты и треки"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.service.add_tracks({'title': f"Bulk {i}", 'duration': 100, 'artist': f"Band {i % 50}"}
+                                    for i in range(20000))
+        target = os.path.join(self.tmp, "concurrent.json")
+        errors = []
+
+        def export():
+            try:
+                FileOperations.export_to_json(self.service, target)
+            except Exception as e:
+                errors.append(e)
+
+        worker = threading.Thread(target=export)
+        with contextlib.redirect_stdout(io.StringIO()):
+            worker.start()
+            while worker.is_alive():
+                playlist = self.service.create_playlist("Live")
+                playlist.add_track(self.track)
+                self.service.add_track("Live Song", 100, "", "Live Band")
+            worker.join()
+        self.assertEqual(errors, [])
+        with open(target, encoding='utf-8') as f:
+            self.assertGreaterEqual(len(json.load(f)['tracks']), 20001)
+
+
+class TestEventLog(unittest.TestCase):
+    """Тесты журнала событий с фоновым выводом"""
+
+    def tearDown(self):
+        shutdown_logging()
+
+    def test_messages_go_through_queue(self):
+        """Сообщения сервиса выводятся через очередь журнала"""
+        stream = io.StringIO()
+        configure_logging(stream=stream)
+        service = MusicService()
+        service.register_user("logged", "logged@example.com", "pwd")
+        shutdown_logging()
+        self.assertEqual(stream.getvalue(), "Пользователь logged успешно зарегистрирован\n")
+
+    def test_structured_and_level_gating(self):
+        """Структурированный вывод; сообщения ниже уровня не форматируются"""
+        formatted = []
+
+        class Probe:
+            def __str__(self):
+                formatted.append(True)
+                return "probe"
+
+        stream = io.StringIO()
+        configure_logging(level=logging.WARNING, stream=stream, structured=True)
+        log = get_logger('tests')
+        log.info("skipped %s", Probe())
+        log.warning("kept %s", Probe())
+        shutdown_logging()
+
+        events = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['message'], "kept probe")
+        self.assertEqual(events[0]['template'], "kept %s")
+        self.assertEqual(events[0]['logger'], "music_service.tests")
+        # Отсеянное по уровню сообщение не форматировалось
+        self.assertEqual(len(formatted), 2)
+
+        # Без настройки сообщения не форматируются вовсе
+        formatted.clear()
+        log.warning("silent %s", Probe())
+        self.assertEqual(formatted, [])
+
+
+class TestCompactModels(unittest.TestCase):
+    """Тесты компактного представления моделей"""
+
+    def test_slots_keep_attribute_api(self):
+        """Модели без __dict__ сохраняют прежние атрибуты и строки интернируются"""
+        service = MusicService()
+        user = service.register_user("slim", "slim@example.com", "pwd")
+        service.login("slim@example.com", "pwd")
+        track = service.add_track("Song", 180, "", "Band")
+        playlist = service.create_playlist("Mix")
+        playlist.add_track(track)
+
+        for obj in (user, track, track.artist, playlist, playlist.tracks[0]):
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+        moment = datetime(2024, 5, 17, 12, 30, 45, 123456)
+        user.created_at = moment
+        playlist.created_date = moment
+        self.assertEqual(user.created_at, moment)
+        self.assertEqual(playlist.to_dict()['created_date'], moment.isoformat())
+        self.assertIs(service.add_track("Other", 100, "", "Band").artist.name, track.artist.name)
+        self.assertIsInstance(Playlist("p", "P", "", user).created_date, datetime)
+
+
+class TestSyntheticData(unittest.TestCase):
+    """Тесты генератора синтетического каталога"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_generated_files_load(self):
+        """Сгенерированные JSON и XML загружаются без ошибок и дают одинаковый каталог"""
+        catalog = SyntheticCatalog(500, playlist_length=5)
+        json_file = os.path.join(self.test_dir, "catalog.json")
+        xml_file = os.path.join(self.test_dir, "catalog.xml")
+        catalog.write_json(json_file)
+        catalog.write_xml(xml_file)
+
+        from_json = MusicService()
+        from_xml = MusicService()
+        loaded, errors = FileOperations.load_initial_data(from_json, json_file, None)
+        self.assertEqual(errors, 0)
+        self.assertEqual(FileOperations.load_initial_data(from_xml, None, xml_file), (loaded, 0))
+
+        statistics = catalog.statistics()
+        self.assertEqual(from_json.get_statistics(), statistics)
+        self.assertEqual(from_xml.get_statistics(), statistics)
+        for playlist in from_json.playlists.values():
+            self.assertEqual(from_xml.playlists[playlist.playlist_id].get_tracks_info(), playlist.get_tracks_info())
+            self.assertEqual(len(playlist.tracks), 5)
+
+        # Записи совпадают с to_dict() загруженных объектов; file_path в to_dict() не входит
+        for section, key in (('artists', 'artist_id'), ('albums', 'album_id'), ('tracks', 'track_id')):
+            loaded_section = getattr(from_json, section)
+            for record in getattr(catalog, section)():
+                record.pop('file_path', None)
+                self.assertEqual(loaded_section[record[key]].to_dict(), record)
+
+    def test_xml_playlists_filled_in_bulk(self):
+        """Плейлисты из XML заполняются одной пачкой, без события на каждый трек"""
+        catalog = SyntheticCatalog(200, playlist_length=5)
+        xml_file = os.path.join(self.test_dir, "catalog.xml")
+        catalog.write_xml(xml_file)
+        service = MusicService()
+        events = []
+        service.add_listener(lambda event, payload: events.append(event))
+        stream = io.StringIO()
+        configure_logging(stream=stream)
+        try:
+            FileOperations.load_initial_data(service, None, xml_file)
+        finally:
+            shutdown_logging()
+        self.assertEqual(events.count('playlist_stored'), catalog.playlists_count)
+        # Одна строка журнала на плейлист, а не на каждый трек
+        self.assertNotIn("добавлен в плейлист", stream.getvalue())
+        self.assertEqual(stream.getvalue().count("добавлено треков: 5"), catalog.playlists_count)
+        for record in catalog.playlists():
+            self.assertEqual([t['track_id'] for t in service.playlists[record['playlist_id']].get_tracks_info()],
+                             [t['track_id'] for t in record['tracks']])
+
+    def test_deterministic(self):
+        """Одинаковый seed дает одинаковые файлы, другой seed - другие"""
+        contents = []
+        for seed in (7, 7, 8):
+            filename = os.path.join(self.test_dir, f"catalog_{len(contents)}.json")
+            SyntheticCatalog(200, seed=seed).write_json(filename, compact=True)
+            with open(filename, encoding='utf-8') as f:
+                contents.append(f.read())
+        self.assertEqual(contents[0], contents[1])
+        self.assertNotEqual(contents[0], contents[2])
+
+
+class TestAlbumLinking(unittest.TestCase):
+    """Тесты связывания альбомов при загрузке и сводок альбомов и артистов"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def assert_totals_match_scan(self, service):
+        for album in service.albums.values():
+            self.assertEqual(service.get_album_stats(album.album_id), {
+                'tracks_count': len(album.tracks),
+                'total_duration': sum(t.duration for t in album.tracks),
+                'total_streams': sum(t.stream_count for t in album.tracks)
+            })
+        for artist in service.artists.values():
+            tracks = [t for t in service.tracks.values() if t.artist is artist]
+            self.assertEqual(service.get_artist_stats(artist.artist_id), {
+                'tracks_count': len(tracks),
+                'total_duration': sum(t.duration for t in tracks),
+                'total_streams': sum(t.stream_count for t in tracks)
+            })
+
+    def test_loaders_link_tracks(self):
+        """Треки из JSON и XML попадают в свои альбомы, хотя альбомы идут после треков"""
+        catalog = SyntheticCatalog(300, playlist_length=3)
+        json_file = os.path.join(self.test_dir, "catalog.json")
+        xml_file = os.path.join(self.test_dir, "catalog.xml")
+        catalog.write_json(json_file)
+        catalog.write_xml(xml_file)
+
+        for json_name, xml_name in ((json_file, None), (None, xml_file)):
+            service = MusicService()
+            FileOperations.load_initial_data(service, json_name, xml_name)
+            for record in catalog.tracks():
+                track = service.tracks[record['track_id']]
+                self.assertIsNotNone(track.album)
+                self.assertEqual(track.album.title, record['album'])
+                self.assertIn(track, track.album.tracks)
+            self.assertEqual(sum(len(a.tracks) for a in service.albums.values()), 300)
+            self.assert_totals_match_scan(service)
+
+        # В исходных данных альбом трека задан названием
+        service = MusicService()
+        self.assertEqual(FileOperations.load_initial_data(service, None, "data/initial_data.xml")[1], 0)
+        self.assertEqual([t.title for t in service.albums['album_001'].tracks], ["Bohemian Rhapsody"])
+
+    def test_json_and_xml_load_links_tracks(self):
+        """Треки, уже загруженные из JSON, связываются с альбомами по записям XML"""
+        service = MusicService()
+        FileOperations.load_initial_data(service, "data/initial_data.json", "data/initial_data.xml")
+        self.assertEqual([t.title for t in service.albums['album_001'].tracks], ["Bohemian Rhapsody"])
+        self.assertEqual([t.title for t in service.albums['album_002'].tracks], ["Yesterday"])
+        self.assert_totals_match_scan(service)
+
+    def test_compilation_linked_by_unique_title(self):
+        """Трек сборника привязывается к альбому по названию, если альбом с ним один"""
+        json_file = os.path.join(self.test_dir, "compilation.json")
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'artists': [{'artist_id': "a1", 'name': "Various"}, {'artist_id': "a2", 'name': "Solo"},
+                            {'artist_id': "a3", 'name': "Other"}],
+                'tracks': [{'track_id': "t1", 'title': "Hit", 'duration': 100, 'artist': "Solo",
+                            'album': "Best Of 2020"},
+                           {'track_id': "t2", 'title': "Twin", 'duration': 100, 'artist': "Solo",
+                            'album': "Greatest"}],
+                'albums': [{'album_id': "b1", 'title': "Best Of 2020", 'artist': "Various",
+                            'release_date': "2020-12-01"},
+                           {'album_id': "b2", 'title': "Greatest", 'artist': "Various",
+                            'release_date': "2020-12-01"},
+                           {'album_id': "b3", 'title': "Greatest", 'artist': "Other",
+                            'release_date': "2021-12-01"}]
+            }, f)
+        service = MusicService()
+        FileOperations.load_initial_data(service, json_file, None)
+        self.assertIs(service.tracks["t1"].album, service.albums["b1"])
+        # Название неоднозначно - трек остается без альбома
+        self.assertIsNone(service.tracks["t2"].album)
+        self.assert_totals_match_scan(service)
+
+    def test_totals_follow_changes(self):
+        """Сводки меняются вместе с треками, альбомами и счетчиками прослушиваний"""
+        service = MusicService()
+        artist = Artist("artist_1", "Artist")
+        service.store_artist(artist)
+        album = Album("album_1", "Album", artist, "2020-01-01")
+        service.store_album(album)
+        self.assertIs(service.find_album("Album", artist), album)
+
+        first = Track("t1", "One", 100, "/1.mp3", artist)
+        first.stream_count = 5
+        second = Track("t2", "Two", 200, "/2.mp3", artist)
+        service.store_tracks([first, second])
+        album.add_tracks([first, second, first])
+        first.play()
+        second.stream_count = 10
+        self.assertEqual(service.get_album_stats("album_1"),
+                         {'tracks_count': 2, 'total_duration': 300, 'total_streams': 16})
+
+        # Замена трека вычитает прежний из сводки артиста
+        service.store_track(Track("t2", "Two (remaster)", 250, "/2.mp3", artist))
+        self.assertEqual(service.get_artist_stats("artist_1"),
+                         {'tracks_count': 2, 'total_duration': 350, 'total_streams': 6})
+        with self.assertRaises(AlbumNotFoundError):
+            service.get_album_stats("missing")
+        with self.assertRaises(ArtistNotFoundError):
+            service.get_artist_stats("missing")
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Тесты инструментирования методов и фаз загрузки"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.data_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "initial_data.json")
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+        shutil.rmtree(self.test_dir)
+
+    def test_method_stats_and_restore(self):
+        """Вызовы считаются только при включенном инструментировании, исходные методы восстанавливаются"""
+        original = vars(MusicService)['search_tracks']
+        service = MusicService()
+        FileOperations.load_initial_data(service, self.data_file, None)
+
+        instrumentation.enable()
+        self.assertIsNot(vars(MusicService)['search_tracks'], original)
+        for _ in range(5):
+            service.search_tracks("queen")
+        instrumentation.disable()
+        service.search_tracks("queen")
+
+        self.assertIs(vars(MusicService)['search_tracks'], original)
+        stats = instrumentation.method_stats('MusicService.search_tracks')
+        self.assertEqual(stats['count'], 5)
+        self.assertEqual(sum(count for _, count in stats['histogram']), 5)
+        self.assertLessEqual(stats['min_us'], stats['p50_us'])
+        self.assertLessEqual(stats['p50_us'], stats['max_us'])
+        self.assertIsNone(instrumentation.method_stats('MusicService.get_statistics'))
+
+    def test_loader_phases_report_and_profile(self):
+        """Фазы загрузчика, профиль секции и отчет в JSON"""
+        instrumentation.enable()
+        with instrumentation.profile('load'):
+            FileOperations.load_initial_data(MusicService(), self.data_file, None)
+
+        phases = instrumentation.phase_stats()
+        self.assertEqual(phases['load_json']['calls'], 1)
+        self.assertIn('load_json/build', phases)
+        self.assertIn('load_json/build/link', phases)
+        self.assertLessEqual(phases['load_json']['self_s'], phases['load_json']['total_s'])
+
+        report_file = os.path.join(self.test_dir, "report.json")
+        instrumentation.dump(report_file)
+        with open(report_file, encoding='utf-8') as f:
+            report = json.load(f)
+        self.assertEqual(report['methods']['FileOperations.load_initial_data']['count'], 1)
+        self.assertIn('_load_from_json', report['profiles']['load'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Модуль сводных показателей пользователей по их плейлистам
+"""
+import threading
+from typing import Dict, List
+
+
+class UserTotals:
+    """Сводка по плейлистам одного пользователя"""
+    __slots__ = ('playlists_count', 'tracks_count', 'total_duration')
+
+    def __init__(self):
+        self.playlists_count = 0
+        self.tracks_count = 0
+        self.total_duration = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            'playlists_count': self.playlists_count,
+            'tracks_count': self.tracks_count,
+            'total_duration': self.total_duration
+        }
+
+
+class UserAggregates:
+    """
+    Подписчик на события MusicService, поддерживающий для каждого владельца
+    число плейлистов, треков в них и их общую длительность. Показатели
+    меняются на величину изменения, плейлисты заново не просматриваются
+    (кроме одного прохода при сохранении плейлиста целиком).
+    """
+
+    def __init__(self):
+        self._users: Dict[str, UserTotals] = {}
+        # playlist_id -> [owner_id, треков, длительность]
+        self._playlists: Dict[str, List] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: str, payload: Dict):
+        with self._lock:
+            self._apply(event, payload)
+
+    def _apply(self, event: str, payload: Dict):
+        if event == 'playlist_stored':
+            self._store(payload['playlist'])
+        elif event == 'playlist_track_added':
+            self._change(payload['playlist'].playlist_id, 1, payload['track'].duration)
+        elif event == 'playlist_tracks_added':
+            tracks = payload['tracks']
+            self._change(payload['playlist'].playlist_id, len(tracks), sum(track.duration for track in tracks))
+        elif event == 'playlist_track_removed':
+            self._change(payload['playlist'].playlist_id, -1, -payload['track'].duration)
+        elif event == 'playlist_cleared':
+            stats = self._playlists.get(payload['playlist'].playlist_id)
+            if stats is not None:
+                self._change(payload['playlist'].playlist_id, -stats[1], -stats[2])
+
+    def _totals(self, user_id: str) -> UserTotals:
+        totals = self._users.get(user_id)
+        if totals is None:
+            totals = self._users[user_id] = UserTotals()
+        return totals
+
+    def _store(self, playlist):
+        previous = self._playlists.pop(playlist.playlist_id, None)
+        if previous is not None:
+            totals = self._totals(previous[0])
+            totals.playlists_count -= 1
+            totals.tracks_count -= previous[1]
+            totals.total_duration -= previous[2]
+
+        owner_id = playlist.owner.user_id
+        tracks_count = len(playlist.tracks)
+        duration = sum(pt.track.duration for pt in playlist.tracks)
+        self._playlists[playlist.playlist_id] = [owner_id, tracks_count, duration]
+        totals = self._totals(owner_id)
+        totals.playlists_count += 1
+        totals.tracks_count += tracks_count
+        totals.total_duration += duration
+
+    def _change(self, playlist_id: str, tracks_delta: int, duration_delta: int):
+        stats = self._playlists.get(playlist_id)
+        if stats is None:
+            return
+        stats[1] += tracks_delta
+        stats[2] += duration_delta
+        totals = self._totals(stats[0])
+        totals.tracks_count += tracks_delta
+        totals.total_duration += duration_delta
+
+    def get(self, user_id: str) -> UserTotals:
+        """Сводка пользователя (нулевая, если плейлистов нет)"""
+        with self._lock:
+            totals = self._users.get(user_id)
+            snapshot = UserTotals()
+            if totals is not None:
+                snapshot.playlists_count = totals.playlists_count
+                snapshot.tracks_count = totals.tracks_count
+                snapshot.total_duration = totals.total_duration
+            return snapshot
+
+    def playlist_duration(self, playlist_id: str) -> int:
+        stats = self._playlists.get(playlist_id)
+        return stats[2] if stats is not None else 0